@@ -0,0 +1,108 @@
+"""
+Runs the microbenchmarks of benchmarks/suite.py, saves them as a baseline or compares them to it.
+
+Usage, from the root of the repository:
+
+    python -m benchmarks.run --save-baseline     # record benchmarks/baseline.json
+    python -m benchmarks.run --compare           # exit with 1 if a benchmark is slower than the baseline
+    python -m benchmarks.run --compare --threshold 0.1 --filter json
+
+Each benchmark is timed `--repeat` times over enough calls to last about 0.2 s. The comparison uses the fastest of
+these samples, since the noise of the machine only ever makes a run slower; the median is reported alongside.
+Baselines are only comparable on the same machine, so benchmarks/baseline.json is not versioned.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Any, Dict
+
+from benchmarks.suite import BENCHMARKS, fixtures
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def run_benchmark(bench, repeat: int) -> Dict[str, Any]:
+    try:
+        timer = timeit.Timer(bench.setup())
+        calls, _ = timer.autorange()
+        # autorange stops at 0.2 s, which is long enough for one sample
+        samples = [timer.timeit(calls) / calls / bench.number for _ in range(repeat)]
+    finally:
+        fixtures.close()
+    return {'median_us': statistics.median(samples) * 1e6,
+            'min_us': min(samples) * 1e6,
+            'calls': calls,
+            'operations': bench.number}
+
+
+def run_suite(name_filter: str = '', repeat: int = 5) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = run_benchmark(bench, repeat)
+        print(f"{name:<40}{results[name]['min_us']:>14.3f} us/op (median {results[name]['median_us']:.3f})",
+              flush=True)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> int:
+    """Prints the change of each benchmark against the baseline, returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'benchmark':<40}{'baseline us':>14}{'current us':>14}{'change':>10}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<40}{'-':>14}{result['min_us']:>14.3f}{'new':>10}")
+            continue
+        before, after = baseline[name]['min_us'], result['min_us']
+        change = after / before - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{name:<40}{before:>14.3f}{after:>14.3f}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="Compare the results to the baseline")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Relative slowdown above which a benchmark is a regression, 0.25 for 25%%")
+    parser.add_argument('--filter', default='', help="Only run the benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = run_suite(args.filter, args.repeat)
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}, run with --save-baseline first")
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{regressions} benchmarks regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': sys.version.split()[0],
+                       'machine': platform.platform(),
+                       'results': results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
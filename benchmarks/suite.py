@@ -0,0 +1,265 @@
+"""
+Microbenchmarks of the hot pure-Python paths, on synthetic fixtures.
+
+Each benchmark is a function registered with `@benchmark`: it builds its fixtures, then returns the callable which
+is timed. `number` is the count of operations performed by one call of that callable, so results are reported per
+operation. Benchmarks only touch local data: images are served by an in-memory transport and fonts are replaced
+by a fixed-width stand-in, so results do not depend on the network or on a display.
+"""
+import json
+import os
+import random
+import tempfile
+from contextlib import ExitStack
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Dict, List
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from gui.view_models import format_duration, largest_image
+from service.artist_graph import ArtistGraph, rank_neighbors
+from service.config_reader import ConfigReader
+from service.models import Image as ImageModel, Track, json_loads, parse_list
+from service.search_index import SearchIndex
+from service.settings import build_settings
+from service.stats_aggregates import (TopItemColumns, duration_histogram, genre_distribution, overlap,
+                                      popularity_trend)
+from service.transport import install_transport
+from tools.stand_in_server import SyntheticLibrary
+from utiity.image_cache import ImageCache
+from utiity.image_processing import create_rounded_image
+from utiity.text_layout import TextLayout
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    number: int = 1
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+# Cleanups of the fixtures set up by a benchmark, e.g. their temporary directories, closed once it is timed
+fixtures = ExitStack()
+
+
+def benchmark(name: str, number: int = 1):
+    """Registers a benchmark. The decorated function returns the callable to time."""
+    def register(setup):
+        BENCHMARKS[name] = Benchmark(name, setup, number)
+        return setup
+    return register
+
+
+# Fixtures
+
+def _png_bytes(size: int) -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (size, size), (30, 215, 96)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _top_tracks_payload(tracks: int) -> bytes:
+    library = SyntheticLibrary('http://localhost', artists=100, tracks=tracks, playlists=0)
+    return json.dumps({'items': library.tracks, 'total': tracks, 'next': None}).encode('utf-8')
+
+
+class FixedWidthFont:
+    """Stands in for a Tk font: every character is 7 pixels wide."""
+    name = 'fixed-width'
+
+    @staticmethod
+    def measure(text: str) -> int:
+        return 7 * len(text)
+
+
+def _names(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = ('The', 'Midnight', 'Orchestra', 'of', 'Electric', 'Dreams', 'Live', 'Session', 'Remastered', 'Band')
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(1, 8))) for _ in range(count)]
+
+
+# Images
+
+for _size in (64, 200, 640):
+    def _rounded_image(size=_size):
+        image = Image.new('RGB', (640, 640), (200, 40, 40))
+        return lambda: create_rounded_image(image, (size, size))
+
+    benchmark(f'create_rounded_image[{_size}]')(_rounded_image)
+
+
+class _ImageCacheFixture:
+    """An ImageCache in a temporary directory, downloading from an in-memory transport."""
+
+    def __init__(self):
+        content = _png_bytes(300)
+        install_transport(httpx.MockTransport(lambda request: httpx.Response(200, content=content)))
+        self.directory = fixtures.enter_context(tempfile.TemporaryDirectory(prefix='bench-image-cache-'))
+        self.cache = ImageCache(self.directory)
+        self.misses = 0
+
+
+@benchmark('image_cache.hit')
+def _image_cache_hit():
+    fixture = _ImageCacheFixture()
+    fixture.cache.fetch_image('http://localhost/images/hit.png')
+    return lambda: fixture.cache.fetch_image('http://localhost/images/hit.png').load()
+
+
+@benchmark('image_cache.miss')
+def _image_cache_miss():
+    fixture = _ImageCacheFixture()
+
+    def miss():
+        fixture.misses += 1
+        url = f'http://localhost/images/miss-{fixture.misses}.png'
+        fixture.cache.fetch_image(url)
+        os.remove(fixture.cache.get_cached_image_path(url))
+
+    return miss
+
+
+@benchmark('largest_image', number=1000)
+def _largest_image():
+    rng = random.Random(0)
+    image_lists = [tuple(ImageModel(f'http://localhost/{i}-{size}', size, size)
+                         for size in rng.sample((640, 300, 64, 160, 1000), 3)) for i in range(1000)]
+    return lambda: [largest_image(images) for images in image_lists]
+
+
+# Text
+
+@benchmark('truncate.cold', number=1000)
+def _truncate_cold():
+    names = _names(1000)
+    layout = TextLayout()
+    font = FixedWidthFont()
+
+    def truncate():
+        layout.clear()
+        for name in names:
+            layout.truncate(name, font, 130)
+
+    return truncate
+
+
+@benchmark('truncate.warm', number=1000)
+def _truncate_warm():
+    names = _names(1000)
+    layout = TextLayout()
+    font = FixedWidthFont()
+    for name in names:
+        layout.truncate(name, font, 130)
+    return lambda: [layout.truncate(name, font, 130) for name in names]
+
+
+@benchmark('format_duration', number=100000)
+def _format_duration():
+    rng = random.Random(0)
+    durations = [rng.randint(0, 4 * 3600 * 1000) for _ in range(100000)]
+    return lambda: [format_duration(ms) for ms in durations]
+
+
+# Configuration
+
+@benchmark('config.get_config_value', number=1000)
+def _get_config_value():
+    config = ConfigReader('config.yaml')
+    return lambda: [config.get_config_value('api.endpoints.artist.get_albums.url').format('artist000001')
+                    for _ in range(1000)]
+
+
+@benchmark('settings.endpoint_url', number=1000)
+def _endpoint_url():
+    api = build_settings(ConfigReader('config.yaml')).api
+    return lambda: [api.endpoint('artist.get_albums').url('artist000001') for _ in range(1000)]
+
+
+# JSON
+
+@benchmark('json.top_tracks[1000].stdlib')
+def _json_stdlib():
+    payload = _top_tracks_payload(1000)
+    return lambda: json.loads(payload)
+
+
+@benchmark('json.top_tracks[1000].json_loads')
+def _json_fast():
+    payload = _top_tracks_payload(1000)
+    return lambda: json_loads(payload)
+
+
+@benchmark('json.top_tracks[1000].models')
+def _json_models():
+    payload = _top_tracks_payload(1000)
+    return lambda: parse_list(Track, json_loads(payload)['items'])
+
+
+# Search
+
+@benchmark('search_index.search_by_kind[50k]', number=8)
+def _search():
+    library = SyntheticLibrary('http://localhost', artists=2000, tracks=50000, playlists=200)
+    index = SearchIndex()
+    for kind in ('artists', 'albums', 'tracks', 'playlists'):
+        index.on_entities_saved(kind, getattr(library, kind))
+    # As typed, from a single letter to a misspelt word
+    queries = ('t', 'tra', 'track 12', 'trak 4567', 'artist 1', 'alb', 'playlist 10 ', 'zzz')
+    limits = {'artists': 8, 'albums': 8, 'playlists': 8, 'tracks': 10}
+    return lambda: [index.search_by_kind(query, limits) for query in queries]
+
+
+# Artist graph
+
+@benchmark('artist_graph.rank_neighbors[3000]')
+def _rank_neighbors():
+    library = SyntheticLibrary('http://localhost', artists=20000, tracks=0, playlists=0)
+    # The graph of a crawl of three steps, as built by ArtistGraphExplorer.crawl
+    distances = {'artist000001': 0}
+    adjacency = {}
+    frontier = ['artist000001']
+    for distance in range(1, 4):
+        next_frontier = []
+        for artist_id in frontier:
+            related = tuple(artist['id'] for artist in library.related_artists(artist_id))
+            adjacency[artist_id] = related
+            for item in related:
+                if item not in distances and len(distances) < 3000:
+                    distances[item] = distance
+                    next_frontier.append(item)
+        frontier = next_frontier
+    graph = ArtistGraph('artist000001', distances, adjacency)
+    return lambda: rank_neighbors(graph)
+
+
+# Listening statistics
+
+def _top_item_history(kind: str, items: int, days: int = 730) -> List[tuple]:
+    """Daily snapshots of 50 top items of each time range, in the rows of LibraryStore.get_top_item_history."""
+    rng = random.Random(0)
+    return [(time_range, day, [f'{kind}{rng.randrange(items):06d}' for _ in range(50)],
+             bytes(rng.randint(0, 100) for _ in range(50)))
+            for time_range in ('short_term', 'medium_term', 'long_term') for day in range(days)]
+
+
+@benchmark('stats_engine.merge[2y]')
+def _stats_merge():
+    rows = _top_item_history('track', 10000)
+    return lambda: TopItemColumns.empty().merge(rows)
+
+
+@benchmark('stats_engine.aggregates[2y]')
+def _stats_aggregates():
+    rng = random.Random(0)
+    genres = ('rock', 'pop', 'jazz', 'hip hop', 'electronic', 'folk', 'soul', 'metal', 'classical', 'indie')
+    artists = TopItemColumns.empty().merge(_top_item_history('artist', 500))
+    tracks = TopItemColumns.empty().merge(_top_item_history('track', 10000))
+    item_genres = [rng.sample(genres, rng.randint(0, 3)) for _ in artists.ids]
+    durations_ms = np.array([rng.randint(90000, 420000) for _ in tracks.ids], dtype=np.float64)
+    return lambda: (genre_distribution(artists, item_genres), duration_histogram(tracks, durations_ms),
+                    overlap(artists), popularity_trend(artists), popularity_trend(tracks))
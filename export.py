@@ -0,0 +1,82 @@
+"""
+Headless export of the library, without starting the GUI.
+
+Streams the top items, the playlists or the tracks of the playlists out as NDJSON or CSV, with the tokens saved
+by the application. Examples:
+
+    python export.py top-tracks --time-range all --format csv --output top_tracks.csv
+    python export.py playlist-tracks --concurrency 8 > playlist_tracks.ndjson
+"""
+import argparse
+import logging
+import sys
+import time
+
+from service.authorization_handler import login
+from service.exporter import CSV_COLUMNS, EXPORTS, FORMATS, WRITERS, ExportError, export_records
+from service.library_sync import TIME_RANGES
+from service.resilience import SpotifyApiError, request_stats
+from service.settings import load_settings
+from service.spotify_client import SpotifyClient
+from service.transport import build_transport, install_transport
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export the Spotify library without starting the GUI.")
+    parser.add_argument('export', choices=EXPORTS, help="The data to export")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson', help="The output format (default: ndjson)")
+    parser.add_argument('--output', '-o', default='-', help="The output file, '-' for the standard output")
+    parser.add_argument('--time-range', choices=TIME_RANGES + ('all',), default='all',
+                        help="The time range of the top items (default: all)")
+    parser.add_argument('--playlist', action='append', default=[], metavar='ID',
+                        help="Only export this playlist, can be repeated")
+    parser.add_argument('--concurrency', type=int, default=4, help="The maximum number of requests in flight")
+    parser.add_argument('--page-size', type=int, default=None,
+                        help="The number of items per request (default: the page size of the endpoint)")
+    parser.add_argument('--limit', type=int, default=None, help="Stop after this number of records")
+    parser.add_argument('--config', default='config.yaml', help="The configuration file")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Log the requests to the standard error")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    settings = load_settings(args.config)
+    transport = settings.transport
+    install_transport(build_transport(transport.mode, transport.cassette_dir, latency_ms=transport.latency_ms,
+                                      jitter_ms=transport.jitter_ms, seed=transport.seed))
+    sp_client = SpotifyClient(settings.api.client_id, settings.api.client_secret, settings=settings.api)
+    if not sp_client.is_session_saved():
+        login(sp_client, settings.api.redirect_uri)
+
+    time_ranges = TIME_RANGES if args.time_range == 'all' else (args.time_range,)
+    records = export_records(args.export, sp_client, settings.api, time_ranges=time_ranges,
+                             playlist_ids=args.playlist, page_size=args.page_size,
+                             concurrency=max(1, args.concurrency))
+    if args.limit is not None:
+        records = (record for _, record in zip(range(args.limit), records))
+
+    start = time.perf_counter()
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        count = WRITERS[args.format](records, output, CSV_COLUMNS[args.export])
+    except (ExportError, SpotifyApiError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        request_stats.log_report()
+    print(f"Exported {count} records in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
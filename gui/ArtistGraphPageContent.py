@@ -0,0 +1,100 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import customtkinter as ctk
+
+from gui.card_pool import CardPool
+from gui.content import Content, SectionSpec
+from gui.labeled_artist_cards_frame import LabeledArtistCardsFrame
+from gui.view_models import build_artist_graph_page
+from service.artist_graph import ArtistGraphExplorer
+from service.models import Artist
+from utiity.image_cache import ImageCache
+from utiity.text_layout import text_layout
+
+LEVEL_TITLES = {1: "Related artists", 2: "Two steps away"}
+
+
+class ArtistGraphPageContent(Content):
+    """
+    The artists around an artist, ranked by their proximity in the graph of related artists.
+
+    The first visit crawls the graph, which can take a few seconds for artists missing from the library. The
+    ranking is then saved in the library store, and the next visits only read it.
+    """
+    def __init__(self,
+                 master: ctk.CTkFrame,
+                 explorer: ArtistGraphExplorer,
+                 image_cache: ImageCache,
+                 data: Artist,
+                 navigate_callback: Optional[Callable] = None,
+                 card_pool: Optional[CardPool] = None,
+                 page_scroll_frame: Optional[ctk.CTkScrollableFrame] = None):
+        super().__init__(master, navigate_callback)
+
+        self.explorer = explorer
+        self.image_cache = image_cache
+        self.artist_data = data
+        self.card_pool = card_pool
+        self.page_scroll_frame = page_scroll_frame
+
+        self.left_frame = None
+        self.right_frame = None
+
+    def fetch_state(self, refresh: bool = False) -> Dict[str, Any]:
+        # Runs in a background thread, a refresh crawls again but only requests the stale artists
+        exploration = self.explorer.explore(self.artist_data.id, refresh=refresh)
+        return {'artist': self.artist_data,
+                'ranking': exploration.ranking,
+                'stats': {'artist_count': exploration.artist_count,
+                          'edge_count': exploration.edge_count,
+                          'fetched': exploration.fetched,
+                          'reused': exploration.reused}}
+
+    def encode_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {'artist': state['artist'].to_json(),
+                'ranking': [[artist.to_json(), score, distance] for artist, score, distance in state['ranking']],
+                'stats': state['stats']}
+
+    def decode_state(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        return {'artist': Artist.from_json(snapshot['artist']),
+                'ranking': [(Artist.from_json(artist), score, distance)
+                            for artist, score, distance in snapshot['ranking']],
+                'stats': snapshot['stats']}
+
+    def prepare_view(self, state):
+        view_model = build_artist_graph_page(state['artist'], state['ranking'], state['stats'])
+        return view_model, self.load_header_image(self.image_cache, view_model.header)
+
+    def render(self):
+        # Left Column - Artist image and the size of the graph
+        self.left_frame = ctk.CTkFrame(self.frame)
+        self.left_frame.pack(side='left', fill='y', padx=(20, 10), pady=20)
+        self.render_header(self.left_frame, self.view_model.header, self.header_image)
+
+        # Right column - Ranked artists by number of steps
+        self.right_frame = ctk.CTkFrame(self.frame)
+        self.right_frame.pack(side='right', fill='both', expand=True, padx=20, pady=20)
+
+        ctk.CTkLabel(self.right_frame,
+                     text=f"Around {self.view_model.header.title}",
+                     font=text_layout.get_font(family='Helvetica', size=40, weight='bold')
+                     ).pack(fill='x', pady=10, padx=5)
+
+        self.create_scroll_frame(self.right_frame, self.page_scroll_frame)
+        self.render_sections()
+
+    def section_specs(self) -> List[SectionSpec]:
+        specs = []
+        for distance, cards in self.view_model.levels:
+            title = LEVEL_TITLES.get(distance, f"{distance} steps away")
+            specs.append(SectionSpec(f'distance_{distance}', cards,
+                                     lambda parent, data=cards, title=title: LabeledArtistCardsFrame(
+                                         parent,
+                                         title=title,
+                                         data=data,
+                                         size=(150, 200),
+                                         image_size=(130, 130),
+                                         navigate_callback=self.navigate_callback,
+                                         card_pool=self.card_pool),
+                                     estimated_height=250 * ((len(cards) + 5) // 6)))
+        return specs
@@ -1,151 +1,138 @@
 from typing import Dict, Any, Optional, List, Callable
 import customtkinter as ctk
 
-from gui.content import Content
+from gui.content import Content, SectionSpec
+from gui.card_pool import CardPool
 from gui.labeled_artist_cards_frame import LabeledArtistCardsFrame
 from gui.labeled_playlist_cards_frame import LabeledPlaylistCardsFrame
 from gui.labeled_track_list_frame import LabeledTrackListFrame
-from gui.profile_info_component import ProfileInfoComponent
-from service.config_reader import ConfigReader
-from service.spotify_client import SpotifyClient
+from gui.view_models import build_artist_page
+from service.library_sync import ARTIST_ALBUM_GROUPS, LibrarySync
+from service.models import Album, Artist, Track, dump_list, parse_list
 from utiity.image_cache import ImageCache
-from utiity.image_processing import create_rounded_image
+from utiity.text_layout import text_layout
 
 
 class ArtistPageContent(Content):
     def __init__(self,
                  master: ctk.CTkFrame,
-                 spotify_client: SpotifyClient,
-                 config: ConfigReader,
-                 current_profile: Dict[str, Any],
                  image_cache: ImageCache,
                  data: Any,
+                 library: LibrarySync,
                  navigate_callback: Optional[Callable] = None,
+                 card_pool: Optional[CardPool] = None,
+                 page_scroll_frame: Optional[ctk.CTkScrollableFrame] = None,
                  ):
         super().__init__(master, navigate_callback)
 
-        self.sp_client = spotify_client
-        self.config = config
-        self.current_profile = current_profile
         self.image_cache = image_cache
         self.artist_data = data
-
-        self.albums: List[Dict[str, Any]] = []
-        self.singles: List[Dict[str, Any]] = []
-        self.appears_on: List[Dict[str, Any]] = []
-        self.top_tracks: List[Dict[str, Any]] = []
-        self.related_artists: List[Dict[str, Any]] = []
-
-    def load_data(self):
-        self._fetch_data()
-
-    def _fetch_data(self):
-        # Perform all data fetching operations
-        self.albums = self.sp_client.get(
-            self.config.get_config_value('api.endpoints.artist.get_albums').format(self.artist_data['id']),
-            params={'include_groups': 'album', 'limit': 9}
-        )['items']
-
-        self.singles = self.sp_client.get(
-            self.config.get_config_value('api.endpoints.artist.get_albums').format(self.artist_data['id']),
-            params={'include_groups': 'single', 'limit': 9}
-        )['items']
-
-        self.appears_on = self.sp_client.get(
-            self.config.get_config_value('api.endpoints.artist.get_albums').format(self.artist_data['id']),
-            params={'include_groups': 'appears_on', 'limit': 9}
-        )['items']
-
-        self.top_tracks = self.sp_client.get(
-            self.config.get_config_value('api.endpoints.artist.top_tracks').format(self.artist_data['id'])
-        )['tracks']
-
-        self.related_artists = self.sp_client.get(
-            self.config.get_config_value('api.endpoints.artist.related_artists').format(self.artist_data['id'])
-        )['artists']
+        self.card_pool = card_pool
+        self.page_scroll_frame = page_scroll_frame
+        self.library = library
+
+        self.left_frame = None
+        self.right_frame = None
+
+    def fetch_state(self, refresh: bool = False) -> Dict[str, Any]:
+        # Perform all data fetching operations, reading the local library first
+        # This runs in a background thread
+        lists = self.library.load_artist(self.artist_data.id, refresh=refresh)
+        return {'artist': self.artist_data, **lists}
+
+    def encode_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        snapshot = {'artist': state['artist'].to_json()}
+        for name in ARTIST_ALBUM_GROUPS + ('top_tracks', 'related_artists'):
+            snapshot[name] = dump_list(state[name])
+        return snapshot
+
+    def decode_state(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        # Album cards also open artist pages
+        artist_model = Album if snapshot['artist'].get('type') == 'album' else Artist
+        state = {'artist': artist_model.from_json(snapshot['artist']),
+                 'top_tracks': parse_list(Track, snapshot['top_tracks']),
+                 'related_artists': parse_list(Artist, snapshot['related_artists'])}
+        for group in ARTIST_ALBUM_GROUPS:
+            state[group] = parse_list(Album, snapshot[group])
+        return state
+
+    def prepare_view(self, state):
+        # Display preparation also runs in the background thread, render only binds the results
+        view_model = build_artist_page(state['artist'],
+                                       state['top_tracks'],
+                                       state['album'],
+                                       state['single'],
+                                       state['appears_on'],
+                                       state['related_artists'])
+        return view_model, self.load_header_image(self.image_cache, view_model.header)
 
     def render(self):
         # Left Column - Profile Image and Artist Details
         self.left_frame = ctk.CTkFrame(self.frame)
         self.left_frame.pack(side='left', fill='y', padx=(20, 10), pady=20)
-
-        # artist profile image
-        if 'images' in self.artist_data and self.artist_data['images']:
-            largest_image = max(self.artist_data['images'], key=lambda image: image["width"] * image["height"])
-            image_url = largest_image["url"]
-            profile_image = self.image_cache.fetch_image(image_url)
-            profile_image = create_rounded_image(profile_image, (largest_image["width"], largest_image["height"]))
-            ctk_image = ctk.CTkImage(light_image=profile_image, dark_image=profile_image,
-                                     size=(largest_image["width"], largest_image["height"]))
-            profile_image_label = ctk.CTkLabel(self.left_frame, image=ctk_image, text='')
-            profile_image_label.image = ctk_image
-            profile_image_label.pack(padx=10, pady=10)
-
-        # Profile info components
-        ProfileInfoComponent(self.left_frame,
-                             "Followers",
-                             self.artist_data.get("followers").get("total", 'N/A'),
-                             ).pack(fill='x', pady=2, padx=5)
-        ProfileInfoComponent(self.left_frame,
-                             "Genres:",
-                             ', '.join(self.artist_data.get("genres", "N/A"))
-                             ).pack(fill='x', pady=2, padx=5)
+        self.render_header(self.left_frame, self.view_model.header, self.header_image)
 
         # Right columns - Artist albums and tracks
         self.right_frame = ctk.CTkFrame(self.frame)
         self.right_frame.pack(side='right', fill='both', expand=True, padx=20, pady=20)
 
         ctk.CTkLabel(self.right_frame,
-                     text=self.artist_data['name'],
-                     font=ctk.CTkFont(family='Helvetica', size=40, weight='bold')
+                     text=self.view_model.header.title,
+                     font=text_layout.get_font(family='Helvetica', size=40, weight='bold')
                      ).pack(fill='x', pady=10, padx=5)
 
+        # Album cards also open this page, only artists have related artists to explore
+        if isinstance(self.artist_data, Artist) and self.navigate_callback is not None:
+            ctk.CTkButton(self.right_frame,
+                          text="Explore related artists",
+                          command=lambda: self.navigate_callback(f'ArtistGraph:{self.artist_data.name}',
+                                                                 self.artist_data)
+                          ).pack(pady=(0, 10))
+
         # Scrollable Frame for Top Artists and Tracks
-        scroll_frame = ctk.CTkScrollableFrame(self.right_frame)
-        scroll_frame.pack(fill='both', expand=True)
+        # Sections are built only when they get close to the visible area of the scrollable frame
+        self.create_scroll_frame(self.right_frame, self.page_scroll_frame)
+        self.render_sections()
+
+    def _album_section(self, key: str, title: str, data) -> SectionSpec:
+        return SectionSpec(key, data,
+                           lambda parent: LabeledPlaylistCardsFrame(parent,
+                                                                    title=title,
+                                                                    data=data,
+                                                                    size=(200, 250),
+                                                                    image_size=(200, 200),
+                                                                    navigate_callback=self.navigate_callback,
+                                                                    card_pool=self.card_pool),
+                           estimated_height=600)
+
+    def section_specs(self) -> List[SectionSpec]:
+        view_model = self.view_model
 
         # Top tracks
-        LabeledTrackListFrame(scroll_frame,
-                              title='The top tracks!',
-                              track_data=self.top_tracks
-                              ).pack(fill='both', expand=True, pady=10)
-
-        # Albums
-        if self.albums:
-            LabeledPlaylistCardsFrame(scroll_frame,
-                                      title='Album',
-                                      data=self.albums,
-                                      size=(200, 250),
-                                      image_size=(200, 200),
-                                      navigate_callback=self.navigate_callback
-                                      ).pack(fill='both', expand=True, pady=10)
-
-        # Singles
-        if self.singles:
-            LabeledPlaylistCardsFrame(scroll_frame,
-                                      title='Singles and EP',
-                                      data=self.singles,
-                                      size=(200, 250),
-                                      image_size=(200, 200),
-                                      navigate_callback=self.navigate_callback
-                                      ).pack(fill='both', expand=True, pady=10)
-
-        # Appears on
-        if self.appears_on:
-            LabeledPlaylistCardsFrame(scroll_frame,
-                                      title='Appears on',
-                                      data=self.appears_on,
-                                      size=(200, 250),
-                                      image_size=(200, 200),
-                                      navigate_callback=self.navigate_callback
-                                      ).pack(fill='both', expand=True, pady=10)
+        specs = [SectionSpec('top_tracks', view_model.top_tracks,
+                             lambda parent, data=view_model.top_tracks: LabeledTrackListFrame(parent,
+                                                                                              title='The top tracks!',
+                                                                                              track_data=data),
+                             estimated_height=60 * len(view_model.top_tracks) + 60)]
+
+        # Albums, singles and appears on
+        if view_model.albums:
+            specs.append(self._album_section('albums', 'Album', view_model.albums))
+        if view_model.singles:
+            specs.append(self._album_section('singles', 'Singles and EP', view_model.singles))
+        if view_model.appears_on:
+            specs.append(self._album_section('appears_on', 'Appears on', view_model.appears_on))
 
         # Related artists
-        if self.related_artists:
-            LabeledArtistCardsFrame(scroll_frame,
-                                    title='The top artists of this month',
-                                    data=self.related_artists,
-                                    size=(100, 150),
-                                    image_size=(80, 80),
-                                    navigate_callback=self.navigate_callback
-                                    ).pack(fill='both', expand=True, pady=10)
+        if view_model.related_artists:
+            specs.append(SectionSpec('related_artists', view_model.related_artists,
+                                     lambda parent, data=view_model.related_artists: LabeledArtistCardsFrame(
+                                         parent,
+                                         title='The top artists of this month',
+                                         data=data,
+                                         size=(100, 150),
+                                         image_size=(80, 80),
+                                         navigate_callback=self.navigate_callback,
+                                         card_pool=self.card_pool),
+                                     estimated_height=400))
+        return specs
@@ -1,18 +1,80 @@
-from typing import Callable
+from typing import Any, Callable, Dict, List, Optional
 
 import customtkinter as ctk
-from .content import Content
+
+from service.stats_engine import ListeningStats, StatsEngine
+from utiity.text_layout import text_layout
+from .content import Content, SectionSpec
+from .labeled_bar_chart_frame import LabeledBarChartFrame
+from .labeled_trend_frame import LabeledTrendFrame
+from .view_models import ChartViewModel, build_home_page
 
 
 class HomePageContent(Content):
+    """
+    A dashboard of the listening statistics of the user: genres, track lengths, artists in common between the
+    time ranges and the popularity of the top tracks over time.
+
+    The statistics are aggregated by the stats engine, the page only shows them. They are persisted as the
+    snapshot of the page, so the dashboard is shown as soon as the page opens, then revalidated.
+    """
     def __init__(self,
                  master: ctk.CTkFrame,
-                 navigate_callback: Callable = None):
+                 stats_engine: StatsEngine,
+                 navigate_callback: Callable = None,
+                 page_scroll_frame: Optional[ctk.CTkScrollableFrame] = None):
         super().__init__(master, navigate_callback)
 
-    def load_data(self):
-        return
+        self.stats_engine = stats_engine
+        self.page_scroll_frame = page_scroll_frame
+
+        self.left_frame = None
+        self.right_frame = None
+
+    def fetch_state(self, refresh: bool = False) -> Dict[str, Any]:
+        # Runs in a background thread, the lists of top items are synced concurrently
+        return {'stats': self.stats_engine.stats(refresh=refresh)}
+
+    def encode_state(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {'stats': state['stats'].to_json()}
+
+    def decode_state(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        return {'stats': ListeningStats.from_json(snapshot['stats'])}
+
+    def prepare_view(self, state):
+        return build_home_page(state['stats']), None
 
     def render(self):
-        label = ctk.CTkLabel(self.frame, text="This is the Home Page")
-        label.pack(pady=20)
+        # Left Column - Summary of the history
+        self.left_frame = ctk.CTkFrame(self.frame)
+        self.left_frame.pack(side='left', fill='y', padx=(20, 10), pady=20)
+        self.render_header(self.left_frame, self.view_model.header)
+
+        # Right column - Charts
+        self.right_frame = ctk.CTkFrame(self.frame)
+        self.right_frame.pack(side='right', fill='both', expand=True, padx=20, pady=20)
+
+        ctk.CTkLabel(self.right_frame,
+                     text=self.view_model.header.title,
+                     font=text_layout.get_font(family='Helvetica', size=40, weight='bold')
+                     ).pack(fill='x', pady=10, padx=5)
+
+        self.create_scroll_frame(self.right_frame, self.page_scroll_frame)
+        self.render_sections()
+
+    @staticmethod
+    def _chart_section(key: str, chart: ChartViewModel, estimated_height: int) -> SectionSpec:
+        return SectionSpec(key, chart,
+                           lambda parent: LabeledBarChartFrame(parent, title=chart.title, groups=chart.groups),
+                           estimated_height=estimated_height)
+
+    def section_specs(self) -> List[SectionSpec]:
+        view_model = self.view_model
+        return [
+            self._chart_section('genres', view_model.genres, estimated_height=400),
+            SectionSpec('popularity', view_model.popularity,
+                        lambda parent, trend=view_model.popularity: LabeledTrendFrame(parent, trend=trend),
+                        estimated_height=300),
+            self._chart_section('durations', view_model.durations, estimated_height=250),
+            self._chart_section('overlap', view_model.overlap, estimated_height=150),
+        ]
@@ -0,0 +1,223 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import customtkinter as ctk
+
+from service.library_sync import LibrarySync
+from service.search_index import KINDS, SearchHit, SearchIndex
+from utiity.ui_dispatcher import ui_dispatcher
+from utiity.ui_monitor import ui_monitor
+from .card_pool import CardPool
+from .content import Content, SectionSpec
+from .labeled_artist_cards_frame import LabeledArtistCardsFrame
+from .labeled_playlist_cards_frame import LabeledPlaylistCardsFrame
+from .labeled_track_list_frame import LabeledTrackListFrame
+from .view_models import build_search_page
+
+logger = logging.getLogger(__name__)
+
+# Number of results shown for each kind of entity
+RESULTS_PER_KIND = {'artists': 8, 'albums': 8, 'playlists': 8, 'tracks': 10}
+
+# Spotify is searched when the library has fewer matches, once the user has stopped typing for a moment
+MIN_LOCAL_RESULTS = 5
+MIN_REMOTE_QUERY_LENGTH = 3
+REMOTE_DELAY_MS = 500
+# The records of the hits are read once the user has stopped typing for this long
+RESOLVE_DELAY_MS = 80
+
+# Reads the records of the hits and searches Spotify for every search page, two workers so that a search of
+# Spotify does not hold back the reads of the library
+search_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='search')
+
+
+class SearchPageContent(Content):
+    """
+    Searches the artists, albums, playlists and tracks of the library as the user types.
+
+    Every keystroke is answered by the in-memory search index on the main thread. Once the user stops typing for a
+    moment, the records of the hits are read from the library store by a background worker, and only the sections
+    whose results have changed are rebuilt; the queries superseded in the meantime are dropped. When the library
+    has few matches, Spotify is searched once the user pauses; its results are saved in the store, which indexes
+    them for the next searches.
+    """
+    def __init__(self,
+                 master: ctk.CTkFrame,
+                 search_index: SearchIndex,
+                 library: LibrarySync,
+                 navigate_callback: Callable = None,
+                 card_pool: Optional[CardPool] = None,
+                 page_scroll_frame: Optional[ctk.CTkScrollableFrame] = None):
+        super().__init__(master, navigate_callback)
+
+        self.search_index = search_index
+        self.library = library
+        self.card_pool = card_pool
+        self.page_scroll_frame = page_scroll_frame
+
+        self.entry = None
+        self.status_label = None
+        self.query = ''
+        # Incremented by every query, results of older queries are dropped
+        self.generation = 0
+        self.resolve_job = None
+        self.remote_job = None
+
+        self.state = {kind: [] for kind in KINDS}
+        self.view_model = build_search_page('', self.state)
+
+    def render(self):
+        search_bar = ctk.CTkFrame(self.frame)
+        search_bar.pack(side='top', fill='x', padx=20, pady=(20, 0))
+
+        self.entry = ctk.CTkEntry(search_bar, height=36,
+                                  placeholder_text="Search artists, albums, playlists and tracks")
+        self.entry.pack(side='left', fill='x', expand=True, padx=10, pady=10)
+        self.entry.bind('<KeyRelease>', self.on_query_changed)
+
+        self.status_label = ctk.CTkLabel(search_bar, text='', width=220, anchor='e')
+        self.status_label.pack(side='right', padx=10)
+
+        results_frame = ctk.CTkFrame(self.frame)
+        results_frame.pack(side='top', fill='both', expand=True, padx=20, pady=20)
+        self.create_scroll_frame(results_frame, self.page_scroll_frame)
+        self.render_sections()
+        self.entry.focus_set()
+
+    def section_specs(self) -> List[SectionSpec]:
+        # The sections are always the same, so a new query only replaces the sections whose results differ
+        view_model = self.view_model
+        return [
+            SectionSpec('artists', view_model.artists,
+                        lambda parent, data=view_model.artists: LabeledArtistCardsFrame(
+                            parent,
+                            title='Artists',
+                            data=data,
+                            size=(150, 200),
+                            image_size=(130, 130),
+                            navigate_callback=self.navigate_callback,
+                            card_pool=self.card_pool),
+                        estimated_height=250),
+            SectionSpec('tracks', view_model.tracks,
+                        lambda parent, data=view_model.tracks: LabeledTrackListFrame(
+                            parent,
+                            title='Tracks',
+                            track_data=data),
+                        estimated_height=60 * len(view_model.tracks) + 60),
+            SectionSpec('albums', view_model.albums,
+                        lambda parent, data=view_model.albums: LabeledPlaylistCardsFrame(
+                            parent,
+                            title='Albums',
+                            data=data,
+                            size=(150, 200),
+                            image_size=(130, 130),
+                            navigate_callback=self.navigate_callback,
+                            card_pool=self.card_pool),
+                        estimated_height=250),
+            SectionSpec('playlists', view_model.playlists,
+                        lambda parent, data=view_model.playlists: LabeledPlaylistCardsFrame(
+                            parent,
+                            title='Playlists',
+                            data=data,
+                            size=(150, 200),
+                            image_size=(130, 130),
+                            navigate_callback=self.navigate_callback,
+                            card_pool=self.card_pool),
+                        estimated_height=250),
+        ]
+
+    def on_query_changed(self, event=None):
+        query = self.entry.get()
+        if query == self.query:
+            return
+        self.query = query
+        self.generation += 1
+        self._cancel_jobs()
+
+        with ui_monitor.measure('search', 'local'):
+            hits = self.search_index.search_by_kind(query, RESULTS_PER_KIND)
+        count = sum(len(kind_hits) for kind_hits in hits.values())
+        self.status_label.configure(text=f"{count} results in your library" if query.strip() else '')
+
+        generation = self.generation
+        self.resolve_job = self.frame.after(RESOLVE_DELAY_MS, self._submit_resolve, generation, query, hits)
+
+        if (count < MIN_LOCAL_RESULTS and len(query.strip()) >= MIN_REMOTE_QUERY_LENGTH
+                and self.library is not None):
+            self.remote_job = self.frame.after(REMOTE_DELAY_MS, self._search_remote, generation, query)
+
+    def _cancel_jobs(self):
+        for job in (self.resolve_job, self.remote_job):
+            if job is not None:
+                self.frame.after_cancel(job)
+        self.resolve_job = None
+        self.remote_job = None
+
+    def _submit_resolve(self, generation: int, query: str, hits: Dict[str, List[SearchHit]]):
+        self.resolve_job = None
+        search_executor.submit(self._resolve, generation, query, hits)
+
+    def _load_hits(self, hits: Dict[str, List[SearchHit]]) -> Dict[str, List[Any]]:
+        return {kind: self.library.load_entities(kind, [hit.id for hit in hits.get(kind, ())]) for kind in KINDS}
+
+    def _resolve(self, generation: int, query: str, hits: Dict[str, List[SearchHit]],
+                 remote: Optional[Dict[str, List[Any]]] = None):
+        """Reads the records of the hits and prepares their view. Runs in a background thread."""
+        if generation != self.generation:
+            # Superseded while waiting for the worker
+            return
+        try:
+            results = self._load_hits(hits)
+        except Exception as e:
+            logger.error(f"Error reading the search results of {query!r}: {e}")
+            return
+        if remote:
+            results = self._merge(results, remote)
+        # Only the results of the last query are worth rendering
+        ui_dispatcher.post(self._show_results, generation, results, build_search_page(query, results),
+                           key=('search', 'results'))
+
+    @staticmethod
+    def _merge(local: Dict[str, List[Any]], remote: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        """Appends the remote results missing from the local ones, within the number of results of each kind."""
+        merged = {}
+        for kind in KINDS:
+            known = {item.id for item in local[kind]}
+            extra = [item for item in remote.get(kind, ()) if item.id not in known]
+            merged[kind] = (local[kind] + extra)[:RESULTS_PER_KIND[kind]]
+        return merged
+
+    def _show_results(self, generation: int, results: Dict[str, List[Any]], view_model):
+        if self.discarded or generation != self.generation:
+            return
+        self.update_state(results, (view_model, None))
+
+    def _search_remote(self, generation: int, query: str):
+        self.remote_job = None
+        self.status_label.configure(text="Searching Spotify...")
+
+        def search():
+            if generation != self.generation:
+                return
+            try:
+                remote = self.library.search(query)
+            except Exception as e:
+                logger.error(f"Error searching Spotify for {query!r}: {e}")
+                ui_dispatcher.post(self._show_status, generation, "Spotify could not be reached")
+                return
+            # The remote results are indexed now, the local lookup ranks them with the rest of the library
+            hits = self.search_index.search_by_kind(query, RESULTS_PER_KIND)
+            self._resolve(generation, query, hits, remote)
+            count = sum(len(items) for items in remote.values())
+            ui_dispatcher.post(self._show_status, generation, f"{count} results from Spotify")
+
+        search_executor.submit(search)
+
+    def _show_status(self, generation: int, text: str):
+        if not self.discarded and generation == self.generation:
+            self.status_label.configure(text=text)
+
+    def discard(self):
+        self._cancel_jobs()
+        super().discard()
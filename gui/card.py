@@ -1,12 +1,17 @@
 import threading
+from functools import lru_cache
 from typing import Tuple, Optional, Callable, Any
 from PIL import Image
 import logging
 
 import customtkinter as ctk
 
-from utiity.image_cache import ImageCache
+from service.prefetcher import prefetcher
+from utiity.image_cache import image_cache
 from utiity.image_processing import create_rounded_image
+from utiity.text_layout import text_layout
+from utiity.ui_dispatcher import ui_dispatcher
+from utiity.ui_monitor import ui_monitor
 
 logger = logging.getLogger(__name__)
 
@@ -39,56 +44,127 @@ class Card(ctk.CTkFrame):
                  **kwargs):
         super().__init__(*args, width=card_size[0], height=card_size[1], corner_radius=10, **kwargs)
 
-        self.image_url = image_url
-        self.artist_name = name
-        self.subtitle = subtitle
-        self.role = role
-        self.image_size = image_size
-        self.card_size = card_size
-        self.rounded = rounded
-        self.image_cache = ImageCache()
+        self.image_cache = image_cache
         self.image_label = None
+        self.name_label = None
+        self.subtitle_label = None
         self.action_button = None
-        self.navigate_callback = navigate_callback
-        self.data = data
-
-        self.action_button_x = image_size[0] - 50
-        self.action_button_y = image_size[1] - 30
 
         self.debounce_job = None
+        self.intent_job = None
         self.button_visible = False
 
-        # Creation of content type identifier for the next artist called page
-        self.content_type_identifier = f'Artist:{self.artist_name}'
+        # Incremented at every rebind so that images loaded for the previous data are discarded
+        self.image_generation = 0
 
         self.init_ui()
         self.bind_events()
+        self.rebind(image_url=image_url,
+                    image_size=image_size,
+                    name=name,
+                    subtitle=subtitle,
+                    role=role,
+                    card_size=card_size,
+                    rounded=rounded,
+                    navigate_callback=navigate_callback,
+                    data=data)
 
     def init_ui(self):
         """Initializes the UI components of the ArtistCard."""
-        # Fetch and display the artist's image
         self.image_label = ctk.CTkLabel(self, text='')
         self.image_label.pack(pady=10, padx=10)
-        self.load_image()
 
-        # Use tkinter font metrics to truncate text if necessary
-        font = ctk.CTkFont(family="Arial", size=10, weight="bold")
-        truncated_name = self._truncate_text_to_fit(self.artist_name, font, self.card_size[0] - 20)
-        name_label = ctk.CTkLabel(self, text=truncated_name, font=font)
-        name_label.pack()
+        self.name_label = ctk.CTkLabel(self, text='', font=text_layout.get_font(family="Arial", size=10, weight="bold"))
+        self.name_label.pack()
 
         # subtitle Label ("Artist")
-        subtitle_label = ctk.CTkLabel(self, text=self.subtitle, font=('Arial', 9))
-        subtitle_label.pack(pady=(0, 5))
+        self.subtitle_label = ctk.CTkLabel(self, text='', font=('Arial', 9))
+        self.subtitle_label.pack(pady=(0, 5))
 
         # Position action button in the bottom right corner of the image
         self.action_button = ctk.CTkButton(self.image_label,
                                            text='',
-                                           corner_radius=15 if self.rounded else 0,
                                            width=30,
                                            height=30
                                            )
 
+    def rebind(self,
+               image_url: str,
+               image_size: Tuple[int, int],
+               name: str,
+               subtitle: str,
+               role: str,
+               card_size: Tuple = (150, 200),
+               rounded: bool = False,
+               navigate_callback: Optional[Callable] = None,
+               data: Optional[Any] = None):
+        """
+        Binds the card to a new item, reconfiguring the existing widgets instead of creating new ones.
+        """
+        self.image_url = image_url
+        self.artist_name = name
+        self.subtitle = subtitle
+        self.role = role
+        self.image_size = image_size
+        self.card_size = card_size
+        self.rounded = rounded
+        self.navigate_callback = navigate_callback
+        self.data = data
+
+        self.action_button_x = image_size[0] - 50
+        self.action_button_y = image_size[1] - 30
+
+        # Creation of content type identifier for the next artist called page
+        self.content_type_identifier = f'Artist:{self.artist_name}'
+
+        self.configure(width=card_size[0], height=card_size[1])
+        self.action_button.configure(corner_radius=15 if rounded else 0)
+
+        # Use the shared font metrics to truncate text if necessary
+        font = text_layout.get_font(family="Arial", size=10, weight="bold")
+        self.name_label.configure(text=self._truncate_text_to_fit(self.artist_name, font, card_size[0] - 20))
+        self.subtitle_label.configure(text=self.subtitle)
+
+        # Fetch and display the item's image
+        self.load_image()
+
+    def reset(self):
+        """Detaches the card from its item so that it can wait in a pool without pinning data or images."""
+        if self.debounce_job is not None:
+            self.after_cancel(self.debounce_job)
+            self.debounce_job = None
+        self._cancel_intent()
+        self.action_button.place_forget()
+        self.button_visible = False
+
+        self.image_generation += 1
+        self._show_blank_image()
+        self.navigate_callback = None
+        self.data = None
+
+    def _show_blank_image(self):
+        blank_image = self._blank_image(self.image_size)
+        self.image_label.configure(image=blank_image)
+        self.image_label.image = blank_image
+
+    def _show_placeholder(self, image_url: str, image_size: Tuple[int, int], rounded: bool):
+        """Shows the placeholder of an image seen before, or a blank image, until the image is loaded."""
+        placeholder = self.image_cache.placeholder(image_url, image_size)
+        if placeholder is None:
+            self._show_blank_image()
+            return
+        if rounded:
+            placeholder = create_rounded_image(placeholder, image_size)
+        photo_image = ctk.CTkImage(light_image=placeholder, dark_image=placeholder, size=image_size)
+        self.image_label.configure(image=photo_image)
+        self.image_label.image = photo_image
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _blank_image(size: Tuple[int, int]) -> ctk.CTkImage:
+        transparent = Image.new('RGBA', size, (0, 0, 0, 0))
+        return ctk.CTkImage(light_image=transparent, dark_image=transparent, size=size)
+
     def _go_to(self):
         if self.navigate_callback:
             self.navigate_callback(self.content_type_identifier, self.data)
@@ -97,7 +173,7 @@ class Card(ctk.CTkFrame):
         """Binds necessary events for the card while ensuring no redundant triggers."""
         self.bind("<Enter>", lambda event: self.show_button(), add="+")
         self.bind("<Leave>", lambda event: self.hide_button(), add="+")
-        self.bind("<Button-1>", self._go_to, add="+")
+        self.bind("<Button-1>", lambda event: self._go_to(), add="+")
         # For child widgets, make sure to stop the propagation of events.
         for widget in self.winfo_children():
             widget.bind("<Enter>", lambda event: event.widget.master.show_button(), add="+")
@@ -114,6 +190,19 @@ class Card(ctk.CTkFrame):
             self.button_visible = True
             self.action_button.place(x=self.action_button_x, y=self.action_button_y)
 
+        # A sustained hover announces the intent to open the page, which is prefetched meanwhile
+        if self.intent_job is None and prefetcher.enabled:
+            self.intent_job = self.after(prefetcher.hover_delay_ms, self._on_hover_intent)
+
+    def _on_hover_intent(self):
+        self.intent_job = None
+        prefetcher.hint(self.content_type_identifier, self.data)
+
+    def _cancel_intent(self):
+        if self.intent_job is not None:
+            self.after_cancel(self.intent_job)
+            self.intent_job = None
+
     def hide_button(self, event=None):
         """Debounce the hiding of the button."""
         if self.debounce_job is not None:
@@ -132,39 +221,47 @@ class Card(ctk.CTkFrame):
         if not (card_x1 <= x <= card_x2 and card_y1 <= y <= card_y2):
             self.action_button.place_forget()
             self.button_visible = False
+            self._cancel_intent()
 
         self.debounce_job = None
 
     def load_image(self):
         """Loads the artist's image from the given URL and updates the label asynchronously."""
+        # Capture the item now, the card may be rebound while the image is being fetched
+        generation = self.image_generation
+        image_url, image_size, rounded, role = self.image_url, self.image_size, self.rounded, self.role
+        self._show_placeholder(image_url, image_size, rounded)
+
         def update_image_on_ui(photo_image):
-            if self.image_label.winfo_exists():  # Check if widget still exists before updating
-                self.image_label.configure(image=photo_image)
-                self.image_label.image = photo_image  # Keep a reference!
+            # Check if widget still exists and still shows the same item before updating
+            if self.image_label.winfo_exists() and generation == self.image_generation:
+                with ui_monitor.measure('image_update'):
+                    self.image_label.configure(image=photo_image)
+                    self.image_label.image = photo_image  # Keep a reference!
 
         def fetch_and_apply_image():
             try:
-                if self.image_url:
-                    image = self.image_cache.fetch_image(self.image_url)
+                if image_url:
+                    image = self.image_cache.fetch_image(image_url)
                 else:
-                    image = Image.open(self.DEFAULT_LOGOS[self.role])
+                    image = Image.open(self.DEFAULT_LOGOS[role])
 
-                if self.rounded:
-                    image = create_rounded_image(image, self.image_size)
+                if rounded:
+                    image = create_rounded_image(image, image_size)
 
                 photo_image = ctk.CTkImage(light_image=image,
                                            dark_image=image,
-                                           size=self.image_size)
-                self.image_label.after(0, update_image_on_ui, photo_image)
+                                           size=image_size)
+                ui_dispatcher.post(update_image_on_ui, photo_image, key=(id(self), 'image'))
 
             except Exception as e:
                 logger.error(f"Error loading artist image: {e}")
                 # Load default image if error
-                default_image = Image.open(self.DEFAULT_LOGOS[self.role])
+                default_image = Image.open(self.DEFAULT_LOGOS[role])
                 photo_image = ctk.CTkImage(light_image=default_image,
                                            dark_image=default_image,
-                                           size=self.image_size)
-                self.image_label.after(0, update_image_on_ui, photo_image)
+                                           size=image_size)
+                ui_dispatcher.post(update_image_on_ui, photo_image, key=(id(self), 'image'))
 
         # Start the image loading in a separate thread
         thread = threading.Thread(target=fetch_and_apply_image)
@@ -172,10 +269,6 @@ class Card(ctk.CTkFrame):
 
     def _truncate_text_to_fit(self, text, font, max_width):
         """
-        Truncates text to fit within the specified width with an ellipsis if necessary using tkinter font metrics.
+        Truncates text to fit within the specified width with an ellipsis if necessary using cached font metrics.
         """
-        text_width = font.measure(text)
-        while text_width > max_width:
-            text = text[:-1]
-            text_width = font.measure(text + '...')
-        return text + '...' if text != self.artist_name else text
+        return text_layout.truncate(text, font, max_width)
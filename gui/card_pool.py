@@ -0,0 +1,80 @@
+import logging
+from typing import List
+
+import customtkinter as ctk
+
+from .card import Card
+
+logger = logging.getLogger(__name__)
+
+
+class CardPool:
+    """
+    A pool of reusable Card widgets shared by the pages of the application.
+
+    Tk widgets cannot change parent, so every pooled card is a child of the same long-lived `master` and is laid
+    out inside the card containers with `grid(in_=...)`. The containers must therefore be descendants of the
+    master. When a container is destroyed its cards go back to the pool and are rebound to new data by the next
+    page, which only reconfigures the existing widgets.
+
+    Attributes:
+        master: The widget owning every pooled card.
+        max_idle (int): The maximum number of idle cards kept alive, extra cards are destroyed on release.
+        created (int): The number of cards created by the pool.
+        reused (int): The number of times an idle card has been handed out again.
+    """
+
+    def __init__(self, master: ctk.CTkBaseClass, max_idle: int = 150):
+        self.master = master
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle: List[Card] = []
+
+    def can_host(self, container) -> bool:
+        """Returns True if the pooled cards can be laid out inside the container."""
+        return str(container).startswith(str(self.master) + '.')
+
+    def acquire(self, **card_options) -> Card:
+        """
+        Returns a card bound to the given options, reusing an idle card when one is available.
+
+        Parameters:
+            **card_options: The keyword arguments accepted by `Card.rebind`.
+        """
+        card = None
+        while self._idle and card is None:
+            candidate = self._idle.pop()
+            if candidate.winfo_exists():
+                card = candidate
+
+        if card is not None:
+            card.rebind(**card_options)
+            self.reused += 1
+        else:
+            card = Card(self.master, **card_options)
+            self.created += 1
+
+        # Pooled cards are siblings of the frames holding them, keep them above in the stacking order
+        card.lift()
+        return card
+
+    def release(self, card: Card):
+        """Gives a card back to the pool."""
+        if not card.winfo_exists():
+            return
+
+        card.grid_forget()
+        if len(self._idle) < self.max_idle:
+            card.reset()
+            self._idle.append(card)
+        else:
+            card.destroy()
+
+    def clear(self):
+        """Destroys every idle card."""
+        for card in self._idle:
+            if card.winfo_exists():
+                card.destroy()
+        self._idle.clear()
+        logger.info(f"Card pool cleared: {self.created} cards created, {self.reused} reused")
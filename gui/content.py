@@ -1,10 +1,37 @@
+import logging
 import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Callable
+from typing import Callable, Optional, Any, List, NamedTuple, Tuple
 
 import customtkinter as ctk
 
 from ctk_components import CTkLoader
+from gui.lazy_section_loader import LazySectionLoader
+from gui.profile_info_component import ProfileInfoComponent
+from gui.view_models import HeaderViewModel
+from service.prefetcher import prefetcher
+from utiity.image_processing import create_rounded_image
+from utiity.ui_dispatcher import ui_dispatcher
+from utiity.ui_monitor import ui_monitor
+
+logger = logging.getLogger(__name__)
+
+
+class SectionSpec(NamedTuple):
+    """
+    A section of the scrollable area of a page.
+
+    Attributes:
+        key (str): The name of the section.
+        value: The part of the view model shown by the section, compared to decide whether to rebuild it.
+        factory (Callable): Receives the parent widget and returns the section widget.
+        estimated_height (int): The height reserved for the section until it is built.
+    """
+    key: str
+    value: Any
+    factory: Callable
+    estimated_height: int = 300
 
 
 class Content(ABC):
@@ -20,35 +47,203 @@ class Content(ABC):
         self.loading_indicator = CTkLoader(master=self.frame, opacity=0.8, width=40, height=40)
         self.loading_indicator.place(relx=0.5, rely=0.5, anchor='center')
 
+        # Scrollable area of the page and the sections lazily built inside it
+        self.scroll_frame: Optional[ctk.CTkScrollableFrame] = None
+        self.shared_scroll_frame = False
+        self.sections: Optional[LazySectionLoader] = None
+
+        # Raw data of the page (JSON serializable) and what is prepared from it for the render
+        self.state: Any = None
+        self.view_model: Any = None
+        self.header_image = None
+
+        # Where the last state of the page is persisted, see `enable_snapshots`
+        self.snapshot_store = None
+        self.content_type_identifier: Optional[str] = None
+
+        # What has been rendered, compared with the new view model when the page is revalidated
+        self.rendered_header = None
+        self.rendered_sections = {}
+        self.discarded = False
+
     def show_loading_indicator(self):
         self.loading_indicator.place(relx=0.5, rely=0.5, anchor='center')  # Center in the frame
         self.loading_indicator.lift()  # Make sure it's above all other widgets
 
     def hide_loading_indicator(self):
+        # Posted by the loading thread, the page may have been left since
+        if self.discarded:
+            return
         self.loading_indicator.place_forget()  # Hide the loader
 
+    def enable_snapshots(self, snapshot_store, content_type_identifier: str):
+        """
+        Persists the state of the page in the snapshot store under its content type identifier. The next visit
+        renders the persisted state immediately and revalidates it in the background.
+        """
+        self.snapshot_store = snapshot_store
+        self.content_type_identifier = content_type_identifier
+
+    @property
+    def has_state(self) -> bool:
+        """Whether the page loads its data through `fetch_state` and `prepare_view`."""
+        return type(self).fetch_state is not Content.fetch_state
+
     def load_and_display(self):
         """
         Loads the necessary data asynchronously and initiates rendering of the content.
         This method should handle both data preparation and the subsequent update of the UI.
+
+        Pages with a persisted state are rendered right away from it (stale), while the fresh state is fetched
+        in the background (revalidate) and applied as a diff if it differs.
         """
+        navigation_start = time.perf_counter()
+        page_type = type(self).__name__
+
+        def load():
+            if not self.has_state:
+                with ui_monitor.measure_page(page_type, 'load_data'):
+                    self.load_data()
+                # Tk must only be touched from the main thread
+                ui_dispatcher.post(self.finish_loading, navigation_start)
+                return
+
+            snapshot = self._read_snapshot()
+            if snapshot is not None:
+                ui_dispatcher.post(self.show_state, snapshot, self.prepare_view(snapshot), navigation_start)
+
+            try:
+                with ui_monitor.measure_page(page_type, 'load_data'):
+                    state = self.fetch_state(refresh=snapshot is not None)
+            except Exception as e:
+                if snapshot is None:
+                    # Nothing to show, the page is left empty rather than loading forever
+                    logger.error(f"Error loading {page_type}: {e}")
+                    ui_dispatcher.post(self.hide_loading_indicator)
+                    return
+                # The page keeps showing the last known data
+                logger.error(f"Error revalidating {self.content_type_identifier}: {e}")
+                return
+
+            if snapshot is None:
+                ui_dispatcher.post(self.show_state, state, self.prepare_view(state), navigation_start)
+            elif state != snapshot:
+                ui_dispatcher.post(self.update_state, state, self.prepare_view(state))
+            self._write_snapshot(state)
+
         def async_load():
-            self.show_loading_indicator()
-            # Simulate loading
-            self.load_data()
-            self.master.after(0, self.finish_loading)
+            try:
+                load()
+            finally:
+                prefetcher.end_foreground()
+
+        # Prefetching pauses while the page loads
+        prefetcher.begin_foreground()
+        self.show_loading_indicator()
+        threading.Thread(target=async_load, daemon=True).start()
+
+    def _read_snapshot(self):
+        if self.snapshot_store is None or not self.content_type_identifier:
+            return None
+        try:
+            snapshot = self.snapshot_store.get_page_snapshot(self.content_type_identifier)
+            return self.decode_state(snapshot) if snapshot is not None else None
+        except Exception as e:
+            logger.error(f"Error reading the snapshot of {self.content_type_identifier}: {e}")
+            return None
+
+    def _write_snapshot(self, state):
+        if self.snapshot_store is None or not self.content_type_identifier:
+            return
+        try:
+            self.snapshot_store.save_page_snapshot(self.content_type_identifier, self.encode_state(state))
+        except Exception as e:
+            logger.error(f"Error saving the snapshot of {self.content_type_identifier}: {e}")
+
+    def show_state(self, state, view: Tuple[Any, Any], navigation_start: Optional[float] = None):
+        """Renders a state prepared in the background. Runs on the main thread."""
+        if self.discarded:
+            return
+        self.state = state
+        self.view_model, self.header_image = view
+        self.finish_loading(navigation_start)
+
+    def update_state(self, state, view: Tuple[Any, Any]):
+        """Applies a revalidated state, rebuilding only what has changed. Runs on the main thread."""
+        if self.discarded:
+            return
+        self.state = state
+        self.view_model, self.header_image = view
+
+        with ui_monitor.measure_page(type(self).__name__, 'update'):
+            specs = self.section_specs()
+            same_layout = [spec.key for spec in specs] == list(self.rendered_sections)
+            if self.sections is None or not same_layout or self._header_of(self.view_model) != self.rendered_header:
+                self.clear()
+                self.render()
+                return
+
+            for spec in specs:
+                if spec.value != self.rendered_sections[spec.key]:
+                    self.sections.replace_section(spec.key, spec.factory)
+                    self.rendered_sections[spec.key] = spec.value
 
-        threading.Thread(target=async_load).start()
+    @staticmethod
+    def _header_of(view_model):
+        return getattr(view_model, 'header', None)
 
-    def finish_loading(self):
-        self.render()
+    def finish_loading(self, navigation_start: Optional[float] = None):
+        if self.discarded:
+            return
+        page_type = type(self).__name__
+        with ui_monitor.measure_page(page_type, 'render'):
+            self.render()
         self.hide_loading_indicator()
+        if navigation_start is not None:
+            ui_monitor.mark_first_paint(self.frame, page_type, navigation_start)
 
-    @abstractmethod
     def load_data(self):
-        """ Method to load data required for the content. """
+        """ Method to load data required for the content, for pages without state. """
         pass
 
+    def fetch_state(self, refresh: bool = False) -> Any:
+        """
+        Returns the data of the page, serialized by `encode_state` for the snapshots. Runs in a background thread.
+
+        Parameters:
+            refresh (bool): Whether the data must be fetched again instead of being read from local caches.
+        """
+        return None
+
+    def encode_state(self, state) -> Any:
+        """Returns the JSON serializable form of a state, saved as the snapshot of the page."""
+        return state
+
+    def decode_state(self, snapshot) -> Any:
+        """Returns the state saved in a snapshot by `encode_state`."""
+        return snapshot
+
+    def prepare_view(self, state) -> Tuple[Any, Any]:
+        """
+        Returns the view model and the header image prepared from a state. Runs in a background thread.
+        """
+        return None, None
+
+    def section_specs(self) -> List[SectionSpec]:
+        """Returns the sections of the scrollable area of the page, built from the current view model."""
+        return []
+
+    def render_sections(self):
+        """Adds the sections returned by `section_specs` to the lazy loader of the scrollable area."""
+        self.rendered_header = self._header_of(self.view_model)
+        self.rendered_sections = {}
+        for spec in self.section_specs():
+            self.sections.add_section(spec.factory,
+                                      estimated_height=spec.estimated_height,
+                                      key=spec.key,
+                                      fill='both', expand=True, pady=10)
+            self.rendered_sections[spec.key] = spec.value
+
     @abstractmethod
     def render(self):
         """
@@ -57,13 +252,83 @@ class Content(ABC):
         """
         pass
 
+    @staticmethod
+    def load_header_image(image_cache, header: HeaderViewModel):
+        """
+        Fetches the header image and makes it round. Meant to run on the loader thread, in `load_data`.
+        """
+        if header.image is None:
+            return None
+        image = image_cache.fetch_image(header.image.url)
+        return create_rounded_image(image, Content.header_image_size(header))
+
+    @staticmethod
+    def header_image_size(header: HeaderViewModel):
+        return header.image.size if header.image.width and header.image.height else (200, 200)
+
+    def render_header(self, parent, header: HeaderViewModel, header_image=None):
+        """Renders the header image, if any, followed by the header information into parent."""
+        if header_image is not None:
+            size = self.header_image_size(header)
+            ctk_image = ctk.CTkImage(light_image=header_image, dark_image=header_image, size=size)
+            image_label = ctk.CTkLabel(parent, image=ctk_image, text='')
+            image_label.image = ctk_image  # keep a reference
+            image_label.pack(padx=10, pady=10)
+
+        for label, value in header.info:
+            ProfileInfoComponent(parent, label, value).pack(fill='x', pady=2, padx=5)
+
+    def create_scroll_frame(self, parent, shared_scroll_frame: Optional[ctk.CTkScrollableFrame] = None):
+        """
+        Creates the scrollable area of the page inside parent, with a lazy loader for its sections.
+
+        When a shared scrollable frame is given, it is laid out inside parent instead of creating a new one. The
+        shared frame outlives the page, which lets pooled widgets living in it be reused by the next page.
+        """
+        if shared_scroll_frame is not None:
+            self.scroll_frame = shared_scroll_frame
+            self.shared_scroll_frame = True
+            self.scroll_frame.pack(in_=parent, fill='both', expand=True)
+            # The shared frame is a sibling of the page frame, keep it above the page
+            self.scroll_frame.lift()
+            self.scroll_frame._parent_canvas.yview_moveto(0)
+        else:
+            self.scroll_frame = ctk.CTkScrollableFrame(parent)
+            self.scroll_frame.pack(fill='both', expand=True)
+
+        self.sections = LazySectionLoader(self.scroll_frame)
+        return self.scroll_frame
+
     def clear(self):
         """
         Clear the content frame.
         This removes all widgets from the frame, useful when refreshing or changing content.
         """
+        if self.sections is not None:
+            self.sections.destroy()
+            self.sections = None
+        if self.shared_scroll_frame and self.scroll_frame is not None:
+            self.scroll_frame.pack_forget()
+        # The next render lays out a scroll frame again, shared or not
+        self.scroll_frame = None
+        self.shared_scroll_frame = False
+
         for widget in self.frame.winfo_children():
-            widget.destroy()
+            if widget is not self.loading_indicator:
+                widget.destroy()
+
+    def discard(self):
+        """
+        Clears and destroys the page for good, pending background updates are ignored. The data of the page is
+        dropped as well, so that a pending update still referencing the page does not keep it alive.
+        """
+        self.discarded = True
+        self.clear()
+        self.hide()
+        self.frame.destroy()
+        self.state = self.view_model = self.header_image = None
+        self.rendered_header = None
+        self.rendered_sections = {}
 
     def show(self):
         """
@@ -1,6 +1,6 @@
 import customtkinter as ctk
 from PIL import Image
-from utiity.image_cache import ImageCache
+from utiity.image_cache import ImageCache, image_cache as shared_image_cache
 
 
 class HeaderBar(ctk.CTkFrame):
@@ -11,13 +11,15 @@ class HeaderBar(ctk.CTkFrame):
     Attributes:
         master (ctk.CTk): The parent widget.
         buttons (list): A list of strings representing the button labels.
-        image_path (str): The file path to the header image.
+        image_path (str): The URL of the profile image, or None to show the button without image until
+            `set_profile_image` is called.
         on_button_click (function): A callback function for button click events.
         navigate_back (function): A callback function for the back navigation button.
         navigate_forward (function): A callback function for the forward navigation button.
     """
 
-    def __init__(self, master, buttons, image_path, on_button_click, navigate_back, navigate_forward, **kwargs):
+    def __init__(self, master, buttons, image_path, on_button_click, navigate_back, navigate_forward,
+                 image_cache: ImageCache = None, **kwargs):
         super().__init__(master, height=80, **kwargs)
         self.pack_propagate(False)
         self.master = master
@@ -27,7 +29,8 @@ class HeaderBar(ctk.CTkFrame):
         self.navigate_back = navigate_back
         self.navigate_forward = navigate_forward
 
-        self.image_cache = ImageCache()
+        self.image_cache = image_cache or shared_image_cache
+        self.image_button = None
 
         self.create_widgets()
 
@@ -52,9 +55,13 @@ class HeaderBar(ctk.CTkFrame):
             button.pack(side='left', padx=10)
 
         # Profile image button
-        profile_image = self.image_cache.fetch_image(self.image_path)
+        self.image_button = ctk.CTkButton(self, command=lambda b="Profile": self.on_button_click(b), text='Profile')
+        self.image_button.pack(side='right', padx=10)
+        if self.image_path:
+            self.set_profile_image(self.image_cache.fetch_image(self.image_path))
+
+    def set_profile_image(self, profile_image):
+        """Shows a PIL image on the profile button. Must be called from the main thread."""
         image = ctk.CTkImage(light_image=profile_image,
-                                  dark_image=profile_image)
-        image_button = ctk.CTkButton(self, image=image,
-                                     command=lambda b="Profile": self.on_button_click(b), text='Profile')
-        image_button.pack(side='right', padx=10)
+                             dark_image=profile_image)
+        self.image_button.configure(image=image)
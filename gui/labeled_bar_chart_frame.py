@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+import customtkinter as ctk
+
+from gui.view_models import BarViewModel
+
+
+class LabeledBarChartFrame(ctk.CTkFrame):
+    """
+    A titled row of horizontal bar charts, one column for each group of bars.
+
+    Attributes:
+        title (str): The title of the section.
+        groups (list): The (title, bars) of each chart, shown side by side.
+    """
+
+    def __init__(self, *args, title: str, groups: List[Tuple[str, List[BarViewModel]]], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.title = title
+        self.groups = groups
+        self.init_ui()
+
+    def init_ui(self):
+        title_label = ctk.CTkLabel(self, text=self.title, font=('Arial', 14, 'bold'))
+        title_label.pack(pady=(10, 20), padx=20)
+
+        charts_frame = ctk.CTkFrame(self)
+        charts_frame.pack(fill='both', expand=True, padx=10, pady=10)
+        for column, (group_title, bars) in enumerate(self.groups):
+            charts_frame.grid_columnconfigure(column, weight=1, uniform='charts')
+            self.create_chart(charts_frame, group_title, bars).grid(row=0, column=column, sticky='new', padx=5)
+
+    @staticmethod
+    def create_chart(parent, title: str, bars: List[BarViewModel]) -> ctk.CTkFrame:
+        frame = ctk.CTkFrame(parent, corner_radius=5)
+        frame.grid_columnconfigure(1, weight=1)
+        row = 0
+        if title:
+            ctk.CTkLabel(frame, text=title, font=('Arial', 12, 'bold')).grid(row=row, column=0, columnspan=3,
+                                                                            pady=(5, 10))
+            row += 1
+        if not bars:
+            ctk.CTkLabel(frame, text="No data yet", font=('Arial', 10)).grid(row=row, column=0, columnspan=3,
+                                                                            pady=10)
+        for bar in bars:
+            ctk.CTkLabel(frame, text=bar.label, font=('Arial', 10), anchor='w').grid(row=row, column=0, sticky='w',
+                                                                                    padx=(10, 5), pady=2)
+            progress = ctk.CTkProgressBar(frame, height=10)
+            progress.set(bar.fraction)
+            progress.grid(row=row, column=1, sticky='ew', padx=5, pady=2)
+            ctk.CTkLabel(frame, text=bar.text, font=('Arial', 10), width=40, anchor='e').grid(row=row, column=2,
+                                                                                             padx=(5, 10), pady=2)
+            row += 1
+        return frame
@@ -1,16 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Tuple, List, Callable, Optional
+from typing import Tuple, List, Callable, Optional
 
 import customtkinter as ctk
 
+from .card import Card
+from .card_pool import CardPool
+from .view_models import CardViewModel
+from utiity.ui_monitor import ui_monitor
+
 
 class LabeledCardsFrame(ctk.CTkFrame, ABC):
     def __init__(self, *args,
                  title: str,
-                 data: List[Dict[str, Any]],
+                 data: List[CardViewModel],
                  size: Tuple = (150, 200),
                  image_size: Tuple = (100, 100),
                  navigate_callback: Optional[Callable] = None,
+                 card_pool: Optional[CardPool] = None,
                  **kwargs):
         super().__init__(*args, **kwargs)
         self.title = title
@@ -18,46 +24,59 @@ class LabeledCardsFrame(ctk.CTkFrame, ABC):
         self.size = size
         self.image_size = image_size
         self.cards = []
+        self.cards_frame = None
         self.navigate_callback = navigate_callback
+        self.card_pool = card_pool
         self.init_ui()
 
     def init_ui(self):
         title_label = ctk.CTkLabel(self, text=self.title, font=('Arial', 14, 'bold'))
         title_label.pack(pady=(10, 20), padx=20)
 
-        cards_frame = ctk.CTkFrame(self)
-        cards_frame.pack(fill='both', expand=True)
+        self.cards_frame = ctk.CTkFrame(self)
+        self.cards_frame.pack(fill='both', expand=True)
 
         for item in self.data:
-            image = None
-            if item['images'] and item['images'][0]['width']:
-                image = max(item["images"], key=lambda img: img["width"] * img["height"])
-            elif item['images']:
-                image = item["images"][0]
-
             card = self.create_card(
-                container=cards_frame,
-                image_url=image['url'] if image else image,
-                name=item['name'],
-                additional_info=self.get_additional_info(item),
+                container=self.cards_frame,
+                image_url=item.image_url,
+                name=item.name,
+                additional_info=item.subtitle,
                 card_size=self.size,
                 image_size=self.image_size,
                 navigate_callback=self.navigate_callback,
-                data=item
+                data=item.data
             )
             self.cards.append(card)
 
         self.bind("<Configure>", self.adjust_layout)
 
-    @abstractmethod
-    def create_card(self, container, image_url, name, additional_info, card_size, image_size, navigate_callback, data):
-        pass
+    def new_card(self, container, **card_options) -> Card:
+        """
+        Returns a card for the container, taken from the card pool when the container can host pooled cards.
+        """
+        if self.card_pool is not None and self.card_pool.can_host(container):
+            return self.card_pool.acquire(**card_options)
+        return Card(container, **card_options)
+
+    def destroy(self):
+        # Pooled cards are not children of this frame, give them back instead of letting them float around
+        if self.card_pool is not None:
+            for card in self.cards:
+                if card.master is self.card_pool.master:
+                    self.card_pool.release(card)
+        self.cards.clear()
+        super().destroy()
 
     @abstractmethod
-    def get_additional_info(self, item):
+    def create_card(self, container, image_url, name, additional_info, card_size, image_size, navigate_callback, data):
         pass
 
     def adjust_layout(self, event=None):
+        with ui_monitor.measure('adjust_layout', self.title):
+            self._layout_cards()
+
+    def _layout_cards(self):
         card_width = 150
         padding = 5
         container_width = self.winfo_width()
@@ -67,7 +86,7 @@ class LabeledCardsFrame(ctk.CTkFrame, ABC):
         row, column = 0, 0
         for card in self.cards:
             card.grid_forget()
-            card.grid(row=row, column=column, padx=padding, pady=padding)
+            card.grid(row=row, column=column, padx=padding, pady=padding, in_=self.cards_frame)
             column += 1
             if column >= cards_per_row:
                 column = 0
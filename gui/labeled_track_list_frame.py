@@ -1,16 +1,32 @@
+import logging
+import threading
 from datetime import time
 
 import customtkinter as ctk
-from utiity.image_cache import ImageCache
+
+from gui.view_models import format_duration
+from utiity.image_cache import image_cache
+from utiity.text_layout import text_layout
+from utiity.ui_dispatcher import ui_dispatcher
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE = (50, 50)
 
 
 class LabeledTrackListFrame(ctk.CTkFrame):
+    """
+    A titled list of tracks. The rows are built at once with the placeholders of the images seen before, the
+    images are then loaded in order by a background thread.
+    """
     def __init__(self, *args, title, track_data, **kwargs):
         super().__init__(*args, **kwargs)
         self.tracks_frame = None
         self.title = title
         self.track_data = track_data
-        self.image_cache = ImageCache()
+        self.image_cache = image_cache
+        # (label, URL) of the images to load once the rows are built
+        self.pending_images = []
         self.init_ui()
 
     def init_ui(self):
@@ -27,18 +43,44 @@ class LabeledTrackListFrame(ctk.CTkFrame):
         self.load_tracks()
 
     def load_tracks(self):
-        for index, track in enumerate(self.track_data, start=1):
-            self.create_track_row(index, track)
+        for track in self.track_data:
+            self.create_track_row(track)
+        self.load_images()
+
+    def load_images(self):
+        """Fetches the images of the rows in a background thread, each one shown as soon as it is loaded."""
+        pending, self.pending_images = self.pending_images, []
+        if not pending:
+            return
+
+        def fetch():
+            for label, image_url in pending:
+                try:
+                    image = self.image_cache.fetch_image(image_url)
+                except Exception as e:
+                    logger.error(f"Error loading track image: {e}")
+                    continue
+                ctk_image = ctk.CTkImage(light_image=image, dark_image=image, size=IMAGE_SIZE)
+                ui_dispatcher.post(self._set_image, label, ctk_image)
+
+        threading.Thread(target=fetch, name='track-images', daemon=True).start()
 
-    def create_track_row(self, index, track):
+    @staticmethod
+    def _set_image(label, ctk_image):
+        # The list may have been destroyed meanwhile
+        if label.winfo_exists():
+            label.configure(image=ctk_image)
+            label.image = ctk_image
+
+    def create_track_row(self, track):
         row_frame = ctk.CTkFrame(self.tracks_frame, corner_radius=5)
-        row_frame.grid(row=index - 1, column=0, columnspan=5, padx=5, pady=2, sticky="ew")
+        row_frame.grid(row=track.index - 1, column=0, columnspan=5, padx=5, pady=2, sticky="ew")
         for col in range(5):
             row_frame.grid_columnconfigure(col, weight=1)
 
         components = [
-            self.create_index_frame(row_frame, index),
-            self.create_image_frame(row_frame, track['album']["images"][1]),
+            self.create_index_frame(row_frame, track.index),
+            self.create_image_frame(row_frame, track.image_url),
             self.create_info_frame(row_frame, track),
             self.create_album_frame(row_frame, track),
             self.create_length_frame(row_frame, track)
@@ -60,7 +102,7 @@ class LabeledTrackListFrame(ctk.CTkFrame):
 
     def on_label_click(self, track):
         """Handle click events on labels."""
-        print(f"Track clicked: {track['name']}")
+        print(f"Track clicked: {track.name}")
         # Implement your action here, such as opening a detail view or playing the track
 
     def create_index_frame(self, parent, index):
@@ -71,13 +113,17 @@ class LabeledTrackListFrame(ctk.CTkFrame):
         label.place(relx=0.5, rely=0.5, anchor="center")
         return frame
 
-    def create_image_frame(self, parent, image_data):
+    def create_image_frame(self, parent, image_url):
         frame = ctk.CTkFrame(parent, width=50, height=50, corner_radius=5)
         frame.grid_propagate(False)
         frame.grid(row=0, column=1, sticky="ew", padx=5, pady=5)
-        track_image = self.image_cache.fetch_image(image_data['url'])
-        ctk_image = ctk.CTkImage(light_image=track_image, dark_image=track_image, size=(50, 50))
-        label = ctk.CTkLabel(frame, image=ctk_image, text='')
+        label = ctk.CTkLabel(frame, text='')
+        if image_url:
+            placeholder = self.image_cache.placeholder(image_url, IMAGE_SIZE)
+            if placeholder is not None:
+                self._set_image(label, ctk.CTkImage(light_image=placeholder, dark_image=placeholder,
+                                                    size=IMAGE_SIZE))
+            self.pending_images.append((label, image_url))
         label.place(relwidth=1, relheight=1)
         return frame
 
@@ -89,16 +135,18 @@ class LabeledTrackListFrame(ctk.CTkFrame):
 
         # Check if the track name should be clickable
         if True:
+            font = text_layout.get_font(family='Arial', size=10)
+            underlined_font = text_layout.get_font(family='Arial', size=10, underline=True)
             track_info_label = ctk.CTkLabel(frame,
-                                            text=f"{track['name']}\n{', '.join(artist['name'] for artist in track['artists'])}",
-                                            font=('Arial', 10),
+                                            text=f"{track.name}\n{track.artists}",
+                                            font=font,
                                             cursor="hand2")  # Change cursor to indicate it's clickable
             track_info_label.bind("<Button-1>", lambda e: self.on_label_click(track))  # Bind click event
-            track_info_label.bind("<Enter>", lambda e: track_info_label.configure(font=ctk.CTkFont(family='Arial', size=10, underline=True)))
-            track_info_label.bind("<Leave>", lambda e: track_info_label.configure(font=ctk.CTkFont(family='Arial', size=10)))
+            track_info_label.bind("<Enter>", lambda e: track_info_label.configure(font=underlined_font))
+            track_info_label.bind("<Leave>", lambda e: track_info_label.configure(font=font))
         else:
             track_info_label = ctk.CTkLabel(frame,
-                                            text=f"{track['name']}\n{', '.join(artist['name'] for artist in track['artists'])}",
+                                            text=f"{track.name}\n{track.artists}",
                                             font=('Arial', 10))
 
         track_info_label.place(relx=0.5, rely=0.5, anchor="center")
@@ -108,7 +156,7 @@ class LabeledTrackListFrame(ctk.CTkFrame):
         frame = ctk.CTkFrame(parent, width=200, height=30, corner_radius=0)
         frame.grid_propagate(False)
         frame.grid(row=0, column=3, sticky="ew", padx=5)
-        label = ctk.CTkLabel(frame, text=track['album']['name'], font=('Arial', 10))
+        label = ctk.CTkLabel(frame, text=track.album_name, font=('Arial', 10))
         label.place(relx=0.5, rely=0.5, anchor="center")
         return frame
 
@@ -116,7 +164,7 @@ class LabeledTrackListFrame(ctk.CTkFrame):
         frame = ctk.CTkFrame(parent, width=100, height=30, corner_radius=0)
         frame.grid_propagate(False)
         frame.grid(row=0, column=4, sticky="ew", padx=5)
-        label = ctk.CTkLabel(frame, text=self._convert_ms_in_timeformat(track['duration_ms']), font=('Arial', 10))
+        label = ctk.CTkLabel(frame, text=track.duration, font=('Arial', 10))
         label.place(relx=0.5, rely=0.5, anchor="center")
         return frame
     # def create_track_row(self, index, track):
@@ -173,10 +221,4 @@ class LabeledTrackListFrame(ctk.CTkFrame):
 
     @staticmethod
     def _convert_ms_in_timeformat(ms):
-        h, ms = divmod(ms, 3600000)
-        m, ms = divmod(ms, 60000)
-        s = ms // 1000
-
-        formatted_time = f"{h if h != 0 else ''}{':' if h != 0 else ''}{m:02d}:{s:02d}"
-
-        return formatted_time
+        return format_duration(ms)
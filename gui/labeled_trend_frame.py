@@ -0,0 +1,79 @@
+import datetime
+from typing import List
+
+import customtkinter as ctk
+
+from gui.view_models import TrendViewModel
+
+SERIES_COLORS = ('#1DB954', '#509BF5', '#F59B23')
+
+
+class LabeledTrendFrame(ctk.CTkFrame):
+    """
+    A titled line chart of the series of a TrendViewModel, values from 0 to 100 over the days of the history.
+
+    The lines are drawn again when the chart is resized.
+    """
+
+    def __init__(self, *args, trend: TrendViewModel, height: int = 220, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trend = trend
+        self.canvas = None
+        self.chart_height = height
+        self.init_ui()
+
+    def init_ui(self):
+        title_label = ctk.CTkLabel(self, text=self.trend.title, font=('Arial', 14, 'bold'))
+        title_label.pack(pady=(10, 10), padx=20)
+
+        legend = ctk.CTkFrame(self, fg_color='transparent')
+        legend.pack(pady=(0, 5))
+        for (title, _), color in zip(self.trend.series, SERIES_COLORS):
+            ctk.CTkLabel(legend, text=f"■ {title}", text_color=color, font=('Arial', 10)).pack(side='left',
+                                                                                                  padx=10)
+
+        self.canvas = ctk.CTkCanvas(self, height=self.chart_height, highlightthickness=0,
+                                    bg=self._apply_appearance_mode(self.cget('fg_color')))
+        self.canvas.pack(fill='x', expand=True, padx=10, pady=(0, 10))
+        self.canvas.bind('<Configure>', lambda event: self.draw())
+
+    def draw(self):
+        canvas = self.canvas
+        canvas.delete('all')
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        margin_left, margin_bottom, margin = 30, 20, 10
+        points = [point for _, series in self.trend.series for point in series]
+        if not points or width <= margin_left + margin:
+            canvas.create_text(width / 2, height / 2, text="No data yet", fill='#B3B3B3')
+            return
+
+        first_day = min(day for day, _ in points)
+        last_day = max(day for day, _ in points)
+        span = max(last_day - first_day, 1)
+
+        def x(day: int) -> float:
+            return margin_left + (day - first_day) / span * (width - margin_left - margin)
+
+        def y(value: float) -> float:
+            return margin + (1 - value / 100) * (height - margin - margin_bottom)
+
+        for value in (0, 50, 100):
+            canvas.create_line(margin_left, y(value), width - margin, y(value), fill='#404040')
+            canvas.create_text(margin_left - 5, y(value), text=str(value), anchor='e', fill='#B3B3B3',
+                               font=('Arial', 8))
+        for day, anchor in ((first_day, 'w'), (last_day, 'e')):
+            canvas.create_text(x(day), height - margin_bottom / 2, text=self._date(day), anchor=anchor,
+                               fill='#B3B3B3', font=('Arial', 8))
+
+        for (_, series), color in zip(self.trend.series, SERIES_COLORS):
+            if len(series) == 1:
+                # A single day of history is a dot
+                (day, value), = series
+                canvas.create_oval(x(day) - 3, y(value) - 3, x(day) + 3, y(value) + 3, fill=color, outline='')
+            elif series:
+                coordinates: List[float] = [coordinate for day, value in series for coordinate in (x(day), y(value))]
+                canvas.create_line(*coordinates, fill=color, width=2)
+
+    @staticmethod
+    def _date(day: int) -> str:
+        return datetime.date.fromordinal(datetime.date(1970, 1, 1).toordinal() + day).isoformat()
@@ -0,0 +1,151 @@
+from typing import Callable, List, Optional
+
+import customtkinter as ctk
+
+from utiity.ui_monitor import ui_monitor
+
+
+class LazySection:
+    """
+    A section of a scrollable page that is built only when it approaches the visible area.
+
+    Attributes:
+        factory (Callable): A callable receiving the parent widget and returning the (unpacked) section widget.
+        placeholder (ctk.CTkFrame): An empty frame reserving the estimated space of the section.
+        pack_options (dict): The options used to pack the section once it is built.
+        key (str): An optional name identifying the section in the page.
+        widget: The built section widget, None until the section is built.
+    """
+
+    def __init__(self, factory: Callable, placeholder: ctk.CTkFrame, pack_options: dict, key: Optional[str] = None):
+        self.key = key
+        self.factory = factory
+        self.placeholder = placeholder
+        self.pack_options = pack_options
+        self.widget = None
+
+    @property
+    def is_built(self) -> bool:
+        return self.widget is not None
+
+
+class LazySectionLoader:
+    """
+    Builds the sections of a CTkScrollableFrame lazily, when they get near the viewport.
+
+    Every section starts as a placeholder frame of an estimated height. Each time the canvas is scrolled or
+    resized, the first placeholder still waiting is checked against the bottom of the viewport (plus a margin)
+    and, if it is close enough, replaced by the real widget. Sections are built in order, one per idle callback,
+    so the initial render only pays for what is on screen.
+    """
+
+    def __init__(self, scroll_frame: ctk.CTkScrollableFrame, margin: int = 300):
+        self.scroll_frame = scroll_frame
+        self.canvas = scroll_frame._parent_canvas
+        self.margin = margin
+        self.sections: List[LazySection] = []
+        self._check_job = None
+
+        # Intercept the scroll notifications sent by the canvas to its scrollbar. The canvas also sends them
+        # whenever its size or scroll region changes, so resizes are covered as well.
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+
+    def add_section(self, factory: Callable, estimated_height: int = 300, key: Optional[str] = None,
+                    **pack_options) -> LazySection:
+        """
+        Registers a new section at the bottom of the scrollable frame.
+
+        Parameters:
+            factory (Callable): Receives the parent widget and returns the section widget, without packing it.
+            estimated_height (int): The height reserved for the section until it is built.
+            key (str, optional): A name identifying the section, used by `replace_section`.
+            **pack_options: The options used to pack the built section.
+        """
+        placeholder = ctk.CTkFrame(self.scroll_frame, height=estimated_height, fg_color='transparent')
+        placeholder.pack(fill='x', pady=pack_options.get('pady', 0))
+
+        section = LazySection(factory, placeholder, pack_options, key)
+        self.sections.append(section)
+        self.schedule_check()
+        return section
+
+    def replace_section(self, key: str, factory: Callable):
+        """
+        Replaces the factory of a section. A section already built is rebuilt in place, the other sections are
+        left untouched.
+        """
+        section = next(section for section in self.sections if section.key == key)
+        section.factory = factory
+        if section.is_built:
+            old_widget = section.widget
+            with ui_monitor.measure('build_section'):
+                section.widget = factory(self.scroll_frame)
+            section.widget.pack(before=old_widget, **section.pack_options)
+            old_widget.destroy()
+
+    def schedule_check(self):
+        """Schedules a visibility check on the next idle moment, collapsing repeated requests."""
+        if self._check_job is None:
+            self._check_job = self.scroll_frame.after_idle(self._check_visibility)
+
+    def build_all(self):
+        """Builds every pending section immediately."""
+        for section in self.sections:
+            if not section.is_built:
+                self._build(section)
+
+    def detach(self):
+        """Stops tracking the scroll position and gives the scrollbar back its original command."""
+        if self._check_job is not None:
+            self.scroll_frame.after_cancel(self._check_job)
+            self._check_job = None
+        if self.canvas.winfo_exists():
+            self.canvas.configure(yscrollcommand=self.scroll_frame._scrollbar.set)
+        self.sections.clear()
+
+    def destroy(self):
+        """Detaches the loader and destroys every section, built or not."""
+        sections = list(self.sections)
+        self.detach()
+        for section in sections:
+            if section.widget is not None:
+                section.widget.destroy()
+            if section.placeholder is not None:
+                section.placeholder.destroy()
+
+    def _on_scroll(self, first, last):
+        self.scroll_frame._scrollbar.set(first, last)
+        self.schedule_check()
+
+    def _next_pending(self) -> Optional[LazySection]:
+        return next((section for section in self.sections if not section.is_built), None)
+
+    def _check_visibility(self):
+        self._check_job = None
+        if not self.scroll_frame.winfo_exists():
+            return
+
+        section = self._next_pending()
+        if section is None:
+            return
+
+        viewport_height = self.canvas.winfo_height()
+        if not self.canvas.winfo_ismapped() or viewport_height <= 1:
+            # Geometry is not known yet, try again once the canvas has been laid out
+            self.scroll_frame.after(50, self.schedule_check)
+            return
+
+        top_fraction, _ = self.canvas.yview()
+        viewport_bottom = top_fraction * self.scroll_frame.winfo_height() + viewport_height
+
+        if section.placeholder.winfo_y() <= viewport_bottom + self.margin:
+            self._build(section)
+            # The layout has changed, check whether the next section is now close to the viewport
+            self.schedule_check()
+
+    def _build(self, section: LazySection):
+        with ui_monitor.measure('build_section'):
+            section.widget = section.factory(self.scroll_frame)
+        section.widget.pack(before=section.placeholder, **section.pack_options)
+        section.placeholder.destroy()
+        section.placeholder = None
@@ -1,20 +1,45 @@
+import dataclasses
+import importlib
 import logging
-from typing import Optional, Any
+import threading
+import time
+import webbrowser
+from typing import Optional, Any, Dict
 
 import customtkinter as ctk
 
-from gui.ArtistPageContent import ArtistPageContent
-from gui.ProfilePageContent import ProfilePageContent
-from gui.HomePageContent import HomePageContent
-from gui.ArtistsPageContent import ArtistsPageContent
-from service.config_reader import ConfigReader
+from gui.card_pool import CardPool
+from service.artist_graph import ArtistGraphExplorer
+from service.authorization_handler import AuthorizationServer
+from service.data_service import DataService
+from service.settings import load_settings
+from service.transport import build_transport, install_transport
+from service.library_store import LibraryStore
+from service.library_sync import LibrarySync
+from service.prefetcher import prefetcher
+from service.resilience import request_stats
+from service.search_index import SearchIndex
 from service.spotify_client import SpotifyClient
 from gui.header_bar import HeaderBar
-from utiity.image_cache import ImageCache
+from utiity.image_cache import image_cache
+from utiity.memory_diagnostics import memory_diagnostics
+from utiity.ui_dispatcher import ui_dispatcher
+from utiity.startup_timer import startup_timer
+from utiity.ui_monitor import ui_monitor
 
 
 logger = logging.getLogger(__name__)
 
+# Page classes by base content type, a page module is only imported when the page is shown for the first time
+PAGE_CLASSES = {
+    'Home': ('gui.HomePageContent', 'HomePageContent'),
+    'Profile': ('gui.ProfilePageContent', 'ProfilePageContent'),
+    'Artists': ('gui.ArtistsPageContent', 'ArtistsPageContent'),
+    'Artist': ('gui.ArtistPageContent', 'ArtistPageContent'),
+    'Search': ('gui.SearchPageContent', 'SearchPageContent'),
+    'ArtistGraph': ('gui.ArtistGraphPageContent', 'ArtistGraphPageContent'),
+}
+
 
 class UiMainWindow(ctk.CTk):
     def __init__(self):
@@ -23,20 +48,76 @@ class UiMainWindow(ctk.CTk):
 
         logger.info("Welcome to Spotipy!\nLogging in...")
 
-        # initialize config reader instance
-        self.config = ConfigReader("config.yaml")
+        # Settings validated once from config.yaml, shared with the services
+        self.settings = load_settings("config.yaml")
         self.current_profile = {}
 
-        api_access_data = self.config.get_config_value('api')
+        # Main loop instrumentation, disabled unless enabled in config.yaml
+        profiling = self.settings.ui.profiling
+        ui_monitor.configure(enabled=profiling.enabled,
+                             trace_file=profiling.trace_file,
+                             heartbeat_ms=profiling.heartbeat_ms,
+                             stall_threshold_ms=profiling.stall_threshold_ms)
+
+        # Speculative loading of the pages the user is likely to open, within the budgets of config.yaml
+        prefetcher.configure(**dataclasses.asdict(self.settings.prefetch))
+
+        # Budget of the batches of UI updates posted by the worker threads
+        ui_dispatcher.budget_ms = self.settings.ui.dispatch.budget_ms
+
+        # Leak detection across the navigations, disabled unless enabled in config.yaml
+        memory_diagnostics.configure(**dataclasses.asdict(self.settings.ui.memory))
+
+        # Budgets of the image cache shared by every widget showing an image
+        cache = self.settings.cache
+        image_cache.configure(cache_dir=cache.image_dir, memory_budget_mb=cache.image_memory_mb,
+                              disk_budget_mb=cache.image_disk_mb)
+
+        # Live network, or recording to or replaying from a cassette for offline runs
+        transport = self.settings.transport
+        install_transport(build_transport(transport.mode, transport.cassette_dir, latency_ms=transport.latency_ms,
+                                          jitter_ms=transport.jitter_ms, seed=transport.seed))
+        if transport.mode != 'live':
+            logger.info(f"HTTP transport in {transport.mode} mode, cassette: {transport.cassette_dir}")
+
+        # Requests and image decoding in a separate process when enabled in config.yaml, the client then only
+        # forwards the requests to it
+        self.data_service = None
+        if self.settings.data_service.enabled:
+            service = self.settings.data_service
+            self.data_service = DataService(config_file="config.yaml", max_workers=service.max_workers,
+                                            image_slots=service.image_slots,
+                                            image_slot_kb=service.image_slot_kb).start()
+            self.sp_client = self.data_service.client(timeout=service.request_timeout_s)
+            image_cache.loader = self.data_service.fetch_image
+        else:
+            self.sp_client = SpotifyClient(
+                self.settings.api.client_id,
+                self.settings.api.client_secret,
+                settings=self.settings.api
+            )
+
+        # Local library database, kept in sync in the background and read first by the pages
+        self.library = LibrarySync(self.sp_client,
+                                   self.settings.api,
+                                   LibraryStore(self.settings.library.database,
+                                                max_page_snapshots=self.settings.cache.page_snapshots),
+                                   interval=self.settings.library.sync_interval_s)
 
-        self.sp_client = SpotifyClient(
-            api_access_data['client_id'],
-            api_access_data['client_secret']
-        )
+        # Names of the library searched as the user types, indexed as the store saves them
+        self.search_index = SearchIndex()
+        self.library.store.add_listener(self.search_index.on_entities_saved)
+
+        # Crawls of the related artists, reusing the related artists already stored in the library
+        self.artist_graph = ArtistGraphExplorer(self.library, **dataclasses.asdict(self.settings.graph))
+
+        # Listening statistics of the Home page, the engine is created when the page is first shown
+        self._stats_engine = None
 
         # Frame which contains the content of the page based on the pressed header button
         self.content_frame = None
         self.bottom_bar = None
+        self.status_label = None
         self.current_content_name = None
         self.page_history = []
         self.forward_history = []
@@ -44,7 +125,34 @@ class UiMainWindow(ctk.CTk):
         # Stores the current content shown in the content_frame
         self.current_content = None
 
-        self.image_cache = ImageCache()
+        # Scrollable frame shared by the pages and the pool of the cards living inside it
+        self.page_scroll_frame = None
+        self.card_pool = None
+
+        self.image_cache = image_cache
+        self.header_bar = None
+        self.authorization_server = None
+
+        startup_timer.mark('window')
+
+    @staticmethod
+    def page_class(base_content_type: str):
+        """Returns the content class of a page, importing its module on first use."""
+        module_name, class_name = PAGE_CLASSES[base_content_type]
+        return getattr(importlib.import_module(module_name), class_name)
+
+    @property
+    def stats_engine(self):
+        """The engine of the listening statistics, from the history of the top items kept in the library."""
+        if self._stats_engine is None:
+            # Imported on first use, as the page modules
+            from service.stats_engine import StatsEngine
+            self._stats_engine = StatsEngine(self.library, **dataclasses.asdict(self.settings.stats))
+        return self._stats_engine
+
+    @staticmethod
+    def _profile_image_url(profile: Dict[str, Any]) -> Optional[str]:
+        return profile["images"][0]["url"] if profile.get("images") else None
 
     def init_ui(self):
         """
@@ -53,23 +161,77 @@ class UiMainWindow(ctk.CTk):
         self.title("Pyspot")
         self.geometry("1280x1200")
 
-        # User profile retrieval
-        self.current_profile = self.sp_client.get(
-            self.config.get_config_value("api.endpoints.users.current_user_profile"))
-        profile_image_url = self.current_profile["images"][0]["url"] if self.current_profile["images"] else None
+        # The window is shown with the profile saved by the previous session, `refresh_profile` updates it
+        self.current_profile = self.library.store.get_profile() or {}
 
-        # Header bar with navigation and function buttons
-        header_bar = HeaderBar(self, ["Home", "Artists"], profile_image_url,
-                               self.on_header_button_click, self.navigate_back, self.navigate_forward)
-        header_bar.pack(side='top', fill='x')
+        # Header bar with navigation and function buttons, the avatar is set once fetched in the background
+        self.header_bar = HeaderBar(self, ["Home", "Search", "Artists"], None,
+                                    self.on_header_button_click, self.navigate_back, self.navigate_forward,
+                                    image_cache=self.image_cache)
+        self.header_bar.pack(side='top', fill='x')
 
         # Main content frame setup
         self.content_frame = ctk.CTkFrame(self)
         self.content_frame.pack(side='top', fill='both', expand=True)
 
+        # Pages lay this frame out inside their own layout, so the cards it hosts can be reused across pages
+        self.page_scroll_frame = ctk.CTkScrollableFrame(self.content_frame)
+        self.card_pool = CardPool(self.page_scroll_frame)
+
         # Bottom bar setup
         self.init_bottom_bar()
 
+    def authorize(self, scope: str):
+        """
+        Starts the login in the browser. The redirect is received and the code exchanged in the background,
+        meanwhile the window shows the cached data and the requests wait for the tokens.
+        """
+        self.authorization_server = AuthorizationServer(self.sp_client,
+                                                        self.settings.api.redirect_uri,
+                                                        on_authorized=lambda: startup_timer.record(
+                                                            'authorization', startup_timer.elapsed_ms()),
+                                                        on_failed=lambda reason: ui_dispatcher.post(
+                                                            self.show_error, f"Login failed: {reason}"))
+        self.authorization_server.start()
+        webbrowser.open(self.sp_client.construct_auth_url(scope=scope))
+
+    def refresh_profile(self):
+        """
+        Fetches the profile of the user and the avatar concurrently in background threads. The avatar of the
+        cached profile is fetched right away, and fetched again only if the fresh profile has another one.
+        """
+        cached_image_url = self._profile_image_url(self.current_profile)
+
+        def fetch_avatar(url: str):
+            start = time.perf_counter()
+            try:
+                image = self.image_cache.fetch_image(url)
+                # Decode here rather than on the main thread when the button image is created
+                image.load()
+            except Exception as e:
+                logger.error(f"Error fetching the profile image: {e}")
+                return
+            startup_timer.record('avatar', (time.perf_counter() - start) * 1000)
+            ui_dispatcher.post(self.header_bar.set_profile_image, image, key=('header_bar', 'avatar'))
+
+        def fetch_profile():
+            start = time.perf_counter()
+            try:
+                profile = self.library.sync_profile()
+            except Exception as e:
+                logger.error(f"Error fetching the user profile: {e}")
+                return
+            startup_timer.record('profile', (time.perf_counter() - start) * 1000)
+            ui_dispatcher.post(self.current_profile.update, profile)
+
+            image_url = self._profile_image_url(profile)
+            if image_url and image_url != cached_image_url:
+                fetch_avatar(image_url)
+
+        if cached_image_url:
+            threading.Thread(target=fetch_avatar, args=(cached_image_url,), name='boot-avatar', daemon=True).start()
+        threading.Thread(target=fetch_profile, name='boot-profile', daemon=True).start()
+
     def init_bottom_bar(self):
         """
         Initializes the bottom bar and adds it to the main window.
@@ -78,6 +240,15 @@ class UiMainWindow(ctk.CTk):
         self.bottom_bar.pack(side='bottom', fill='x')
         self.bottom_bar.configure(bg_color='grey', fg_color='black', corner_radius=0)
 
+        self.status_label = ctk.CTkLabel(self.bottom_bar, text='', text_color='#ff6b6b', anchor='w')
+        self.status_label.pack(side='left', padx=10, pady=5)
+
+    def show_error(self, message: str):
+        """
+        Shows an error in the bottom bar, e.g. a failed login. Must run on the main thread.
+        """
+        self.status_label.configure(text=message)
+
     def update_content(self, content_type_identifier: str = 'Home', data: Optional[Any] = None):
         """
         Updates the content of the main window based on a unique content identifier and associated data.
@@ -85,43 +256,73 @@ class UiMainWindow(ctk.CTk):
         base_content_type = content_type_identifier.split(':')[0]  # Extract the base content type
 
         if hasattr(self, 'current_content') and self.current_content is not None:
-            self.current_content.clear()
-            self.current_content.hide()
+            left_page_type = type(self.current_content).__name__
+            self.current_content.discard()
+            self.current_content = None
+            memory_diagnostics.on_navigation(left_page_type)
 
         if not self.page_history or (self.page_history[-1][0] != content_type_identifier):
             self.page_history.append((content_type_identifier, data))
             self.forward_history.clear()
 
         # Instantiate and render the appropriate content object
+        content_class = self.page_class(base_content_type)
         if base_content_type == "Home":
-            self.current_content = HomePageContent(self.content_frame)
+            self.current_content = content_class(self.content_frame,
+                                                 self.stats_engine,
+                                                 navigate_callback=self.update_content,
+                                                 page_scroll_frame=self.page_scroll_frame
+                                                 )
         elif base_content_type == "Profile":
-            self.current_content = ProfilePageContent(self.content_frame,
-                                                      self.sp_client,
-                                                      self.config,
-                                                      self.current_profile,
-                                                      self.image_cache,
-                                                      navigate_callback=self.update_content
-                                                      )
+            self.current_content = content_class(self.content_frame,
+                                                 self.image_cache,
+                                                 self.library,
+                                                 navigate_callback=self.update_content,
+                                                 card_pool=self.card_pool,
+                                                 page_scroll_frame=self.page_scroll_frame
+                                                 )
         elif base_content_type == "Artists":
-            self.current_content = ArtistsPageContent(self.content_frame)
+            self.current_content = content_class(self.content_frame)
+        elif base_content_type == "Search":
+            self.current_content = content_class(self.content_frame,
+                                                 self.search_index,
+                                                 self.library,
+                                                 navigate_callback=self.update_content,
+                                                 card_pool=self.card_pool,
+                                                 page_scroll_frame=self.page_scroll_frame
+                                                 )
         elif base_content_type == "Artist":
-            self.current_content = ArtistPageContent(self.content_frame,
-                                                     self.sp_client,
-                                                     self.config,
-                                                     self.current_profile,
-                                                     self.image_cache,
-                                                     navigate_callback=self.update_content,
-                                                     data=data
-                                                     )
+            self.current_content = content_class(self.content_frame,
+                                                 self.image_cache,
+                                                 data,
+                                                 self.library,
+                                                 navigate_callback=self.update_content,
+                                                 card_pool=self.card_pool,
+                                                 page_scroll_frame=self.page_scroll_frame
+                                                 )
+        elif base_content_type == "ArtistGraph":
+            self.current_content = content_class(self.content_frame,
+                                                 self.artist_graph,
+                                                 self.image_cache,
+                                                 data=data,
+                                                 navigate_callback=self.update_content,
+                                                 card_pool=self.card_pool,
+                                                 page_scroll_frame=self.page_scroll_frame
+                                                 )
 
+        memory_diagnostics.track_page(self.current_content)
+        if self.current_content.has_state:
+            self.current_content.enable_snapshots(self.library.store, content_type_identifier)
         self.current_content.load_and_display()
+        prefetcher.warm_history(self.page_history)
 
     def on_header_button_click(self, txt: str):
         print(f"Header button clicked: {txt}")
         # Determine the content type based on the button text
         if txt == "Home":
             self.update_content("Home")
+        elif txt == "Search":
+            self.update_content("Search")
         elif txt == "Artists":
             self.update_content("Artists")
         elif txt == "Profile":
@@ -145,10 +346,38 @@ class UiMainWindow(ctk.CTk):
             self.update_content(next_content_type, next_data)
             self.page_history.append((next_content_type, next_data))
 
+    def _on_first_paint(self):
+        startup_timer.mark('first_paint')
+        startup_timer.report()
+
     def run(self):
         """
         Starts the tkinter main loop
         """
         self.init_ui()
+        startup_timer.mark('init_ui')
+        ui_monitor.start(self)
+        memory_diagnostics.add_gauge('image_cache', self.image_cache.stats)
+        memory_diagnostics.start()
+        ui_dispatcher.install(self)
+        self.refresh_profile()
+        threading.Thread(target=self.search_index.load, args=(self.library.store,), name='search-index',
+                         daemon=True).start()
+        prefetcher.start(self.library, self.image_cache)
+        self.library.start(initial_delay=self.settings.library.initial_sync_delay_s)
         self.update_content("Home")
+        startup_timer.mark('first_page')
+        # Idle callbacks run once the pending redraws are done, i.e. when the window is painted
+        self.after_idle(self._on_first_paint)
         self.mainloop()
+        if self.authorization_server is not None:
+            self.authorization_server.stop()
+        prefetcher.stop()
+        self.library.stop()
+        self.image_cache.save_placeholders()
+        if self.data_service is not None:
+            self.data_service.stop()
+        request_stats.log_report()
+        ui_dispatcher.uninstall()
+        ui_monitor.stop()
+        memory_diagnostics.stop()
@@ -0,0 +1,298 @@
+"""
+Display-ready records built from the raw Spotify API responses.
+
+The functions of this module run on the loader threads and never touch Tk: the pages turn the entities of
+`service.models` into these records in `prepare_view`, and `render` only binds them to widgets. This also makes
+page preparation testable and measurable without a display.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from service.models import Album, Artist, Image, Playlist, Track, parse_images
+from service.stats_engine import ListeningStats
+
+TIME_RANGE_TITLES = {'short_term': 'Last 4 weeks', 'medium_term': 'Last 6 months', 'long_term': 'All time'}
+
+
+@dataclass(frozen=True)
+class ImageViewModel:
+    url: str
+    width: Optional[int]
+    height: Optional[int]
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+
+@dataclass(frozen=True)
+class CardViewModel:
+    """An item shown as a Card. `data` is the entity handed to the navigation callback."""
+    name: str
+    subtitle: str
+    image_url: Optional[str]
+    data: Any = None
+
+
+@dataclass(frozen=True)
+class TrackRowViewModel:
+    index: int
+    name: str
+    artists: str
+    album_name: str
+    duration: str
+    image_url: Optional[str]
+    data: Any = None
+
+
+@dataclass(frozen=True)
+class HeaderViewModel:
+    """The left column of a page: the main image and a list of (label, value) pairs."""
+    title: str
+    image: Optional[ImageViewModel]
+    info: List[Tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class ProfilePageViewModel:
+    header: HeaderViewModel
+    top_artists: List[CardViewModel]
+    top_tracks: List[TrackRowViewModel]
+    public_playlists: List[CardViewModel]
+
+
+@dataclass(frozen=True)
+class ArtistPageViewModel:
+    header: HeaderViewModel
+    top_tracks: List[TrackRowViewModel]
+    albums: List[CardViewModel]
+    singles: List[CardViewModel]
+    appears_on: List[CardViewModel]
+    related_artists: List[CardViewModel]
+
+
+@dataclass(frozen=True)
+class SearchPageViewModel:
+    query: str
+    artists: List[CardViewModel]
+    albums: List[CardViewModel]
+    playlists: List[CardViewModel]
+    tracks: List[TrackRowViewModel]
+
+
+@dataclass(frozen=True)
+class ArtistGraphPageViewModel:
+    """The artists ranked around an artist, by number of steps from it."""
+    header: HeaderViewModel
+    levels: List[Tuple[int, List[CardViewModel]]]
+
+
+@dataclass(frozen=True)
+class BarViewModel:
+    """A bar of a chart, `fraction` is its length relative to the longest bar."""
+    label: str
+    fraction: float
+    text: str
+
+
+@dataclass(frozen=True)
+class ChartViewModel:
+    """Bar charts side by side, one for each (title, bars) group."""
+    title: str
+    groups: List[Tuple[str, List[BarViewModel]]]
+
+
+@dataclass(frozen=True)
+class TrendViewModel:
+    """Lines of (day, value) points, one for each (title, points) series, days counted since the epoch."""
+    title: str
+    series: List[Tuple[str, List[Tuple[int, float]]]]
+
+
+@dataclass(frozen=True)
+class HomePageViewModel:
+    header: HeaderViewModel
+    genres: ChartViewModel
+    durations: ChartViewModel
+    overlap: ChartViewModel
+    popularity: TrendViewModel
+
+
+def largest_image(images: Optional[Sequence[Image]]) -> Optional[ImageViewModel]:
+    """
+    Returns the largest of the images of an item. Images without dimensions, as some playlist covers, are
+    returned as they are.
+    """
+    if not images:
+        return None
+    if images[0].width:
+        image = max(images, key=lambda img: (img.width or 0) * (img.height or 0))
+    else:
+        image = images[0]
+    return ImageViewModel(image.url, image.width, image.height)
+
+
+def thumbnail_image(images: Optional[Sequence[Image]]) -> Optional[ImageViewModel]:
+    """Returns the medium size image of an item, Spotify lists images from the largest to the smallest."""
+    if not images:
+        return None
+    image = images[1] if len(images) > 1 else images[0]
+    return ImageViewModel(image.url, image.width, image.height)
+
+
+def format_duration(ms: int) -> str:
+    """Formats a duration in milliseconds as [h:]mm:ss."""
+    h, ms = divmod(ms, 3600000)
+    m, ms = divmod(ms, 60000)
+    s = ms // 1000
+
+    return f"{h if h != 0 else ''}{':' if h != 0 else ''}{m:02d}:{s:02d}"
+
+
+def join_artist_names(artists: Sequence[Artist]) -> str:
+    return ', '.join(artist.name for artist in artists)
+
+
+def public_playlists(playlists: List[Playlist]) -> List[Playlist]:
+    return [playlist for playlist in playlists if playlist.public]
+
+
+def build_artist_cards(artists: List[Artist]) -> List[CardViewModel]:
+    cards = []
+    for artist in artists:
+        image = largest_image(artist.images)
+        cards.append(CardViewModel(artist.name, 'Artist', image.url if image else None, artist))
+    return cards
+
+
+def build_playlist_cards(items: List[Any]) -> List[CardViewModel]:
+    """Builds the cards of playlists or albums, subtitled with the owner or the artists respectively."""
+    cards = []
+    for item in items:
+        image = largest_image(item.images)
+        if isinstance(item, Playlist):
+            subtitle = f"By {item.owner_name}"
+        else:
+            subtitle = f"By {join_artist_names(item.artists)}"
+        cards.append(CardViewModel(item.name, subtitle, image.url if image else None, item))
+    return cards
+
+
+def build_track_rows(tracks: List[Track]) -> List[TrackRowViewModel]:
+    rows = []
+    for index, track in enumerate(tracks, start=1):
+        image = thumbnail_image(track.album.images)
+        rows.append(TrackRowViewModel(index=index,
+                                      name=track.name,
+                                      artists=join_artist_names(track.artists),
+                                      album_name=track.album.name,
+                                      duration=format_duration(track.duration_ms),
+                                      image_url=image.url if image else None,
+                                      data=track))
+    return rows
+
+
+def build_profile_header(profile: Dict[str, Any]) -> HeaderViewModel:
+    followers = str((profile.get('followers') or {}).get('total', 'N/A'))
+    return HeaderViewModel(title=profile.get('display_name') or '',
+                           image=largest_image(parse_images(profile.get('images'))),
+                           info=[("Display Name:", profile.get('display_name', 'N/A')),
+                                 ("Email:", profile.get('email', 'N/A')),
+                                 ("Country:", profile.get('country', 'N/A')),
+                                 ("Followers:", followers)])
+
+
+def build_artist_header(artist: Artist) -> HeaderViewModel:
+    # Album cards also open artist pages, albums have no followers nor genres
+    followers = getattr(artist, 'followers', None)
+    genres = getattr(artist, 'genres', ())
+    return HeaderViewModel(title=artist.name,
+                           image=largest_image(artist.images),
+                           info=[("Followers", str(followers) if followers is not None else 'N/A'),
+                                 ("Genres:", ', '.join(genres) or 'N/A')])
+
+
+def build_profile_page(profile: Dict[str, Any],
+                       top_artists: List[Artist],
+                       top_tracks: List[Track],
+                       playlists: List[Playlist]) -> ProfilePageViewModel:
+    return ProfilePageViewModel(header=build_profile_header(profile),
+                                top_artists=build_artist_cards(top_artists),
+                                top_tracks=build_track_rows(top_tracks),
+                                public_playlists=build_playlist_cards(public_playlists(playlists)))
+
+
+def build_artist_page(artist: Artist,
+                      top_tracks: List[Track],
+                      albums: List[Album],
+                      singles: List[Album],
+                      appears_on: List[Album],
+                      related_artists: List[Artist]) -> ArtistPageViewModel:
+    return ArtistPageViewModel(header=build_artist_header(artist),
+                               top_tracks=build_track_rows(top_tracks),
+                               albums=build_playlist_cards(albums),
+                               singles=build_playlist_cards(singles),
+                               appears_on=build_playlist_cards(appears_on),
+                               related_artists=build_artist_cards(related_artists))
+
+
+def build_search_page(query: str, results: Dict[str, List[Any]]) -> SearchPageViewModel:
+    """Builds the results of a search, `results` holds the records of each kind of the library store."""
+    return SearchPageViewModel(query=query,
+                               artists=build_artist_cards(results.get('artists', [])),
+                               albums=build_playlist_cards(results.get('albums', [])),
+                               playlists=build_playlist_cards(results.get('playlists', [])),
+                               tracks=build_track_rows(results.get('tracks', [])))
+
+
+def build_artist_graph_page(artist: Artist, ranking: List[Tuple[Artist, float, int]],
+                            stats: Dict[str, Any]) -> ArtistGraphPageViewModel:
+    """
+    Builds the page of the artists around an artist. `ranking` holds (artist, score, distance) best first, `stats`
+    the size of the graph crawled and how many of its artists were fetched or read from the library.
+    """
+    header = build_artist_header(artist)
+    info = header.info + [("Artists mapped:", str(stats['artist_count'])),
+                          ("Connections:", str(stats['edge_count'])),
+                          ("Fetched:", str(stats['fetched'])),
+                          ("From the library:", str(stats['reused']))]
+    by_distance: Dict[int, List[Artist]] = {}
+    for related, _, distance in ranking:
+        by_distance.setdefault(distance, []).append(related)
+    return ArtistGraphPageViewModel(header=HeaderViewModel(header.title, header.image, info),
+                                    levels=[(distance, build_artist_cards(artists))
+                                            for distance, artists in sorted(by_distance.items())])
+
+
+def build_bars(values: List[Tuple[str, float]], text_format: str = '{:.0%}',
+               scale: Optional[float] = None) -> List[BarViewModel]:
+    """Builds the bars of (label, value) pairs, relative to scale, or to the largest value by default."""
+    scale = scale if scale is not None else max((value for _, value in values), default=0)
+    return [BarViewModel(label, min(value / scale, 1.0) if scale else 0.0, text_format.format(value))
+            for label, value in values]
+
+
+def build_home_page(stats: ListeningStats) -> HomePageViewModel:
+    ranges = list(TIME_RANGE_TITLES)
+    bins = stats.duration_bins
+    bin_labels = [f"{low}-{high} min" for low, high in zip(bins, bins[1:])] + [f"{bins[-1]}+ min"]
+    overlap_pairs = [(f"{TIME_RANGE_TITLES[ranges[a]]} / {TIME_RANGE_TITLES[ranges[b]]}",
+                      stats.artist_overlap[a][b]) for a, b in ((0, 1), (1, 2), (0, 2))]
+    top_genres = stats.genres['short_term']
+    header = HeaderViewModel(title="Your listening",
+                             image=None,
+                             info=[("History:", f"{stats.days} days" if stats.days != 1 else "1 day"),
+                                   ("Top genre of the month:", top_genres[0][0] if top_genres else 'N/A'),
+                                   ("Top artists still there from all time:", f"{stats.artist_overlap[0][2]:.0%}")])
+    return HomePageViewModel(
+        header=header,
+        genres=ChartViewModel("Your genres", [(TIME_RANGE_TITLES[time_range], build_bars(stats.genres[time_range]))
+                                              for time_range in ranges]),
+        durations=ChartViewModel("Length of your top tracks",
+                                 [(TIME_RANGE_TITLES[time_range],
+                                   build_bars(list(zip(bin_labels, stats.durations[time_range])), '{}'))
+                                  for time_range in ranges]),
+        overlap=ChartViewModel("Top artists in common", [("", build_bars(overlap_pairs, scale=1.0))]),
+        popularity=TrendViewModel("Popularity of your top tracks",
+                                  [(TIME_RANGE_TITLES[time_range], stats.popularity['tracks'][time_range])
+                                   for time_range in ranges]))
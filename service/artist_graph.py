@@ -0,0 +1,209 @@
+"""
+Exploration of the graph of related artists around an artist.
+
+The graph is crawled breadth-first, level by level. The related artists of a whole level are read from the library
+store in one query, and only the artists never fetched, or fetched longer ago than the TTL of the endpoint, are
+requested, by a bounded pool of threads. Every artist is visited once, however many artists it is related to.
+
+The artists reached are then ranked by their proximity to the seed with a personalized PageRank: a walk on the
+graph which restarts at the seed, following first the artists Spotify lists first. The ranking is saved in the
+store, so exploring the same artist again is a single read.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .library_sync import LibrarySync
+from .models import Artist
+
+logger = logging.getLogger(__name__)
+
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+
+
+@dataclass(frozen=True)
+class ArtistGraph:
+    """
+    The artists around a seed artist.
+
+    Attributes:
+        seed_id (str): The id of the artist the crawl started from.
+        distances (dict): The number of steps from the seed of every artist reached.
+        adjacency (dict): The related artists of every expanded artist, in the order of Spotify.
+        fetched (int): The number of artists whose related artists have been requested.
+        reused (int): The number of artists whose related artists were read from the store.
+    """
+    seed_id: str
+    distances: Dict[str, int]
+    adjacency: Dict[str, Tuple[str, ...]]
+    fetched: int = 0
+    reused: int = 0
+
+    @property
+    def edge_count(self) -> int:
+        return sum(len(related) for related in self.adjacency.values())
+
+
+@dataclass(frozen=True)
+class ArtistExploration:
+    """The ranked artists around a seed artist, as shown by the graph page."""
+    seed_id: str
+    depth: int
+    ranking: List[Tuple[Artist, float, int]]
+    artist_count: int
+    edge_count: int
+    fetched: int
+    reused: int
+    elapsed_s: float
+
+
+def rank_neighbors(graph: ArtistGraph) -> List[Tuple[str, float]]:
+    """
+    Ranks the artists of a graph by a personalized PageRank restarting at the seed, best first, seed excluded.
+
+    Each artist passes its score to its related artists, with weights decreasing with their position in the list
+    of Spotify. Artists which are not expanded (the last level of the crawl) keep their score, which returns to
+    the seed like the restarts.
+    """
+    # Artists are numbered, the seed first, so an iteration only walks lists
+    ids = list(graph.distances)
+    numbers = {artist_id: number for number, artist_id in enumerate(ids)}
+    seed = numbers[graph.seed_id]
+    edges = []
+    for artist_id, related in graph.adjacency.items():
+        related = [numbers[item] for item in related if item in numbers]
+        if related:
+            position_weights = [1 / (position + 1) for position in range(len(related))]
+            total = sum(position_weights)
+            edges.append((numbers[artist_id], [(item, DAMPING * weight / total)
+                                               for item, weight in zip(related, position_weights)]))
+    expanded = [number for number, _ in edges]
+
+    scores = [0.0] * len(ids)
+    scores[seed] = 1.0
+    for _ in range(MAX_ITERATIONS):
+        next_scores = [0.0] * len(ids)
+        for number, outgoing in edges:
+            score = scores[number]
+            if score:
+                for item, weight in outgoing:
+                    next_scores[item] += score * weight
+        leaked = sum(scores) - sum(scores[number] for number in expanded)
+        next_scores[seed] += 1 - DAMPING + DAMPING * leaked
+        change = sum(abs(after - before) for after, before in zip(next_scores, scores))
+        scores = next_scores
+        if change < TOLERANCE:
+            break
+
+    ranking = [(ids[number], score) for number, score in enumerate(scores) if number != seed and score > 0]
+    ranking.sort(key=lambda item: item[1], reverse=True)
+    return ranking
+
+
+class ArtistGraphExplorer:
+    """
+    Crawls and ranks the related artists around an artist.
+
+    Attributes:
+        library (LibrarySync): Reads the related artists from the store and syncs the missing ones.
+        max_depth (int): The maximum number of steps from the seed.
+        max_artists (int): The maximum number of artists reached by a crawl.
+        max_workers (int): The maximum number of concurrent requests.
+        ranking_size (int): The number of artists kept in a ranking.
+    """
+
+    def __init__(self, library: LibrarySync, max_depth: int = 3, max_artists: int = 3000, max_workers: int = 8,
+                 ranking_size: int = 60):
+        self.library = library
+        self.max_depth = max_depth
+        self.max_artists = max_artists
+        self.max_workers = max_workers
+        self.ranking_size = ranking_size
+
+    def crawl(self, seed_id: str, depth: Optional[int] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> ArtistGraph:
+        """
+        Crawls the related artists breadth-first, up to `depth` steps from the seed.
+
+        Parameters:
+            seed_id (str): The id of the artist to start from.
+            depth (int, optional): The number of steps, `max_depth` by default.
+            progress (Callable, optional): Called with the number of artists reached and expanded after each level.
+        """
+        depth = self.max_depth if depth is None else depth
+        distances = {seed_id: 0}
+        adjacency: Dict[str, Tuple[str, ...]] = {}
+        frontier = [seed_id]
+        fetched = reused = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='artist-graph') as pool:
+            for distance in range(1, depth + 1):
+                if not frontier:
+                    break
+                known = self.library.load_related_ids(frontier)
+                reused += len(known)
+                related_lists = dict(known)
+
+                futures = {pool.submit(self.library.sync_related_artists, artist_id): artist_id
+                           for artist_id in frontier if artist_id not in known}
+                for future in as_completed(futures):
+                    artist_id = futures[future]
+                    try:
+                        related_lists[artist_id] = future.result()
+                        fetched += 1
+                    except Exception as e:
+                        # The artist stays a leaf, it is requested again by the next crawl
+                        logger.error(f"Error fetching the related artists of {artist_id}: {e}")
+
+                # The next level keeps the order of the current one, so the crawl does not depend on timings
+                next_frontier = []
+                for artist_id in frontier:
+                    related = related_lists.get(artist_id)
+                    if related is None:
+                        continue
+                    adjacency[artist_id] = tuple(related)
+                    for item in related:
+                        if item not in distances and len(distances) < self.max_artists:
+                            distances[item] = distance
+                            next_frontier.append(item)
+                frontier = next_frontier
+                if progress is not None:
+                    progress(len(distances), len(adjacency))
+
+        return ArtistGraph(seed_id, distances, adjacency, fetched, reused)
+
+    def explore(self, seed_id: str, depth: Optional[int] = None, refresh: bool = False) -> ArtistExploration:
+        """
+        Returns the ranked artists around an artist, from the saved ranking while it is fresh, unless refresh is
+        given. A refresh crawls the graph again, which only requests the artists that are missing or stale in the
+        store.
+        """
+        depth = self.max_depth if depth is None else depth
+        start = time.perf_counter()
+        store = self.library.store
+        if not refresh:
+            saved = store.get_artist_ranking(seed_id, depth, limit=self.ranking_size)
+            ttl_s = self.library.api.endpoint('artist.related_artists').ttl_s
+            if saved is not None and (ttl_s is None or time.time() - saved['updated_at'] <= ttl_s):
+                ranking = [(Artist.from_json(artist), score, distance) for artist, score, distance in saved['ranking']]
+                return ArtistExploration(seed_id, depth, ranking, saved['artist_count'], saved['edge_count'], 0, 0,
+                                         time.perf_counter() - start)
+
+        graph = self.crawl(seed_id, depth)
+        ranked = rank_neighbors(graph)[:self.ranking_size]
+        store.save_artist_ranking(seed_id, depth, [(artist_id, score, graph.distances[artist_id])
+                                                   for artist_id, score in ranked],
+                                  artist_count=len(graph.distances), edge_count=graph.edge_count)
+        artists = {artist.id: artist for artist in self.library.load_entities('artists',
+                                                                                [artist_id for artist_id, _ in ranked])}
+        ranking = [(artists[artist_id], score, graph.distances[artist_id])
+                   for artist_id, score in ranked if artist_id in artists]
+        elapsed_s = time.perf_counter() - start
+        logger.info(f"Explored {len(graph.distances)} artists around {seed_id} in {elapsed_s:.2f} s "
+                    f"({graph.fetched} fetched, {graph.reused} from the library)")
+        return ArtistExploration(seed_id, depth, ranking, len(graph.distances), graph.edge_count, graph.fetched,
+                                 graph.reused, elapsed_s)
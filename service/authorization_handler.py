@@ -1,27 +1,148 @@
-import webbrowser
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import logging
+import sys
 import threading
 import urllib.parse as urlparse
+import webbrowser
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SCOPE = "user-read-private user-read-email user-top-read playlist-read-private"
 
 
 class AuthorizationHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        # Parse the query parameters from the request
-        query = urlparse.urlparse(self.path).query
-        query_components = urlparse.parse_qs(query)
+    """Handles the redirect of the Spotify authorization page and hands the code to the server."""
 
-        # Assuming 'code' is the authorization code
-        code = query_components["code"][0] if "code" in query_components else None
+    def do_GET(self):
+        query_components = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        code = query_components.get("code", [None])[0]
+        error = query_components.get("error", [None])[0]
 
         if code:
-            # Close the server after capturing the code
-            self.server.shutdown()
+            self.send_response(200)
+            self.send_header("Content-type", "text/html")
+            self.end_headers()
+            self.wfile.write(b"Authorization successful, you can close this window.")
+            self.server.on_code(code)
+        elif error:
+            self.send_error(400, f"Authorization failed: {error}")
+            self.server.on_error(error)
+        else:
+            # Browsers also request e.g. the favicon, which must not end the login
+            self.send_error(400, "Missing 'code' query parameter.")
+
+    def log_message(self, format, *args):
+        logger.info(f"Authorization callback: {format % args}")
+
+
+class AuthorizationServer:
+    """
+    Receives the authorization code of the PKCE flow on the redirect URI, alongside the Tk main loop.
+
+    The server runs in a daemon thread. When the browser is redirected with a code, the code is exchanged for
+    tokens in that thread, then `on_authorized` is called; on failure, or once `timeout` seconds have passed, the
+    requests waiting for the tokens fail and `on_failed` is called with the reason. Both callbacks run in a
+    background thread.
+
+    Attributes:
+        sp_client (SpotifyClient): The client exchanging the code for tokens.
+        redirect_uri (str): The redirect URI registered for the application, e.g. http://localhost:3000.
+        timeout (float): The number of seconds to wait for the redirect.
+    """
+
+    def __init__(self, sp_client, redirect_uri: str, timeout: float = 300,
+                 on_authorized: Optional[Callable[[], None]] = None,
+                 on_failed: Optional[Callable[[str], None]] = None):
+        self.sp_client = sp_client
+        self.redirect_uri = redirect_uri
+        self.timeout = timeout
+        self.on_authorized = on_authorized
+        self.on_failed = on_failed
+
+        self._httpd: Optional[HTTPServer] = None
+        self._timer: Optional[threading.Timer] = None
+        self._done = threading.Event()
+
+    def start(self):
+        """Starts listening on the host and port of the redirect URI."""
+        redirect = urlparse.urlparse(self.redirect_uri)
+        self._httpd = HTTPServer((redirect.hostname or 'localhost', redirect.port or 80), AuthorizationHandler)
+        self._httpd.on_code = self._on_code
+        self._httpd.on_error = self._fail
+
+        threading.Thread(target=self._httpd.serve_forever, name='authorization-server', daemon=True).start()
+        self._timer = threading.Timer(self.timeout, self._fail, args=("timed out",))
+        self._timer.daemon = True
+        self._timer.start()
+        logger.info(f"Waiting for the authorization on {self.redirect_uri}")
+
+    def stop(self):
+        """Stops the server. Safe to call from any thread, including the request handler."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._httpd is not None:
+            httpd, self._httpd = self._httpd, None
+            # shutdown waits for serve_forever to return, it must not run in the server thread
+            threading.Thread(target=self._shutdown, args=(httpd,), daemon=True).start()
+
+    @staticmethod
+    def _shutdown(httpd: HTTPServer):
+        httpd.shutdown()
+        httpd.server_close()
+
+    def _on_code(self, code: str):
+        if self._done.is_set():
+            return
+        self._done.set()
+        self.stop()
+        try:
+            self.sp_client.exchange_code_for_token(code)
+        except Exception as e:
+            logger.error(f"Error exchanging the authorization code: {e}")
+            self._fail_requests(str(e))
+            if self.on_failed:
+                self.on_failed(str(e))
+            return
+        logger.info("Authorization completed")
+        if self.on_authorized:
+            self.on_authorized()
+
+    def _fail(self, reason: str):
+        if self._done.is_set():
+            return
+        self._done.set()
+        self.stop()
+        logger.error(f"Authorization was not completed: {reason}")
+        self._fail_requests(reason)
+        if self.on_failed:
+            self.on_failed(reason)
+
+    def _fail_requests(self, reason: str):
+        # The requests waiting for the tokens fail at once instead of waiting for the authorization timeout
+        try:
+            self.sp_client.fail_authorization(reason)
+        except Exception as e:
+            logger.error(f"Error failing the requests waiting for the authorization: {e}")
+
+
+def login(sp_client, redirect_uri: str, scope: str = SCOPE) -> None:
+    """
+    Runs the login in the browser and waits for the tokens, for the command line scripts. Exits with the reason
+    when the login fails.
+    """
+    done = threading.Event()
+    failure = []
 
-            # Exchange the code for a token in the main application
-            ui_window.exchange_code_for_token(
-                code)  # You will need to properly reference your UiMainWindow instance here
+    def on_failed(reason: str):
+        failure.append(reason)
+        done.set()
 
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-        self.wfile.write(b"Authorization successful, you can close this window.")
\ No newline at end of file
+    server = AuthorizationServer(sp_client, redirect_uri, on_authorized=done.set, on_failed=on_failed)
+    server.start()
+    url = sp_client.construct_auth_url(scope=scope)
+    print(f"Log in to Spotify in the browser, or open: {url}", file=sys.stderr)
+    webbrowser.open(url)
+    done.wait()
+    if failure:
+        raise SystemExit(f"Login failed: {failure[0]}")
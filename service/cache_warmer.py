@@ -0,0 +1,208 @@
+"""
+Warming of the persistent caches ahead of a session: the library store and the image cache.
+
+`CacheWarmer` loads what the pages show first, with the tokens saved by the application: the profile, the top
+artists and tracks of every time range, the playlists, and the page of the top artists (their albums, top tracks
+and related artists). The lists go through `LibrarySync`, so the data still fresh in the store is not fetched
+again unless refreshed. The images of the cards and rows of these pages are fetched into the image cache as they
+are discovered, which also records their placeholders.
+
+Requests and images run on two pools of threads, the images being downloaded while the artists are still
+loading. Failures are logged and counted, the rest of the warm-up goes on.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .library_store import LibraryStore
+from .library_sync import ARTIST_ALBUM_GROUPS, TIME_RANGES, LibrarySync
+from .models import parse_images
+from .settings import ApiSettings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Number of top items of each time range, the maximum of the endpoint
+TOP_ITEMS_LIMIT = 50
+
+
+class _CountingClient:
+    """The interface of `SpotifyClient` used by the library sync, counting the requests made."""
+
+    def __init__(self, sp_client, on_request: Callable[[], None]):
+        self.sp_client = sp_client
+        self.on_request = on_request
+
+    def get(self, url, params=None):
+        response = self.sp_client.get(url, params=params)
+        self.on_request()
+        return response
+
+    def iterate_pages(self, url, params=None):
+        while url:
+            page = self.get(url, params=params)
+            yield from page.get('items', [])
+            url = page.get('next')
+            params = None
+
+
+class CacheWarmer:
+    """
+    Fills the library store and the image cache with the data of the pages the user opens first.
+
+    Attributes:
+        library (LibrarySync): The library sync of the warm-up, counting its requests.
+        image_cache (ImageCache): The cache the images are fetched into, None to only warm the store.
+        concurrency (int): The number of requests, and of images, in flight.
+        artists (int): The number of top artists whose page is warmed.
+        refresh (bool): Whether the data still fresh in the store is fetched again.
+    """
+
+    def __init__(self, sp_client, api: ApiSettings, store: LibraryStore, image_cache=None, concurrency: int = 16,
+                 artists: int = 20, refresh: bool = False):
+        self.library = LibrarySync(_CountingClient(sp_client, self._on_request), api, store)
+        self.image_cache = image_cache
+        self.concurrency = max(1, concurrency)
+        self.artists = artists
+        self.refresh = refresh
+
+        self._lock = threading.Lock()
+        self._images: Optional[ThreadPoolExecutor] = None
+        self._image_futures: List[Future] = []
+        self._seen_urls = set()
+        self._start = None
+        self._counters = {'requests': 0, 'pages': 0, 'pages_total': 0, 'images': 0, 'images_cached': 0,
+                          'images_total': 0, 'image_bytes': 0, 'errors': 0}
+        self.phase = 'idle'
+
+    def _on_request(self):
+        with self._lock:
+            self._counters['requests'] += 1
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the progress and the throughput of the warm-up so far, from any thread."""
+        with self._lock:
+            stats = dict(self._counters)
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0
+        stats['phase'] = self.phase
+        stats['elapsed_s'] = round(elapsed, 2)
+        stats['image_mb'] = round(stats.pop('image_bytes') / MB, 2)
+        stats['requests_per_s'] = round(stats['requests'] / elapsed, 1) if elapsed else 0.0
+        stats['images_per_s'] = round(stats['images'] / elapsed, 1) if elapsed else 0.0
+        stats['image_mb_per_s'] = round(stats['image_mb'] / elapsed, 2) if elapsed else 0.0
+        return stats
+
+    def run(self) -> Dict[str, Any]:
+        """Warms the caches and returns the final statistics."""
+        self._start = time.perf_counter()
+        if self.image_cache is not None:
+            self._images = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='warmup-image')
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='warmup') as requests:
+                self.phase = 'library'
+                pages = [requests.submit(self._warm_profile), requests.submit(self._warm_playlists)]
+                pages += [requests.submit(self._warm_top_items, kind, time_range)
+                          for kind in ('artists', 'tracks') for time_range in TIME_RANGES]
+                self._count('pages_total', len(pages))
+                self._wait(pages)
+
+                self.phase = 'artists'
+                artist_ids = self._top_artist_ids()
+                self._count('pages_total', len(artist_ids))
+                self._wait([requests.submit(self._warm_artist, artist_id) for artist_id in artist_ids])
+
+            self.phase = 'images'
+            with self._lock:
+                image_futures = list(self._image_futures)
+            self._wait(image_futures)
+        finally:
+            if self._images is not None:
+                self._images.shutdown(wait=True, cancel_futures=True)
+                self.image_cache.save_placeholders()
+        self.phase = 'done'
+        stats = self.stats()
+        logger.info(f"Cache warm-up done: {stats}")
+        return stats
+
+    def _wait(self, futures: List[Future]):
+        for future in wait(futures).done:
+            error = future.exception()
+            if error is not None:
+                self._count('errors')
+                logger.error(f"Cache warm-up task failed: {error}")
+
+    # Pages
+
+    def _page_done(self, urls: Iterable[Optional[str]]):
+        self._count('pages')
+        self._queue_images(urls)
+
+    def _warm_profile(self):
+        profile = self.library.load_profile(refresh=self.refresh)
+        self._page_done(image.url for image in parse_images(profile.get('images'))[:1])
+
+    def _warm_top_items(self, kind: str, time_range: str):
+        self.library.refresh_top_items(kind, time_range, refresh=self.refresh)
+        items = self.library.load_top_items(kind, time_range, TOP_ITEMS_LIMIT)
+        if kind == 'artists':
+            self._page_done(item.images[0].url for item in items if item.images)
+        else:
+            self._page_done(self._thumbnail_url(item.album.images) for item in items)
+
+    def _warm_playlists(self):
+        playlists = self.library.load_playlists(refresh=self.refresh)
+        self._page_done(playlist.images[0].url for playlist in playlists if playlist.images)
+
+    def _top_artist_ids(self) -> List[str]:
+        """The ids of the top artists, the most recent time range first."""
+        artist_ids = []
+        for time_range in TIME_RANGES:
+            for artist in self.library.load_top_items('artists', time_range, TOP_ITEMS_LIMIT):
+                if artist.id and artist.id not in artist_ids:
+                    artist_ids.append(artist.id)
+        return artist_ids[:self.artists]
+
+    def _warm_artist(self, artist_id: str):
+        lists = self.library.load_artist(artist_id, refresh=self.refresh)
+        urls = [self._thumbnail_url(track.album.images) for track in lists['top_tracks']]
+        for group in ARTIST_ALBUM_GROUPS + ('related_artists',):
+            urls.extend(item.images[0].url for item in lists[group] if item.images)
+        self._page_done(urls)
+
+    @staticmethod
+    def _thumbnail_url(images) -> Optional[str]:
+        # Rows of tracks show the medium size image, Spotify lists images from the largest to the smallest
+        images = images[1:2] or images[:1]
+        return images[0].url if images else None
+
+    # Images
+
+    def _queue_images(self, urls: Iterable[Optional[str]]):
+        if self._images is None:
+            return
+        with self._lock:
+            new_urls = []
+            for url in urls:
+                if url and url not in self._seen_urls:
+                    self._seen_urls.add(url)
+                    new_urls.append(url)
+            self._counters['images_total'] += len(new_urls)
+            self._image_futures.extend(self._images.submit(self._warm_image, url) for url in new_urls)
+
+    def _warm_image(self, url: str):
+        if self.image_cache.is_cached(url):
+            self._count('images_cached')
+            return
+        self.image_cache.fetch_image(url)
+        size = os.path.getsize(self.image_cache.get_cached_image_path(url))
+        with self._lock:
+            self._counters['images'] += 1
+            self._counters['image_bytes'] += size
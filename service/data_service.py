@@ -0,0 +1,351 @@
+"""
+An optional data service process owning the Spotify client and the image pipeline.
+
+Network I/O, JSON parsing and image decoding are CPU work holding the GIL, which the Tk main loop needs to stay
+responsive. When the data service is enabled, that work runs in a separate process with its own interpreter:
+`DataService` starts the process and sends it requests over a duplex pipe, the GUI only unpickles the results.
+
+Requests are (id, operation, arguments) tuples, answered by (id, error, result) tuples in any order; the process
+handles them with a pool of threads, so slow responses do not hold back the others, and the login on a thread of
+its own, as the requests of the pool may be waiting for it. Errors are raised again in the GUI with their type,
+e.g. `SpotifyApiError` with its status. The pixels of decoded images
+do not go through the pipe: the GUI reserves a slot of a shared memory block for each image it requests, the
+service writes the pixels into it, and the GUI copies them out when the answer arrives. The number of slots bounds
+the number of images in flight.
+
+`RemoteSpotifyClient` has the interface of `SpotifyClient` used by the application, so the library sync and the
+login use the service without knowing about it.
+"""
+import logging
+import multiprocessing
+import pickle
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from itertools import count
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+KB = 1024
+
+# Operations of the login, handled apart from the requests waiting for it
+AUTHORIZATION_OPERATIONS = frozenset({'is_session_saved', 'construct_auth_url', 'exchange_code_for_token',
+                                      'fail_authorization'})
+
+
+class DataServiceError(Exception):
+    """
+    Raised when the data service is not running or does not answer, or when an operation fails with an error
+    which cannot be sent to the GUI.
+    """
+
+
+# Service process
+
+def _image_pixels(image: Image.Image) -> Tuple[str, Tuple[int, int], bytes]:
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+    return image.mode, image.size, image.tobytes()
+
+
+def _portable_error(error: Exception) -> Exception:
+    """Returns the error as sent to the GUI: itself if it survives pickling, else a DataServiceError."""
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return DataServiceError(f"{type(error).__name__}: {error}")
+    # The traceback refers to the frames of the service, it is not sent
+    return error.with_traceback(None)
+
+
+def _operations(settings, arena: shared_memory.SharedMemory, slot_bytes: int) -> Dict[str, Callable]:
+    from utiity.image_cache import image_cache
+    from .spotify_client import SpotifyClient
+
+    sp_client = SpotifyClient(settings.api.client_id, settings.api.client_secret, settings=settings.api)
+    # The decoded images and the placeholders are kept by the GUI, the service only keeps the files
+    image_cache.configure(cache_dir=settings.cache.image_dir, memory_budget_mb=0,
+                          disk_budget_mb=settings.cache.image_disk_mb, placeholders=False)
+
+    def fetch_image(url: str, slot: Optional[int]):
+        mode, size, pixels = _image_pixels(image_cache.fetch_image(url))
+        if slot is None or len(pixels) > slot_bytes:
+            # Larger than a slot, sent through the pipe
+            return mode, size, len(pixels), pixels
+        start = slot * slot_bytes
+        arena.buf[start:start + len(pixels)] = pixels
+        return mode, size, len(pixels), None
+
+    return {
+        'ping': lambda: True,
+        'get': sp_client.get,
+        'is_session_saved': sp_client.is_session_saved,
+        'construct_auth_url': sp_client.construct_auth_url,
+        'exchange_code_for_token': sp_client.exchange_code_for_token,
+        'fail_authorization': sp_client.fail_authorization,
+        'fetch_image': fetch_image,
+    }
+
+
+def serve(connection, config_file: str, arena_name: str, slot_bytes: int, max_workers: int,
+          log_file: Optional[str] = None, log_level: int = logging.INFO):
+    """Runs the data service until the pipe is closed or None is received. Entry point of the service process."""
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%y-%m-%d %H:%M:%S',
+        filename=log_file,
+        filemode='a'
+    )
+    from .resilience import request_stats
+    from .settings import load_settings
+    from .transport import build_transport, install_transport
+
+    settings = load_settings(config_file)
+    transport = settings.transport
+    install_transport(build_transport(transport.mode, transport.cassette_dir, latency_ms=transport.latency_ms,
+                                      jitter_ms=transport.jitter_ms, seed=transport.seed))
+    arena = shared_memory.SharedMemory(name=arena_name)
+    operations = _operations(settings, arena, slot_bytes)
+    send_lock = threading.Lock()
+
+    def handle(request_id: int, operation: str, args: tuple):
+        try:
+            result, error = operations[operation](*args), None
+        except Exception as e:
+            result, error = None, _portable_error(e)
+        try:
+            with send_lock:
+                connection.send((request_id, error, result))
+        except (OSError, EOFError):
+            pass
+
+    logger.info(f"Data service started with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='data-service') as pool, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='data-service-auth') as authorization:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+            # Requests blocked on the login must not keep the exchange of its code waiting for a worker
+            executor = authorization if message[1] in AUTHORIZATION_OPERATIONS else pool
+            executor.submit(handle, *message)
+    arena.close()
+    request_stats.log_report()
+    logger.info("Data service stopped")
+
+
+# GUI process
+
+class DataService:
+    """
+    The GUI side of the data service: starts the process, sends it requests and resolves their futures.
+
+    Every method can be called from any thread. Answers are received by a reader thread, which also copies the
+    pixels of the images out of their shared memory slot before freeing it.
+
+    Attributes:
+        config_file (str): The configuration file read by the service process.
+        max_workers (int): The number of requests handled concurrently by the service.
+        image_slots (int): The number of images in flight, each one having its slot of shared memory.
+        image_slot_kb (int): The size of a slot; the pixels of larger images go through the pipe.
+        log_file (str): The log file of the service process, None to log to the standard error.
+    """
+
+    def __init__(self, config_file: str = 'config.yaml', max_workers: int = 8, image_slots: int = 16,
+                 image_slot_kb: int = 512, log_file: Optional[str] = 'spotipy.log'):
+        self.config_file = config_file
+        self.max_workers = max_workers
+        self.image_slots = max(1, image_slots)
+        self.slot_bytes = image_slot_kb * KB
+        self.log_file = log_file
+
+        self._process = None
+        self._connection = None
+        self._arena: Optional[shared_memory.SharedMemory] = None
+        self._reader: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._ids = count()
+        self._pending: Dict[int, Tuple[Future, Optional[int]]] = {}
+        self._free_slots: List[int] = []
+        self._slot_available = threading.Semaphore(0)
+        self._stopped = threading.Event()
+
+    def start(self) -> 'DataService':
+        """Starts the service process, which then loads its modules and settings in the background."""
+        self._arena = shared_memory.SharedMemory(create=True, size=max(1, self.image_slots * self.slot_bytes))
+        self._free_slots = list(range(self.image_slots))
+        self._slot_available = threading.Semaphore(self.image_slots)
+
+        # A fork of a process running Tk is not safe, the service starts from a fresh interpreter
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe(duplex=True)
+        self._process = context.Process(target=serve, name='data-service', daemon=True,
+                                        args=(child_connection, self.config_file, self._arena.name, self.slot_bytes,
+                                              self.max_workers, self.log_file, logging.getLogger().level))
+        self._process.start()
+        child_connection.close()
+
+        self._reader = threading.Thread(target=self._read, name='data-service-reader', daemon=True)
+        self._reader.start()
+        logger.info(f"Data service process {self._process.pid} started")
+        return self
+
+    def stop(self, timeout: float = 5):
+        """Stops the service process and fails the pending requests."""
+        if self._process is None:
+            return
+        self._stopped.set()
+        try:
+            with self._send_lock:
+                self._connection.send(None)
+        except (OSError, EOFError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._connection.close()
+        if self._reader is not None:
+            self._reader.join(timeout)
+        self._fail_pending("The data service has stopped")
+        self._arena.close()
+        self._arena.unlink()
+        self._process = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive() and not self._stopped.is_set()
+
+    def submit(self, operation: str, *args, slot: Optional[int] = None) -> Future:
+        """Sends a request to the service and returns the future of its result."""
+        future = Future()
+        if self._stopped.is_set() or self._process is None:
+            self._free_slot(slot)
+            future.set_exception(DataServiceError("The data service is not running"))
+            return future
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = (future, slot)
+        try:
+            with self._send_lock:
+                self._connection.send((request_id, operation, args))
+        except (OSError, EOFError) as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            self._free_slot(slot)
+            future.set_exception(DataServiceError(f"The data service is not reachable: {e}"))
+        return future
+
+    def call(self, operation: str, *args, timeout: Optional[float] = None) -> Any:
+        """Sends a request to the service and waits for its result."""
+        return self.submit(operation, *args).result(timeout)
+
+    def fetch_image(self, url: str) -> Image.Image:
+        """Returns the decoded image of a URL, fetched from the disk cache or the network by the service."""
+        # Waits for a free slot, bounding the images in flight
+        self._slot_available.acquire()
+        with self._lock:
+            slot = self._free_slots.pop()
+        return self.submit('fetch_image', url, slot, slot=slot).result()
+
+    def client(self, timeout: Optional[float] = None) -> 'RemoteSpotifyClient':
+        """Returns a Spotify client whose requests are made by the service, failing after timeout seconds."""
+        return RemoteSpotifyClient(self, timeout=timeout)
+
+    def _free_slot(self, slot: Optional[int]):
+        if slot is None:
+            return
+        with self._lock:
+            self._free_slots.append(slot)
+        self._slot_available.release()
+
+    def _image(self, slot: Optional[int], result) -> Image.Image:
+        mode, size, length, pixels = result
+        if pixels is None:
+            start = slot * self.slot_bytes
+            pixels = self._arena.buf[start:start + length]
+        return Image.frombytes(mode, size, pixels)
+
+    def _read(self):
+        while True:
+            try:
+                request_id, error, result = self._connection.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future, slot = self._pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            try:
+                if error is not None:
+                    future.set_exception(error)
+                elif slot is not None:
+                    future.set_result(self._image(slot, result))
+                else:
+                    future.set_result(result)
+            except Exception as e:
+                future.set_exception(DataServiceError(f"Invalid answer of the data service: {e}"))
+            finally:
+                # The pixels have been copied out of the slot
+                self._free_slot(slot)
+        if not self._stopped.is_set():
+            logger.error("The data service process has exited")
+        self._stopped.set()
+        self._fail_pending("The data service process has exited")
+
+    def _fail_pending(self, reason: str):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, slot in pending.values():
+            if not future.done():
+                future.set_exception(DataServiceError(reason))
+            self._free_slot(slot)
+
+
+class RemoteSpotifyClient:
+    """
+    The interface of `SpotifyClient` used by the application, served by the data service.
+
+    Attributes:
+        service (DataService): The service making the requests.
+        timeout (float, optional): The number of seconds a request waits for its answer, None to wait until the
+            service answers or stops.
+    """
+
+    def __init__(self, service: DataService, timeout: Optional[float] = None):
+        self.service = service
+        self.timeout = timeout
+
+    def get(self, url, params=None):
+        """Performs a GET request in the service process and returns the decoded JSON response."""
+        try:
+            return self.service.call('get', url, params, timeout=self.timeout)
+        except TimeoutError:
+            raise DataServiceError(f"No answer of the data service for {url} after {self.timeout} s") from None
+
+    def iterate_pages(self, url, params=None):
+        """Yields the items of a paginated endpoint, following the `next` links until the last page."""
+        while url:
+            page = self.get(url, params=params)
+            yield from page.get('items', [])
+            url = page.get('next')
+            params = None
+
+    def is_session_saved(self):
+        return self.service.call('is_session_saved')
+
+    def construct_auth_url(self, scope):
+        return self.service.call('construct_auth_url', scope)
+
+    def exchange_code_for_token(self, code):
+        return self.service.call('exchange_code_for_token', code)
+
+    def fail_authorization(self, reason):
+        return self.service.call('fail_authorization', reason)
@@ -0,0 +1,251 @@
+"""
+Streaming export of the library, for scripts and bulk dumps without the GUI.
+
+An export is a pipeline of generators: a source plans the page requests, `fetch_pages` fetches them with at most
+`concurrency` requests in flight and yields the pages in order, the items of the pages become records, and a
+writer streams the records out as NDJSON or CSV. Nothing is accumulated along the way, so the memory used
+depends on the concurrency and the page size, not on the size of the library.
+
+Pages are planned from the totals Spotify announces: the first page of a list gives its total, the other pages
+are then requested concurrently by offset. The tracks of the playlists are planned from the track counts of the
+playlist listing, so the pages of every playlist flow through the same window of requests.
+"""
+import csv
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from .library_sync import TIME_RANGES
+from .settings import ApiSettings
+from .spotify_client import SpotifyClient
+
+logger = logging.getLogger(__name__)
+
+EXPORTS = ('top-artists', 'top-tracks', 'playlists', 'playlist-tracks')
+FORMATS = ('ndjson', 'csv')
+
+# Columns of the CSV exports, nested values are flattened by `flatten`
+CSV_COLUMNS = {
+    'top-artists': ('time_range', 'rank', 'id', 'name', 'genres', 'popularity', 'followers', 'uri'),
+    'top-tracks': ('time_range', 'rank', 'id', 'name', 'artists', 'album', 'duration_ms', 'popularity', 'explicit',
+                   'uri'),
+    'playlists': ('id', 'name', 'owner', 'public', 'collaborative', 'tracks', 'snapshot_id', 'uri'),
+    'playlist-tracks': ('playlist_id', 'position', 'added_at', 'is_local', 'id', 'name', 'artists', 'album',
+                        'duration_ms', 'uri'),
+}
+
+
+class ExportError(Exception):
+    """Raised when Spotify answers a page request with an error, rather than exporting a truncated list."""
+
+
+@dataclass(frozen=True)
+class PageRequest:
+    """A page to fetch, with the context its items are exported with."""
+    url: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    context: Dict[str, Any] = field(default_factory=dict)
+
+
+def _checked(page: Any, request: PageRequest) -> Dict[str, Any]:
+    if not isinstance(page, dict) or 'error' in page:
+        error = page.get('error') if isinstance(page, dict) else page
+        raise ExportError(f"Error fetching {request.url} {request.params}: {error}")
+    return page
+
+
+def fetch_pages(client: SpotifyClient, requests: Iterable[PageRequest],
+                concurrency: int = 4) -> Iterator[Tuple[PageRequest, Dict[str, Any]]]:
+    """
+    Fetches pages with at most `concurrency` requests in flight, yielding them in the order of the requests.
+    The requests are only pulled from the iterable as the window moves.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='export') as pool:
+        window = deque()
+        try:
+            for request in requests:
+                window.append((request, pool.submit(client.get, request.url, params=request.params)))
+                if len(window) >= concurrency:
+                    request, future = window.popleft()
+                    yield request, _checked(future.result(), request)
+            while window:
+                request, future = window.popleft()
+                yield request, _checked(future.result(), request)
+        finally:
+            # Stopped early by the consumer or by an error, the queued requests are not sent
+            for _, future in window:
+                future.cancel()
+
+
+def paginate(client: SpotifyClient, url: str, params: Dict[str, Any], page_size: int, concurrency: int = 4,
+             context: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[PageRequest, Dict[str, Any]]]:
+    """
+    Yields the pages of a paginated endpoint in order: the first page, then the others fetched concurrently from
+    the total it announces. Without a total, the `next` links are followed one after the other.
+    """
+    context = context or {}
+    first = PageRequest(url, {**params, 'limit': page_size, 'offset': 0}, context)
+    page = _checked(client.get(first.url, params=first.params), first)
+    yield first, page
+
+    total = page.get('total')
+    # Spotify caps the limit, the offsets follow the size of the pages it actually returns
+    page_size = min(page_size, page.get('limit') or page_size)
+    if total is None:
+        offset = len(page.get('items') or ())
+        next_url = page.get('next')
+        while next_url:
+            request = PageRequest(next_url, {}, {**context, 'offset': offset})
+            page = _checked(client.get(next_url), request)
+            yield request, page
+            offset += len(page.get('items') or ())
+            next_url = page.get('next')
+        return
+
+    requests = (PageRequest(url, {**params, 'limit': page_size, 'offset': offset}, context)
+                for offset in range(page_size, total, page_size))
+    yield from fetch_pages(client, requests, concurrency)
+
+
+def _page_size(endpoint, page_size: Optional[int], maximum: int) -> int:
+    # Larger pages than Spotify accepts would be capped, and the planned offsets would skip items
+    return max(1, min(page_size or endpoint.page_size or maximum, maximum))
+
+
+def _offset(request: PageRequest) -> int:
+    return request.context.get('offset', request.params.get('offset', 0))
+
+
+# Sources, each yielding the records of one export
+
+def top_items(client: SpotifyClient, api: ApiSettings, kind: str, time_ranges: Sequence[str] = TIME_RANGES,
+              page_size: Optional[int] = None, concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+    """Yields the top 'artists' or 'tracks' of each time range, with their time range and rank."""
+    endpoint = api.endpoint('users.user_top_item_artists' if kind == 'artists' else 'users.user_top_item_tracks')
+    page_size = _page_size(endpoint, page_size, 50)
+    for time_range in time_ranges:
+        for request, page in paginate(client, endpoint.url(), {'time_range': time_range}, page_size, concurrency):
+            for index, item in enumerate(page.get('items') or ()):
+                yield {'time_range': time_range, 'rank': _offset(request) + index + 1, **item}
+
+
+def playlists(client: SpotifyClient, api: ApiSettings, page_size: Optional[int] = None,
+              concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+    """Yields the playlists of the user."""
+    endpoint = api.endpoint('users.current_user_playlists')
+    for _, page in paginate(client, endpoint.url(), {}, _page_size(endpoint, page_size, 50), concurrency):
+        yield from (item for item in page.get('items') or () if item)
+
+
+def playlist_tracks(client: SpotifyClient, api: ApiSettings, playlist_items: Iterable[Dict[str, Any]],
+                    page_size: Optional[int] = None, concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the items of the given playlists, with the id of their playlist and their position. The pages of every
+    playlist are planned from the track count of the playlist and share one window of requests.
+    """
+    endpoint = api.endpoint('playlists.tracks')
+    page_size = _page_size(endpoint, page_size, 100)
+
+    def plan() -> Iterator[PageRequest]:
+        for playlist in playlist_items:
+            total = (playlist.get('tracks') or {}).get('total')
+            context = {'playlist_id': playlist['id']}
+            if total is None:
+                # Unknown size, the first page is followed by its next links
+                yield PageRequest(endpoint.url(playlist['id']), {'limit': page_size, 'offset': 0},
+                                  {**context, 'follow': True})
+                continue
+            for offset in range(0, total, page_size):
+                yield PageRequest(endpoint.url(playlist['id']), {'limit': page_size, 'offset': offset}, context)
+
+    for request, page in fetch_pages(client, plan(), concurrency):
+        playlist_id = request.context['playlist_id']
+        position = _offset(request)
+        while True:
+            for item in page.get('items') or ():
+                yield {'playlist_id': playlist_id, 'position': position, **item}
+                position += 1
+            next_url = page.get('next') if request.context.get('follow') else None
+            if not next_url:
+                break
+            page = _checked(client.get(next_url), request)
+
+
+def export_records(name: str, client: SpotifyClient, api: ApiSettings, time_ranges: Sequence[str] = TIME_RANGES,
+                   playlist_ids: Sequence[str] = (), page_size: Optional[int] = None,
+                   concurrency: int = 4) -> Iterator[Dict[str, Any]]:
+    """Returns the records of an export of `EXPORTS`."""
+    if name == 'top-artists':
+        return top_items(client, api, 'artists', time_ranges, page_size, concurrency)
+    if name == 'top-tracks':
+        return top_items(client, api, 'tracks', time_ranges, page_size, concurrency)
+    # The page size of the export applies to its records, the playlists listed for their tracks use the default
+    user_playlists = playlists(client, api, page_size if name == 'playlists' else None, concurrency)
+    if playlist_ids:
+        wanted = set(playlist_ids)
+        user_playlists = (playlist for playlist in user_playlists if playlist.get('id') in wanted)
+    if name == 'playlists':
+        return user_playlists
+    if name == 'playlist-tracks':
+        return playlist_tracks(client, api, user_playlists, page_size, concurrency)
+    raise ValueError(f"Unknown export {name!r}, expected one of {', '.join(EXPORTS)}")
+
+
+# Writers
+
+def _names(items: Optional[List[Dict[str, Any]]]) -> str:
+    return '; '.join(item.get('name') or '' for item in items or () if item)
+
+
+def flatten(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the values of a record for the CSV columns: names of nested objects, totals of counters."""
+    # Playlist items wrap their track
+    track = record.get('track')
+    if isinstance(track, dict):
+        record = {**track, **{key: value for key, value in record.items() if key != 'track'}}
+    elif 'track' in record:
+        record = {key: value for key, value in record.items() if key != 'track'}
+    flat = dict(record)
+    if isinstance(record.get('artists'), list):
+        flat['artists'] = _names(record['artists'])
+    if isinstance(record.get('album'), dict):
+        flat['album'] = record['album'].get('name')
+    if isinstance(record.get('genres'), list):
+        flat['genres'] = '; '.join(record['genres'])
+    if isinstance(record.get('followers'), dict):
+        flat['followers'] = record['followers'].get('total')
+    if isinstance(record.get('owner'), dict):
+        flat['owner'] = record['owner'].get('display_name') or record['owner'].get('id')
+    if isinstance(record.get('tracks'), dict):
+        flat['tracks'] = record['tracks'].get('total')
+    return flat
+
+
+def write_ndjson(records: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """Writes one JSON object per line, returns the number of records written."""
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+def write_csv(records: Iterable[Dict[str, Any]], stream: TextIO, columns: Sequence[str]) -> int:
+    """Writes the flattened records as CSV rows under a header, returns the number of records written."""
+    writer = csv.DictWriter(stream, fieldnames=list(columns), extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(flatten(record))
+        count += 1
+    return count
+
+
+WRITERS: Dict[str, Callable[[Iterable[Dict[str, Any]], TextIO, Sequence[str]], int]] = {
+    'ndjson': lambda records, stream, columns: write_ndjson(records, stream),
+    'csv': write_csv,
+}
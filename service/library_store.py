@@ -0,0 +1,479 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models import json_loads
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profile (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artists (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS albums (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    snapshot_id TEXT,
+    position INTEGER NOT NULL,
+    tracks_snapshot_id TEXT,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+);
+CREATE TABLE IF NOT EXISTS top_items (
+    kind TEXT NOT NULL,
+    time_range TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    PRIMARY KEY (kind, time_range, position)
+);
+CREATE TABLE IF NOT EXISTS top_item_history (
+    kind TEXT NOT NULL,
+    time_range TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    item_ids TEXT NOT NULL,
+    popularities BLOB NOT NULL,
+    PRIMARY KEY (kind, time_range, day)
+);
+CREATE TABLE IF NOT EXISTS artist_links (
+    artist_id TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    PRIMARY KEY (artist_id, relation, position)
+);
+CREATE TABLE IF NOT EXISTS artist_graphs (
+    seed_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    artist_count INTEGER NOT NULL,
+    edge_count INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (seed_id, depth)
+);
+CREATE TABLE IF NOT EXISTS artist_rankings (
+    seed_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    distance INTEGER NOT NULL,
+    PRIMARY KEY (seed_id, depth, position)
+);
+CREATE TABLE IF NOT EXISTS page_snapshots (
+    identifier TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lists (
+    name TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Popularity of the snapshots of top items whose popularity is not known, Spotify popularities are 0 to 100
+UNKNOWN_POPULARITY = 255
+
+# Tables storing the entities, by kind of item
+ENTITY_TABLES = {
+    'artists': 'artists',
+    'albums': 'albums',
+    'tracks': 'tracks',
+    'playlists': 'playlists',
+}
+
+
+class LibraryStore:
+    """
+    A local SQLite database holding the parts of the Spotify library shown by the application.
+
+    Entities (artists, albums, tracks, playlists) are stored once as JSON payloads indexed by id, and the
+    ordered lists referencing them (top items per time range, playlist tracks, the albums and related artists
+    of an artist) only store ids. Each list has an update time, so readers can decide whether it is fresh. The
+    top items also keep a snapshot per day, the history aggregated by the Home page.
+
+    The store can be used from several threads, every access is serialized by a lock. Listeners registered with
+    `add_listener` are told about every entity saved or removed, once the write is committed.
+
+    Attributes:
+        path (str): The path of the database file.
+        max_page_snapshots (int): The number of page snapshots kept, the pages visited the longest time ago are
+            forgotten first. 0 keeps every snapshot.
+    """
+
+    def __init__(self, path: str = 'data/library.db', max_page_snapshots: int = 500):
+        self.path = path
+        self.max_page_snapshots = max_page_snapshots
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+        self._listeners: List[Callable[[str, Sequence[Dict[str, Any]], Sequence[str]], None]] = []
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # Listeners
+
+    def add_listener(self, listener: Callable[[str, Sequence[Dict[str, Any]], Sequence[str]], None]):
+        """
+        Registers a callable receiving the kind, the saved items and the removed ids after each write of entities.
+        It is called from the writing thread, outside of the lock of the store.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable):
+        self._listeners.remove(listener)
+
+    def _notify(self, kind: str, items: Sequence[Dict[str, Any]], removed: Sequence[str] = ()):
+        for listener in list(self._listeners):
+            try:
+                listener(kind, items, removed)
+            except Exception as e:
+                logger.error(f"Library store listener failed: {e}")
+
+    # Lists bookkeeping
+
+    def _touch_list(self, name: str, now: float):
+        self._connection.execute('INSERT OR REPLACE INTO lists (name, updated_at) VALUES (?, ?)', (name, now))
+
+    def list_updated_at(self, name: str) -> Optional[float]:
+        """Returns when the named list was last saved, or None if it has never been saved."""
+        with self._lock:
+            row = self._connection.execute('SELECT updated_at FROM lists WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    # Entities
+
+    def _upsert_entities(self, table: str, items: Iterable[Dict[str, Any]], now: float) -> List[str]:
+        ids = []
+        rows = []
+        for item in items:
+            if not item or not item.get('id'):
+                continue
+            ids.append(item['id'])
+            rows.append((item['id'], item.get('name') or '', json.dumps(item), now))
+        self._connection.executemany(
+            f'INSERT OR REPLACE INTO {table} (id, name, payload, updated_at) VALUES (?, ?, ?, ?)', rows)
+        return ids
+
+    def upsert(self, kind: str, items: Iterable[Dict[str, Any]]) -> List[str]:
+        """Inserts or replaces entities of the given kind ('artists', 'albums' or 'tracks')."""
+        if kind == 'playlists':
+            raise ValueError("Playlists are ordered, save them with save_playlists")
+        items = list(items)
+        with self._lock, self._connection:
+            ids = self._upsert_entities(ENTITY_TABLES[kind], items, time.time())
+        self._notify(kind, items)
+        return ids
+
+    def get_entities(self, kind: str, ids: List[str]) -> List[Dict[str, Any]]:
+        """Returns the entities with the given ids, in the same order. Unknown ids are skipped."""
+        if not ids:
+            return []
+        payloads = {}
+        with self._lock:
+            # Stay below the SQLite limit of bound parameters
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                for entity_id, payload in self._connection.execute(
+                        f'SELECT id, payload FROM {ENTITY_TABLES[kind]} WHERE id IN ({placeholders})', chunk):
+                    payloads[entity_id] = payload
+        return [json_loads(payloads[entity_id]) for entity_id in ids if entity_id in payloads]
+
+    def iter_entities(self, kind: str) -> Iterable[Dict[str, Any]]:
+        """Yields every stored entity of the given kind."""
+        with self._lock:
+            rows = self._connection.execute(f'SELECT payload FROM {ENTITY_TABLES[kind]}').fetchall()
+        for (payload,) in rows:
+            yield json_loads(payload)
+
+    def iter_names(self, kind: str) -> Iterable[Tuple[str, str]]:
+        """Yields the id and the name of every stored entity of the given kind, without decoding the payloads."""
+        with self._lock:
+            rows = self._connection.execute(f'SELECT id, name FROM {ENTITY_TABLES[kind]}').fetchall()
+        yield from rows
+
+    def count_entities(self, kind: str) -> int:
+        with self._lock:
+            return self._connection.execute(f'SELECT COUNT(*) FROM {ENTITY_TABLES[kind]}').fetchone()[0]
+
+    # Profile
+
+    def save_profile(self, profile: Dict[str, Any]):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM profile')
+            self._connection.execute('INSERT INTO profile (id, payload, updated_at) VALUES (?, ?, ?)',
+                                     (profile.get('id') or '', json.dumps(profile), time.time()))
+
+    def get_profile(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute('SELECT payload FROM profile').fetchone()
+        return json_loads(row[0]) if row else None
+
+    # Ordered lists of ids
+
+    def _replace_list(self, table: str, key_columns: Tuple[str, ...], key: Tuple, ids: List[str]):
+        where = ' AND '.join(f'{column} = ?' for column in key_columns)
+        self._connection.execute(f'DELETE FROM {table} WHERE {where}', key)
+        columns = ', '.join(key_columns + ('position', 'item_id'))
+        placeholders = ','.join('?' * (len(key_columns) + 2))
+        self._connection.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})',
+                                     [key + (position, item_id) for position, item_id in enumerate(ids)])
+
+    def _list_ids(self, table: str, key_columns: Tuple[str, ...], key: Tuple, limit: Optional[int]) -> List[str]:
+        where = ' AND '.join(f'{column} = ?' for column in key_columns)
+        query = f'SELECT item_id FROM {table} WHERE {where} ORDER BY position'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with self._lock:
+            return [row[0] for row in self._connection.execute(query, key)]
+
+    def save_top_items(self, kind: str, time_range: str, items: List[Dict[str, Any]]):
+        """Saves the top 'artists' or 'tracks' of the user for a time range."""
+        now = time.time()
+        with self._lock, self._connection:
+            ids = self._upsert_entities(ENTITY_TABLES[kind], items, now)
+            self._replace_list('top_items', ('kind', 'time_range'), (kind, time_range), ids)
+            # One snapshot a day, the last sync of the day replaces the previous ones. A snapshot is a single row,
+            # the ids separated by spaces and the popularities as bytes, so years of history load quickly
+            popularities = [item.get('popularity') for item in items if item and item.get('id')]
+            self._connection.execute(
+                'INSERT OR REPLACE INTO top_item_history (kind, time_range, day, item_ids, popularities) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (kind, time_range, int(now // 86400), ' '.join(ids),
+                 bytes(popularity if isinstance(popularity, int) and 0 <= popularity <= 100 else UNKNOWN_POPULARITY
+                       for popularity in popularities)))
+            self._touch_list(f'top:{kind}:{time_range}', now)
+        self._notify(kind, items)
+
+    def get_top_items(self, kind: str, time_range: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Returns the top items of a time range, or None if they have never been synced."""
+        if self.list_updated_at(f'top:{kind}:{time_range}') is None:
+            return None
+        ids = self._list_ids('top_items', ('kind', 'time_range'), (kind, time_range), limit)
+        return self.get_entities(kind, ids)
+
+    def get_top_item_history(self, kind: str, since_day: Optional[int] = None
+                             ) -> List[Tuple[str, int, List[str], bytes]]:
+        """
+        Returns the daily snapshots of the top items of a kind, from since_day if given, as (time range, day, item
+        ids, popularities) rows. Days are counted since the epoch, popularities hold a byte per item,
+        `UNKNOWN_POPULARITY` when Spotify did not give it.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT time_range, day, item_ids, popularities FROM top_item_history WHERE kind = ? AND day >= ?',
+                (kind, since_day if since_day is not None else 0)).fetchall()
+        return [(time_range, day, item_ids.split(), popularities) for time_range, day, item_ids, popularities in rows]
+
+    def prune_top_item_history(self, before_day: int):
+        """Deletes the snapshots of the top items taken before a day."""
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM top_item_history WHERE day < ?', (before_day,))
+
+    def save_artist_links(self, artist_id: str, relation: str, kind: str, items: List[Dict[str, Any]]):
+        """
+        Saves a list of items related to an artist.
+
+        Parameters:
+            artist_id (str): The id of the artist.
+            relation (str): The name of the list, e.g. 'album', 'single', 'top_tracks' or 'related_artists'.
+            kind (str): The kind of the items of the list.
+            items (list): The items, in order.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            ids = self._upsert_entities(ENTITY_TABLES[kind], items, now)
+            self._replace_list('artist_links', ('artist_id', 'relation'), (artist_id, relation), ids)
+            self._touch_list(f'artist:{artist_id}:{relation}', now)
+        self._notify(kind, items)
+
+    def get_artist_links(self, artist_id: str, relation: str, kind: str,
+                         limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Returns a list of items related to an artist, or None if it has never been synced."""
+        if self.list_updated_at(f'artist:{artist_id}:{relation}') is None:
+            return None
+        ids = self._list_ids('artist_links', ('artist_id', 'relation'), (artist_id, relation), limit)
+        return self.get_entities(kind, ids)
+
+    def get_artist_links_ids(self, artist_ids: List[str], relation: str,
+                             updated_after: float = 0) -> Dict[str, List[str]]:
+        """
+        Returns the ids of a list related to several artists, by artist, reading the store once per chunk of
+        artists rather than once per artist. Artists whose list has never been saved, or not since
+        `updated_after`, are left out.
+        """
+        lists: Dict[str, List[str]] = {}
+        with self._lock:
+            for start in range(0, len(artist_ids), 500):
+                chunk = artist_ids[start:start + 500]
+                names = {f'artist:{artist_id}:{relation}': artist_id for artist_id in chunk}
+                placeholders = ','.join('?' * len(chunk))
+                fresh = [names[name] for name, updated_at in self._connection.execute(
+                    f'SELECT name, updated_at FROM lists WHERE name IN ({placeholders})', list(names))
+                         if updated_at >= updated_after]
+                if not fresh:
+                    continue
+                for artist_id in fresh:
+                    lists[artist_id] = []
+                placeholders = ','.join('?' * len(fresh))
+                for artist_id, item_id in self._connection.execute(
+                        f'SELECT artist_id, item_id FROM artist_links WHERE relation = ? '
+                        f'AND artist_id IN ({placeholders}) ORDER BY artist_id, position', [relation] + fresh):
+                    lists[artist_id].append(item_id)
+        return lists
+
+    # Artist graph
+
+    def save_artist_ranking(self, seed_id: str, depth: int, ranking: List[Tuple[str, float, int]],
+                            artist_count: int, edge_count: int):
+        """
+        Saves the ranking of the artists around a seed artist, as (artist id, score, distance) best first, with the
+        size of the graph it was computed on.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO artist_graphs '
+                                     '(seed_id, depth, artist_count, edge_count, updated_at) VALUES (?, ?, ?, ?, ?)',
+                                     (seed_id, depth, artist_count, edge_count, time.time()))
+            self._connection.execute('DELETE FROM artist_rankings WHERE seed_id = ? AND depth = ?', (seed_id, depth))
+            self._connection.executemany(
+                'INSERT INTO artist_rankings (seed_id, depth, position, item_id, score, distance) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(seed_id, depth, position, item_id, score, distance)
+                 for position, (item_id, score, distance) in enumerate(ranking)])
+
+    def get_artist_ranking(self, seed_id: str, depth: int, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the ranking saved for a seed artist, or None if it has never been saved: a dict with the
+        `artist_count`, `edge_count` and `updated_at` of the graph, and the `ranking` as (artist, score, distance).
+        """
+        with self._lock:
+            graph = self._connection.execute('SELECT artist_count, edge_count, updated_at FROM artist_graphs '
+                                             'WHERE seed_id = ? AND depth = ?', (seed_id, depth)).fetchone()
+            if graph is None:
+                return None
+            query = ('SELECT item_id, score, distance FROM artist_rankings WHERE seed_id = ? AND depth = ? '
+                     'ORDER BY position')
+            if limit is not None:
+                query += f' LIMIT {int(limit)}'
+            rows = self._connection.execute(query, (seed_id, depth)).fetchall()
+        artists = {artist['id']: artist for artist in self.get_entities('artists', [row[0] for row in rows])}
+        return {'artist_count': graph[0], 'edge_count': graph[1], 'updated_at': graph[2],
+                'ranking': [(artists[item_id], score, distance) for item_id, score, distance in rows
+                            if item_id in artists]}
+
+    # Playlists
+
+    def save_playlists(self, playlists: List[Dict[str, Any]]) -> List[str]:
+        """
+        Replaces the playlists of the user, keeping the tracks of the playlists still present.
+
+        Returns:
+            The ids of the playlists removed since the last save.
+        """
+        now = time.time()
+        ids = [playlist['id'] for playlist in playlists]
+        with self._lock, self._connection:
+            known = {row[0] for row in self._connection.execute('SELECT id FROM playlists')}
+            removed = list(known.difference(ids))
+            for playlist_id in removed:
+                self._connection.execute('DELETE FROM playlists WHERE id = ?', (playlist_id,))
+                self._connection.execute('DELETE FROM playlist_tracks WHERE playlist_id = ?', (playlist_id,))
+
+            self._connection.executemany(
+                'INSERT INTO playlists (id, name, snapshot_id, position, payload, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET name = excluded.name, snapshot_id = excluded.snapshot_id, '
+                'position = excluded.position, payload = excluded.payload, updated_at = excluded.updated_at',
+                [(playlist['id'], playlist.get('name') or '', playlist.get('snapshot_id'), position,
+                  json.dumps(playlist), now) for position, playlist in enumerate(playlists)])
+            self._touch_list('playlists', now)
+        self._notify('playlists', playlists, removed)
+        return removed
+
+    def get_playlists(self, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Returns the playlists of the user in their library order, or None if they have never been synced."""
+        if self.list_updated_at('playlists') is None:
+            return None
+        query = 'SELECT payload FROM playlists ORDER BY position'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        with self._lock:
+            return [json_loads(row[0]) for row in self._connection.execute(query)]
+
+    def get_synced_snapshots(self) -> Dict[str, Optional[str]]:
+        """Returns, for each playlist, the snapshot id of the version of its tracks stored locally."""
+        with self._lock:
+            return dict(self._connection.execute('SELECT id, tracks_snapshot_id FROM playlists'))
+
+    def save_playlist_tracks(self, playlist_id: str, snapshot_id: Optional[str], tracks: List[Dict[str, Any]]):
+        """Replaces the tracks of a playlist and records the snapshot they belong to."""
+        now = time.time()
+        with self._lock, self._connection:
+            ids = self._upsert_entities('tracks', tracks, now)
+            self._replace_list('playlist_tracks', ('playlist_id',), (playlist_id,), ids)
+            self._connection.execute('UPDATE playlists SET tracks_snapshot_id = ? WHERE id = ?',
+                                     (snapshot_id, playlist_id))
+        self._notify('tracks', tracks)
+
+    def get_playlist_tracks(self, playlist_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ids = self._list_ids('playlist_tracks', ('playlist_id',), (playlist_id,), limit)
+        return self.get_entities('tracks', ids)
+
+    # Pages
+
+    def save_page_snapshot(self, identifier: str, state: Any):
+        """Saves the last data shown by a page, identified by its content type identifier."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO page_snapshots (identifier, payload, updated_at) VALUES (?, ?, ?)',
+                (identifier, json.dumps(state), time.time()))
+            if self.max_page_snapshots:
+                # Snapshots are saved at each visit, the oldest ones belong to the pages not visited for the longest
+                self._connection.execute(
+                    'DELETE FROM page_snapshots WHERE identifier IN (SELECT identifier FROM page_snapshots '
+                    'ORDER BY updated_at DESC LIMIT -1 OFFSET ?)', (self.max_page_snapshots,))
+
+    def get_page_snapshot(self, identifier: str) -> Optional[Any]:
+        """Returns the last data shown by a page, or None if the page has never been shown."""
+        with self._lock:
+            row = self._connection.execute('SELECT payload FROM page_snapshots WHERE identifier = ?',
+                                           (identifier,)).fetchone()
+        return json_loads(row[0]) if row else None
@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .library_store import LibraryStore
+from .models import ENTITY_MODELS, Album, Artist, Playlist, Track, parse_list
+from .settings import ApiSettings
+from .spotify_client import SpotifyClient
+
+logger = logging.getLogger(__name__)
+
+TIME_RANGES = ('short_term', 'medium_term', 'long_term')
+
+# Album groups shown on the artist page, by name of the list in the store
+ARTIST_ALBUM_GROUPS = ('album', 'single', 'appears_on')
+
+
+class LibrarySync:
+    """
+    Keeps the LibraryStore in sync with the Spotify library of the user.
+
+    Pages call the `load_*` methods, which read from the store and only go to the network when the data has
+    never been fetched or is older than the TTL of its endpoint. A background thread periodically refreshes
+    everything; playlists are listed every time but their tracks are only fetched again when their `snapshot_id`
+    has changed, so a sync of a large library only moves the deltas.
+
+    Attributes:
+        store (LibraryStore): The local library database.
+        interval (float): The number of seconds between two background syncs.
+    """
+
+    def __init__(self, sp_client: SpotifyClient, api: ApiSettings, store: LibraryStore, interval: float = 3600):
+        self.sp_client = sp_client
+        self.api = api
+        self.store = store
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sync_lock = threading.Lock()
+
+    def _is_stale(self, list_name: str, endpoint: str) -> bool:
+        """Whether a list of the store has never been saved or is older than the TTL of its endpoint."""
+        updated_at = self.store.list_updated_at(list_name)
+        if updated_at is None:
+            return True
+        ttl_s = self.api.endpoint(endpoint).ttl_s
+        return ttl_s is not None and time.time() - updated_at > ttl_s
+
+    # Sync operations, all running in background threads
+
+    def sync_profile(self) -> Dict[str, Any]:
+        profile = self.sp_client.get(self.api.endpoint('users.current_user_profile').url())
+        self.store.save_profile(profile)
+        return profile
+
+    @staticmethod
+    def _top_items_endpoint(kind: str) -> str:
+        return 'users.user_top_item_artists' if kind == 'artists' else 'users.user_top_item_tracks'
+
+    def sync_top_items(self, kind: str, time_range: str):
+        """Fetches the top 'artists' or 'tracks' of a time range."""
+        endpoint = self.api.endpoint(self._top_items_endpoint(kind))
+        items = self.sp_client.get(endpoint.url(),
+                                   params={'time_range': time_range, 'limit': endpoint.page_size or 50})['items']
+        self.store.save_top_items(kind, time_range, items)
+
+    def sync_playlists(self, with_tracks: bool = True) -> Dict[str, int]:
+        """
+        Fetches the playlists of the user, then the tracks of the playlists whose snapshot_id has changed.
+
+        Parameters:
+            with_tracks (bool): When False only the playlists are listed, their tracks are left to the next sync.
+
+        Returns:
+            Counters of the playlists whose tracks have been fetched, skipped and removed.
+        """
+        endpoint = self.api.endpoint('users.current_user_playlists')
+        playlists = list(self.sp_client.iterate_pages(endpoint.url(), params={'limit': endpoint.page_size or 50}))
+        synced_snapshots = self.store.get_synced_snapshots()
+        removed = self.store.save_playlists(playlists)
+
+        fetched = skipped = 0
+        for playlist in playlists if with_tracks else []:
+            snapshot_id = playlist.get('snapshot_id')
+            if snapshot_id and synced_snapshots.get(playlist['id']) == snapshot_id:
+                skipped += 1
+                continue
+            self.sync_playlist_tracks(playlist['id'], snapshot_id)
+            fetched += 1
+
+        logger.info(f"Playlists synced: {fetched} fetched, {skipped} unchanged, {len(removed)} removed")
+        return {'fetched': fetched, 'skipped': skipped, 'removed': len(removed)}
+
+    def sync_playlist_tracks(self, playlist_id: str, snapshot_id: Optional[str]):
+        endpoint = self.api.endpoint('playlists.tracks')
+        # Playlist items wrap the track, local files and unavailable tracks have no track or no id
+        tracks = [item['track'] for item in self.sp_client.iterate_pages(endpoint.url(playlist_id),
+                                                                         params={'limit': endpoint.page_size or 100})
+                  if item.get('track') and item['track'].get('id')]
+        self.store.save_playlist_tracks(playlist_id, snapshot_id, tracks)
+
+    def sync_artist(self, artist_id: str):
+        """Fetches everything shown on the page of an artist."""
+        albums_endpoint = self.api.endpoint('artist.get_albums')
+        albums_url = albums_endpoint.url(artist_id)
+        for group in ARTIST_ALBUM_GROUPS:
+            params = {'include_groups': group, 'limit': albums_endpoint.page_size or 9}
+            albums = self.sp_client.get(albums_url, params=params)['items']
+            self.store.save_artist_links(artist_id, group, 'albums', albums)
+
+        top_tracks = self.sp_client.get(self.api.endpoint('artist.top_tracks').url(artist_id))['tracks']
+        self.store.save_artist_links(artist_id, 'top_tracks', 'tracks', top_tracks)
+
+        self.sync_related_artists(artist_id)
+
+    def sync_related_artists(self, artist_id: str) -> List[str]:
+        """Fetches the artists related to an artist, returns their ids in the order of Spotify."""
+        related_artists = self.sp_client.get(self.api.endpoint('artist.related_artists').url(artist_id))['artists']
+        self.store.save_artist_links(artist_id, 'related_artists', 'artists', related_artists)
+        return [artist['id'] for artist in related_artists if artist and artist.get('id')]
+
+    def sync_all(self):
+        """Refreshes the profile, the top items of every time range and the playlists."""
+        with self._sync_lock:
+            start = time.perf_counter()
+            self.sync_profile()
+            for time_range in TIME_RANGES:
+                self.sync_top_items('artists', time_range)
+                self.sync_top_items('tracks', time_range)
+            self.sync_playlists()
+            logger.info(f"Library synced in {time.perf_counter() - start:.2f} s")
+
+    # Store-first reads used by the pages, returning compact records. With refresh, the data is synced first.
+
+    def load_profile(self, refresh: bool = False) -> Dict[str, Any]:
+        profile = None if refresh else self.store.get_profile()
+        if profile is None:
+            profile = self.sync_profile()
+        return profile
+
+    def load_top_items(self, kind: str, time_range: str, limit: int, refresh: bool = False) -> List[Any]:
+        """Returns the top `Artist` or `Track` records of a time range."""
+        stale = refresh or self._is_stale(f'top:{kind}:{time_range}', self._top_items_endpoint(kind))
+        items = None if stale else self.store.get_top_items(kind, time_range, limit)
+        if items is None:
+            self.sync_top_items(kind, time_range)
+            items = self.store.get_top_items(kind, time_range, limit)
+        return parse_list(Artist if kind == 'artists' else Track, items)
+
+    def refresh_top_items(self, kind: str, time_range: str, refresh: bool = False) -> bool:
+        """Syncs the top items of a time range if they are stale, or with refresh. Returns whether they were."""
+        if refresh or self._is_stale(f'top:{kind}:{time_range}', self._top_items_endpoint(kind)):
+            self.sync_top_items(kind, time_range)
+            return True
+        return False
+
+    def load_playlists(self, limit: Optional[int] = None, refresh: bool = False) -> List[Playlist]:
+        stale = refresh or self._is_stale('playlists', 'users.current_user_playlists')
+        playlists = None if stale else self.store.get_playlists(limit)
+        if playlists is None:
+            self.sync_playlists(with_tracks=False)
+            playlists = self.store.get_playlists(limit)
+        return parse_list(Playlist, playlists)
+
+    def load_artist(self, artist_id: str, refresh: bool = False) -> Dict[str, List[Any]]:
+        """Returns the albums of each group, the top tracks and the related artists of an artist."""
+        lists_endpoints = [(group, 'artist.get_albums') for group in ARTIST_ALBUM_GROUPS]
+        lists_endpoints += [('top_tracks', 'artist.top_tracks'), ('related_artists', 'artist.related_artists')]
+        if refresh or any(self._is_stale(f'artist:{artist_id}:{name}', endpoint) for name, endpoint in lists_endpoints):
+            self.sync_artist(artist_id)
+
+        lists = {group: parse_list(Album, self.store.get_artist_links(artist_id, group, 'albums'))
+                 for group in ARTIST_ALBUM_GROUPS}
+        lists['top_tracks'] = parse_list(Track, self.store.get_artist_links(artist_id, 'top_tracks', 'tracks'))
+        lists['related_artists'] = parse_list(Artist,
+                                              self.store.get_artist_links(artist_id, 'related_artists', 'artists'))
+        return lists
+
+    def load_related_ids(self, artist_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Returns the ids of the related artists of the given artists, for those whose related artists are stored
+        and fresh. The others are left out, to be synced.
+        """
+        ttl_s = self.api.endpoint('artist.related_artists').ttl_s
+        updated_after = time.time() - ttl_s if ttl_s is not None else 0
+        return self.store.get_artist_links_ids(artist_ids, 'related_artists', updated_after)
+
+    def load_entities(self, kind: str, ids: List[str]) -> List[Any]:
+        """Returns the stored records of the given kind with these ids, in the same order."""
+        return parse_list(ENTITY_MODELS[kind], self.store.get_entities(kind, ids))
+
+    def search(self, query: str, limit: Optional[int] = None) -> Dict[str, List[Any]]:
+        """
+        Searches Spotify for artists, albums and tracks, the fallback of the local search. The results are saved
+        in the store, and so indexed by the listeners of the store. Playlists are left out: the store only holds
+        the playlists of the user.
+        """
+        endpoint = self.api.endpoint('search.search_for_item')
+        response = self.sp_client.get(endpoint.url(), params={'q': query, 'type': 'artist,album,track',
+                                                              'limit': limit or endpoint.page_size or 10})
+        results = {}
+        for kind in ('artists', 'albums', 'tracks'):
+            items = [item for item in (response.get(kind) or {}).get('items') or () if item and item.get('id')]
+            self.store.upsert(kind, items)
+            results[kind] = parse_list(ENTITY_MODELS[kind], items)
+        return results
+
+    # Background sync
+
+    def start(self, initial_delay: float = 0):
+        """
+        Starts the periodic background sync.
+
+        Parameters:
+            initial_delay (float): The number of seconds to wait before the first sync, leaving the network to
+                the requests of the startup.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(initial_delay,), name='library-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self, initial_delay: float):
+        self._stop_event.wait(initial_delay)
+        while not self._stop_event.is_set():
+            try:
+                self.sync_all()
+            except Exception as e:
+                logger.error(f"Library sync failed: {e}")
+            self._stop_event.wait(self.interval)
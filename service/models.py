@@ -0,0 +1,152 @@
+"""
+Compact entities parsed from the Spotify API responses.
+
+The API returns large nested objects (markets, external urls, copyrights...) of which the application only shows a
+few fields. Pages and cards keep these immutable, slotted records instead of the raw dicts: only the used fields
+are kept, repeated strings such as genres and artist names are interned, and the records can be turned back into
+API shaped dicts with `to_json` for the snapshots.
+"""
+import json
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the standard library decoder is used instead
+    orjson = None
+
+
+def json_loads(data):
+    """Decodes JSON text or bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+@dataclass(frozen=True, slots=True)
+class Image:
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, image: Dict[str, Any]) -> 'Image':
+        return cls(image['url'], image.get('width'), image.get('height'))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'url': self.url, 'width': self.width, 'height': self.height}
+
+
+def parse_images(images: Optional[Iterable[Dict[str, Any]]]) -> Tuple[Image, ...]:
+    return tuple(Image.from_json(image) for image in images or ())
+
+
+@dataclass(frozen=True, slots=True)
+class Artist:
+    id: str
+    name: str
+    images: Tuple[Image, ...] = ()
+    genres: Tuple[str, ...] = ()
+    followers: Optional[int] = None
+
+    @classmethod
+    def from_json(cls, artist: Dict[str, Any]) -> 'Artist':
+        # Artists nested in tracks and albums are simplified objects without images, genres and followers
+        return cls(id=artist.get('id') or '',
+                   name=_intern(artist.get('name') or ''),
+                   images=parse_images(artist.get('images')),
+                   genres=tuple(_intern(genre) for genre in artist.get('genres') or ()),
+                   followers=(artist.get('followers') or {}).get('total'))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'type': 'artist', 'id': self.id, 'name': self.name,
+                'images': [image.to_json() for image in self.images],
+                'genres': list(self.genres),
+                'followers': {'total': self.followers}}
+
+
+@dataclass(frozen=True, slots=True)
+class Album:
+    id: str
+    name: str
+    album_type: str = ''
+    images: Tuple[Image, ...] = ()
+    artists: Tuple[Artist, ...] = ()
+
+    @classmethod
+    def from_json(cls, album: Dict[str, Any]) -> 'Album':
+        return cls(id=album.get('id') or '',
+                   name=album.get('name') or '',
+                   album_type=_intern(album.get('album_type') or ''),
+                   images=parse_images(album.get('images')),
+                   artists=tuple(Artist.from_json(artist) for artist in album.get('artists') or ()))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'type': 'album', 'id': self.id, 'name': self.name, 'album_type': self.album_type,
+                'images': [image.to_json() for image in self.images],
+                'artists': [artist.to_json() for artist in self.artists]}
+
+
+@dataclass(frozen=True, slots=True)
+class Track:
+    id: str
+    name: str
+    duration_ms: int
+    artists: Tuple[Artist, ...]
+    album: Album
+
+    @classmethod
+    def from_json(cls, track: Dict[str, Any]) -> 'Track':
+        return cls(id=track.get('id') or '',
+                   name=track.get('name') or '',
+                   duration_ms=track.get('duration_ms') or 0,
+                   artists=tuple(Artist.from_json(artist) for artist in track.get('artists') or ()),
+                   album=Album.from_json(track.get('album') or {}))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'type': 'track', 'id': self.id, 'name': self.name, 'duration_ms': self.duration_ms,
+                'artists': [artist.to_json() for artist in self.artists],
+                'album': self.album.to_json()}
+
+
+@dataclass(frozen=True, slots=True)
+class Playlist:
+    id: str
+    name: str
+    owner_name: str = ''
+    public: Optional[bool] = None
+    images: Tuple[Image, ...] = ()
+    snapshot_id: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, playlist: Dict[str, Any]) -> 'Playlist':
+        return cls(id=playlist.get('id') or '',
+                   name=playlist.get('name') or '',
+                   owner_name=_intern((playlist.get('owner') or {}).get('display_name') or ''),
+                   public=playlist.get('public'),
+                   images=parse_images(playlist.get('images')),
+                   snapshot_id=playlist.get('snapshot_id'))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'type': 'playlist', 'id': self.id, 'name': self.name,
+                'owner': {'display_name': self.owner_name}, 'public': self.public,
+                'images': [image.to_json() for image in self.images],
+                'snapshot_id': self.snapshot_id}
+
+
+# Model of the entities of each kind of the library store
+ENTITY_MODELS = {'artists': Artist, 'albums': Album, 'tracks': Track, 'playlists': Playlist}
+
+
+def parse_list(model, items: Iterable[Dict[str, Any]]) -> List[Any]:
+    """Parses a list of API objects into records of the given model."""
+    return [model.from_json(item) for item in items]
+
+
+def dump_list(items: Iterable[Any]) -> List[Dict[str, Any]]:
+    return [item.to_json() for item in items]
@@ -0,0 +1,206 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .models import Artist
+
+logger = logging.getLogger(__name__)
+
+# Priorities of the prefetch tasks, lower runs first
+HOVER_PRIORITY = 0
+HISTORY_PRIORITY = 1
+
+
+class Prefetcher:
+    """
+    Speculative warming of the library store and the image cache for pages the user is likely to open.
+
+    A sustained hover on an artist card, reported by `hint`, queues the artist page; each navigation queues the
+    artist pages the user visits most often in the history. Tasks run one at a time in a low priority worker
+    thread which pauses while a page is loading in the foreground (see `begin_foreground`), and within budgets: a
+    bounded queue, a maximum number of tasks per minute and a maximum number of images per page. A page warmed
+    recently is not warmed again.
+
+    Attributes:
+        enabled (bool): Whether hints are accepted. When disabled every method is a no-op.
+        hover_delay_ms (int): How long a card must be hovered before it is prefetched.
+        max_queue (int): The number of pending tasks above which new hints are dropped.
+        max_tasks_per_minute (int): The number of tasks started per minute.
+        images_per_page (int): The number of images warmed per page.
+        history_pages (int): The number of most visited pages warmed after a navigation.
+        rewarm_after_s (float): The number of seconds before a warmed page can be warmed again.
+    """
+
+    def __init__(self, enabled: bool = True, hover_delay_ms: int = 400, max_queue: int = 20,
+                 max_tasks_per_minute: int = 30, images_per_page: int = 12, history_pages: int = 3,
+                 rewarm_after_s: float = 900):
+        self.enabled = enabled
+        self.hover_delay_ms = hover_delay_ms
+        self.max_queue = max_queue
+        self.max_tasks_per_minute = max_tasks_per_minute
+        self.images_per_page = images_per_page
+        self.history_pages = history_pages
+        self.rewarm_after_s = rewarm_after_s
+
+        self.library = None
+        self.image_cache = None
+
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = set()
+        self._warmed: Dict[str, float] = {}
+        self._task_starts = deque()
+        self._lock = threading.Lock()
+
+        # Number of pages loading in the foreground, the worker waits for it to drop to zero
+        self._foreground = 0
+        self._idle = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.completed = 0
+        self.dropped = 0
+
+    def configure(self, **settings):
+        """Updates the budgets of the prefetcher, typically from the `prefetch` section of config.yaml."""
+        for name, value in settings.items():
+            if value is not None and hasattr(self, name):
+                setattr(self, name, value)
+
+    def start(self, library, image_cache):
+        """Starts the worker thread warming the given library and image cache."""
+        if not self.enabled or self._thread is not None:
+            return
+        self.library = library
+        self.image_cache = image_cache
+        self._thread = threading.Thread(target=self._run, name='prefetcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._idle:
+            self._idle.notify_all()
+        # Wake up the worker if it is waiting for a task
+        self._queue.put((HOVER_PRIORITY, next(self._sequence), None, None))
+
+    def begin_foreground(self):
+        """Marks the start of a foreground load, the prefetch tasks pause until `end_foreground`."""
+        with self._idle:
+            self._foreground += 1
+
+    def end_foreground(self):
+        with self._idle:
+            self._foreground -= 1
+            self._idle.notify_all()
+
+    # Hints
+
+    def hint(self, content_type_identifier: str, data: Any):
+        """Reports the intent to open a page, e.g. a sustained hover on a card. Called from the main thread."""
+        artist = self._artist_of(content_type_identifier, data)
+        if artist is not None:
+            self._submit(f"Artist:{artist.id}", HOVER_PRIORITY, lambda: self._warm_artist(artist))
+
+    def warm_history(self, page_history: List[Tuple[str, Any]]):
+        """Queues the artist pages visited most often in the navigation history."""
+        if self._thread is None:
+            return
+        counts = Counter()
+        artists = {}
+        for content_type_identifier, data in page_history:
+            artist = self._artist_of(content_type_identifier, data)
+            if artist is not None:
+                counts[artist.id] += 1
+                artists[artist.id] = artist
+
+        # The current page has just been loaded
+        current = self._artist_of(*page_history[-1]) if page_history else None
+        for artist_id, _ in counts.most_common(self.history_pages + 1):
+            if current is None or artist_id != current.id:
+                artist = artists[artist_id]
+                self._submit(f"Artist:{artist_id}", HISTORY_PRIORITY, lambda artist=artist: self._warm_artist(artist))
+
+    @staticmethod
+    def _artist_of(content_type_identifier: str, data: Any) -> Optional[Artist]:
+        # Cards of albums also navigate to 'Artist:' pages, only artists have a page to warm
+        if not content_type_identifier.startswith('Artist:') or not isinstance(data, Artist) or not data.id:
+            return None
+        return data
+
+    def _submit(self, key: str, priority: int, task: Callable[[], None]):
+        if self._thread is None:
+            return
+        with self._lock:
+            if key in self._pending:
+                return
+            if time.monotonic() - self._warmed.get(key, float('-inf')) < self.rewarm_after_s:
+                return
+            if len(self._pending) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._pending.add(key)
+        self._queue.put((priority, next(self._sequence), key, task))
+
+    # Worker
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            _, _, key, task = self._queue.get()
+            if task is None:
+                continue
+            with self._lock:
+                self._pending.discard(key)
+            if not self._wait_for_budget():
+                return
+            try:
+                task()
+                with self._lock:
+                    self._warmed[key] = time.monotonic()
+                self.completed += 1
+            except Exception as e:
+                logger.error(f"Error prefetching {key}: {e}")
+
+    def _wait_for_idle(self) -> bool:
+        """Waits until no page is loading in the foreground. Returns False when the prefetcher is stopped."""
+        with self._idle:
+            while self._foreground and not self._stop_event.is_set():
+                self._idle.wait()
+        return not self._stop_event.is_set()
+
+    def _wait_for_budget(self) -> bool:
+        """Waits for a slot in the tasks per minute budget, then for the foreground to be idle."""
+        now = time.monotonic()
+        while self._task_starts and now - self._task_starts[0] > 60:
+            self._task_starts.popleft()
+        if len(self._task_starts) >= self.max_tasks_per_minute:
+            if self._stop_event.wait(60 - (now - self._task_starts[0])):
+                return False
+            self._task_starts.popleft()
+        self._task_starts.append(time.monotonic())
+        return self._wait_for_idle()
+
+    def _warm_artist(self, artist: Artist):
+        lists = self.library.load_artist(artist.id)
+
+        # Images in the order they appear on the page
+        urls = [image.url for image in artist.images[:1]]
+        for track in lists['top_tracks']:
+            images = track.album.images
+            urls.extend(image.url for image in images[1:2] or images[:1])
+        for group in ('album', 'single', 'appears_on', 'related_artists'):
+            urls.extend(item.images[0].url for item in lists[group] if item.images)
+
+        for url in urls[:self.images_per_page]:
+            # Foreground loads go first, even in the middle of a page
+            if not self._wait_for_idle():
+                return
+            if not self.image_cache.is_cached(url):
+                self.image_cache.fetch_image(url)
+
+
+# Prefetcher shared by the whole application, started by the main window
+prefetcher = Prefetcher()
@@ -0,0 +1,374 @@
+"""
+Timeouts, retries and hedged requests for the GET requests to the Spotify API.
+
+`RequestPolicy` sends the requests of a `SpotifyClient`:
+
+- Every request has the timeout of its endpoint (`timeout_s` in config.yaml), or the default of `api.resilience`.
+- Timeouts, connection errors, 5xx and 429 answers are retried, at most `max_retries` times, after an exponential
+  backoff with full jitter. A 429 waits for its Retry-After instead, up to `max_retry_after_s`.
+- With `hedge`, a request still unanswered after the `hedge_percentile` latency of its endpoint is sent a second
+  time, and the first answer wins. Only GET requests are sent, so duplicates are harmless. Endpoints of a lower
+  priority than `hedge_max_priority`, whose lists are not waited for, are not hedged.
+
+Retries and hedges are extra load on Spotify when it is already slow or failing. Both draw from budgets refilled
+by the requests themselves (`retry_budget` and `hedge_budget` extra attempts per request), so that a degraded API
+does not get several times the usual traffic. Once a budget is empty, the answer at hand is final.
+
+Every request is attributed to its endpoint in `request_stats`: its latency, split between the attempts and the
+backoff, the retries, the hedges and the failures. The requests slower than `slow_request_ms` are logged with this
+breakdown.
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from .settings import ApiSettings, Endpoint
+from .transport import CassetteMissError
+
+logger = logging.getLogger(__name__)
+
+# Number of latencies kept per endpoint, for the hedge delays and the percentiles of the report
+LATENCY_SAMPLES = 1000
+# Extra attempts a budget can save up, spent by bursts of failures
+BUDGET_BURST = 10
+
+
+class SpotifyApiError(Exception):
+    """
+    Raised when a request to the API fails for good: an error answer which is not retried or is still an error
+    after the retries, or no answer at all.
+
+    Attributes:
+        status_code (int, optional): The HTTP status of the last answer, None when there was no answer.
+        endpoint (str, optional): The name of the endpoint of the request.
+    """
+
+    def __init__(self, message: str, status_code: Optional[int] = None, endpoint: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.endpoint = endpoint
+
+    @classmethod
+    def from_response(cls, response: httpx.Response, endpoint: Optional[str] = None) -> 'SpotifyApiError':
+        """Builds the error of an error answer, with the message of its `error` object when it has one."""
+        try:
+            error = response.json().get('error')
+            message = error.get('message') if isinstance(error, dict) else error
+        except (ValueError, AttributeError):
+            message = None
+        return cls(f"{response.request.method} {response.request.url} failed with status {response.status_code}"
+                   f"{f': {message}' if message else ''}", status_code=response.status_code, endpoint=endpoint)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _is_retryable(response: Optional[httpx.Response]) -> bool:
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+
+def retry_after_s(response: Optional[httpx.Response]) -> Optional[float]:
+    """Returns the delay requested by the Retry-After header of an answer, in seconds or as a date."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Budget:
+    """Extra attempts earned by the requests, `ratio` per request, saved up to `BUDGET_BURST`."""
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self._tokens = float(BUDGET_BURST) if ratio > 0 else 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(BUDGET_BURST, self._tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self):
+        """Gives back an attempt spent but not made."""
+        with self._lock:
+            self._tokens = min(BUDGET_BURST, self._tokens + 1)
+
+
+@dataclass
+class RequestTrace:
+    """Where the time of a request went."""
+    endpoint: str
+    attempts: int = 0
+    hedges: int = 0
+    hedge_won: bool = False
+    timeouts: int = 0
+    backoff_ms: float = 0.0
+    total_ms: float = 0.0
+    status_code: Optional[int] = None
+    failed: bool = False
+
+    def describe(self) -> str:
+        details = [f"{self.attempts} attempts"]
+        if self.backoff_ms:
+            details.append(f"{self.backoff_ms:.0f} ms of backoff")
+        if self.timeouts:
+            details.append(f"{self.timeouts} timeouts")
+        if self.hedges:
+            details.append('hedge won' if self.hedge_won else 'hedged')
+        status = self.status_code if self.status_code is not None else 'no answer'
+        return f"{self.endpoint} in {self.total_ms:.0f} ms ({', '.join(details)}), status {status}"
+
+
+class RequestStats:
+    """
+    The latencies and outcomes of the requests, by endpoint. Shared by the clients of a process (see
+    `request_stats`), thread safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self._attempt_latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_SAMPLES))
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def record_attempt(self, endpoint: str, latency_ms: float):
+        """Records the latency of an answered attempt, from which the hedge delays are taken."""
+        with self._lock:
+            self._attempt_latencies[endpoint].append(latency_ms)
+
+    def record(self, trace: RequestTrace):
+        with self._lock:
+            self._latencies[trace.endpoint].append(trace.total_ms)
+            counters = self._counters[trace.endpoint]
+            counters['requests'] += 1
+            counters['attempts'] += trace.attempts
+            counters['retries'] += max(0, trace.attempts - trace.hedges - 1)
+            counters['hedges'] += trace.hedges
+            counters['hedge_wins'] += trace.hedge_won
+            counters['timeouts'] += trace.timeouts
+            counters['failures'] += trace.failed
+            counters['backoff_ms'] += trace.backoff_ms
+
+    def attempt_percentile(self, endpoint: str, percentile: float, min_samples: int) -> Optional[float]:
+        """Returns a percentile of the attempt latencies of an endpoint, None below `min_samples` samples."""
+        with self._lock:
+            samples = self._attempt_latencies.get(endpoint)
+            if samples is None or len(samples) < max(1, min_samples):
+                return None
+            ordered = sorted(samples)
+        return _percentile(ordered, percentile)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the latency percentiles and the counters of each endpoint."""
+        with self._lock:
+            latencies = {endpoint: sorted(samples) for endpoint, samples in self._latencies.items()}
+            counters = {endpoint: dict(values) for endpoint, values in self._counters.items()}
+        report = {}
+        for endpoint, ordered in sorted(latencies.items()):
+            report[endpoint] = {
+                **{name: int(value) if name != 'backoff_ms' else round(value, 1)
+                   for name, value in counters[endpoint].items()},
+                'p50_ms': round(_percentile(ordered, 50), 1),
+                'p95_ms': round(_percentile(ordered, 95), 1),
+                'p99_ms': round(_percentile(ordered, 99), 1),
+                'max_ms': round(ordered[-1], 1) if ordered else 0.0,
+            }
+        return report
+
+    def log_report(self):
+        for endpoint, stats in self.report().items():
+            logger.info(f"Requests to {endpoint}: {stats}")
+
+
+# Latencies of the requests of the process, reported on exit
+request_stats = RequestStats()
+
+
+class RequestPolicy:
+    """
+    Sends GET requests with the timeouts, retries and hedges of the `resilience` settings of the API.
+
+    Attributes:
+        api (ApiSettings): The endpoints, for their timeouts, and the resilience settings.
+        stats (RequestStats): Where the requests are recorded.
+    """
+
+    def __init__(self, api: ApiSettings, stats: RequestStats = request_stats, seed: Optional[int] = None):
+        self.api = api
+        self.settings = api.resilience
+        self.stats = stats
+        self._random = random.Random(seed)
+        self._retry_budget = _Budget(self.settings.retry_budget)
+        self._hedge_budget = _Budget(self.settings.hedge_budget)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def timeout(self, endpoint: Optional[Endpoint]) -> httpx.Timeout:
+        """Returns the timeout of the requests to an endpoint."""
+        timeout_s = endpoint.timeout_s if endpoint is not None and endpoint.timeout_s is not None \
+            else self.settings.timeout_s
+        return httpx.Timeout(timeout_s, connect=min(timeout_s, self.settings.connect_timeout_s))
+
+    def backoff_s(self, retry: int) -> float:
+        """Returns the delay before a retry, drawn uniformly below the exponential backoff (full jitter)."""
+        ceiling_ms = min(self.settings.backoff_max_ms, self.settings.backoff_base_ms * 2 ** retry)
+        return self._random.uniform(0, ceiling_ms) / 1000
+
+    def get(self, client: httpx.Client, url: str, **kwargs) -> httpx.Response:
+        """
+        Sends a GET request with a client, retried and hedged. Returns the last answer, which may be an error
+        once the retries or the retry budget are exhausted, and raises `SpotifyApiError` when there is none.
+        """
+        endpoint = self.api.endpoint_of(url)
+        trace = RequestTrace(endpoint.name if endpoint is not None else 'other')
+        kwargs.setdefault('timeout', self.timeout(endpoint))
+        self._retry_budget.earn()
+        self._hedge_budget.earn()
+
+        start = time.perf_counter()
+        retry = 0
+        try:
+            while True:
+                response, error = self._attempt(client, url, endpoint, trace, kwargs)
+                if not _is_retryable(response) or retry >= self.settings.max_retries:
+                    break
+                delay_s = retry_after_s(response)
+                if delay_s is None:
+                    delay_s = self.backoff_s(retry)
+                elif delay_s > self.settings.max_retry_after_s:
+                    break
+                if not self._retry_budget.spend():
+                    break
+                time.sleep(delay_s)
+                trace.backoff_ms += delay_s * 1000
+                retry += 1
+        finally:
+            trace.total_ms = (time.perf_counter() - start) * 1000
+
+        trace.status_code = response.status_code if response is not None else None
+        trace.failed = response is None or response.status_code >= 400
+        self.stats.record(trace)
+        if trace.failed:
+            logger.warning(f"Failed request to {trace.describe()}")
+        elif trace.total_ms >= self.settings.slow_request_ms:
+            logger.info(f"Slow request to {trace.describe()}")
+        if response is None:
+            raise SpotifyApiError(f"No answer from {trace.endpoint} after {trace.attempts} attempts: {error}",
+                                  endpoint=trace.endpoint) from error
+        return response
+
+    def _send(self, client: httpx.Client, url: str, trace: RequestTrace, kwargs: Dict[str, Any]) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = client.get(url, **kwargs)
+        except httpx.TimeoutException:
+            trace.timeouts += 1
+            raise
+        self.stats.record_attempt(trace.endpoint, (time.perf_counter() - start) * 1000)
+        return response
+
+    def _attempt(self, client: httpx.Client, url: str, endpoint: Optional[Endpoint], trace: RequestTrace,
+                 kwargs: Dict[str, Any]):
+        """Sends the request once, or twice when hedged. Returns the answer, or None and the error."""
+        trace.attempts += 1
+        delay_ms = self._hedge_delay_ms(endpoint, trace.endpoint)
+        try:
+            if delay_ms is None:
+                return self._send(client, url, trace, kwargs), None
+            return self._hedged(client, url, trace, kwargs, delay_ms), None
+        except CassetteMissError:
+            # Not recorded, a retry would miss again
+            raise
+        except httpx.TransportError as e:
+            return None, e
+
+    def _hedge_delay_ms(self, endpoint: Optional[Endpoint], name: str) -> Optional[float]:
+        if not self.settings.hedge:
+            return None
+        if endpoint is not None and endpoint.priority > self.settings.hedge_max_priority:
+            return None
+        percentile = self.stats.attempt_percentile(name, self.settings.hedge_percentile,
+                                                   self.settings.hedge_min_samples)
+        return None if percentile is None else max(self.settings.hedge_min_delay_ms, percentile)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=max(1, self.settings.hedge_workers),
+                                                thread_name_prefix='hedge')
+            return self._pool
+
+    @staticmethod
+    def _start_primary(send: Callable[[], httpx.Response]) -> Future:
+        """
+        Sends the primary attempt from a thread of its own: in the shared pool it could wait behind the attempts
+        of other requests, and the hedge delay would expire before it is even sent.
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(send())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name='hedge-primary', daemon=True).start()
+        return future
+
+    def _hedged(self, client: httpx.Client, url: str, trace: RequestTrace, kwargs: Dict[str, Any],
+                delay_ms: float) -> httpx.Response:
+        primary = self._start_primary(lambda: self._send(client, url, trace, kwargs))
+        done, _ = wait([primary], timeout=delay_ms / 1000)
+        if done or not self._hedge_budget.spend():
+            return primary.result()
+
+        # Only the hedges queue in the pool
+        hedge = self._executor().submit(self._send, client, url, trace, kwargs)
+        try:
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and not _is_retryable(future.result()):
+                        trace.hedge_won = future is hedge
+                        # The other attempt completes in the background, its answer is dropped
+                        return future.result()
+
+            # Neither attempt has a final answer, the caller retries the one at hand
+            for future in (primary, hedge):
+                if future.exception() is None:
+                    trace.hedge_won = future is hedge
+                    return future.result()
+            return primary.result()
+        finally:
+            if hedge.cancel():
+                # Still queued when the primary answered, the hedge was never sent
+                self._hedge_budget.refund()
+            else:
+                trace.attempts += 1
+                trace.hedges += 1
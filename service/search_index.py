@@ -0,0 +1,323 @@
+"""
+In-memory full-text index over the names of the entities of the library store.
+
+Names are folded (case and accents) and split into tokens. Each token has a posting set of the documents containing
+it, and the vocabulary is kept sorted so the last word typed is matched as a prefix with two bisections. Typos are
+tolerated with the symmetric deletion method: every token of `MIN_TYPO_LENGTH` characters or more is also indexed
+under the variants obtained by deleting one of its characters, so a misspelt word finds its candidates with a few
+dictionary lookups instead of a scan of the vocabulary, and the candidates are then checked to be one edit away.
+
+The index is loaded from the names stored in the library store, then kept up to date by listening to its writes.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('artists', 'albums', 'playlists', 'tracks')
+
+# Tokens shorter than this are only matched exactly or as a prefix
+MIN_TYPO_LENGTH = 4
+
+# Weights of the matches of a query word
+EXACT_WEIGHT = 3.0
+PREFIX_WEIGHT = 2.0
+TYPO_WEIGHT = 1.0
+
+# Bonuses breaking the ties between documents matching the words equally well
+NAME_PREFIX_BONUS = 2.0
+KIND_BONUS = {'artists': 0.3, 'albums': 0.2, 'playlists': 0.2, 'tracks': 0.0}
+
+# Documents ranked for each hit returned, the lookup stops collecting past this
+CANDIDATES_PER_HIT = 4
+
+# Entities indexed per batch when loading, the lookups of the main thread wait for one batch at most
+LOAD_BATCH_SIZE = 1000
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize(text: str) -> str:
+    """Folds the case and removes the accents of a text."""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def _deletes(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Whether a and b differ by at most one insertion, deletion, substitution or transposition."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    start = 0
+    while start < len(a) and a[start] == b[start]:
+        start += 1
+    if len(a) != len(b):
+        return a[start:] == b[start + 1:]
+    if a[start + 1:] == b[start + 1:]:
+        return True
+    # Adjacent characters swapped
+    return (start + 1 < len(a) and a[start] == b[start + 1] and a[start + 1] == b[start]
+            and a[start + 2:] == b[start + 2:])
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    kind: str
+    id: str
+    name: str
+    score: float
+
+
+class _Document:
+    __slots__ = ('kind', 'id', 'name', 'folded_name', 'tokens', 'rank')
+
+    def __init__(self, kind: str, entity_id: str, name: str):
+        self.kind = kind
+        self.id = entity_id
+        self.name = name
+        self.folded_name = ' '.join(tokenize(name))
+        self.tokens = frozenset(self.folded_name.split())
+        # The part of the score which does not depend on the query: artists first, then shorter names
+        self.rank = KIND_BONUS[kind] - 0.001 * len(self.folded_name)
+
+
+class _Term(NamedTuple):
+    word: str
+    prefix: bool
+    typos: Set[str]
+
+
+class SearchIndex:
+    """
+    An inverted index of the artists, albums, playlists and tracks of the library store, searched as the user
+    types.
+
+    Every query word must match a word of the name, exactly, as a prefix for the last word of the query, or with
+    one typo. Documents are ranked by the quality of their matches, then names starting with the query, then by
+    kind (artists first) and shorter names.
+
+    Lookups stay short whatever the size of the library: the documents are streamed from the postings of the most
+    selective word, best matches first, and the stream stops once `CANDIDATES_PER_HIT` times the requested number
+    of documents have matched every word. A broad query such as a single letter therefore ranks a sample of its
+    best matching documents rather than all of them.
+
+    Searches run on the main thread while the store writes from background threads, every access is serialized
+    by a lock held for one lookup or one written batch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents: List[Optional[_Document]] = []
+        self._document_numbers: Dict[Tuple[str, str], int] = {}
+        # Postings of each kind, so the hits of a kind never wait behind the documents of the others
+        self._postings: Dict[str, Dict[str, Set[int]]] = {kind: {} for kind in KINDS}
+        self._tokens: Set[str] = set()
+        self._vocabulary: List[str] = []
+        self._typo_variants: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._document_numbers)
+
+    # Updates
+
+    def load(self, store):
+        """Indexes every entity of the library store. Meant to run in a background thread at startup."""
+        start = time.perf_counter()
+        for kind in KINDS:
+            names = store.iter_names(kind)
+            # The lock is released between the batches, and while the store is read
+            while True:
+                batch = list(itertools.islice(names, LOAD_BATCH_SIZE))
+                if not batch:
+                    break
+                self.add(kind, batch)
+        logger.info(f"Search index loaded with {len(self)} entities in {time.perf_counter() - start:.2f} s")
+
+    def on_entities_saved(self, kind: str, items: Sequence[Dict[str, Any]], removed: Sequence[str] = ()):
+        """Listener of the library store, indexing the entities it saves and forgetting the removed ones."""
+        if kind not in self._postings:
+            return
+        self.add(kind, ((item['id'], item.get('name') or '') for item in items if item and item.get('id')))
+        if removed:
+            self.remove(kind, removed)
+
+    def add(self, kind: str, entities: Iterable[Tuple[str, str]]):
+        """Indexes (id, name) pairs, replacing the name indexed for an id already known."""
+        with self._lock:
+            postings = self._postings[kind]
+            new_tokens = []
+            for entity_id, name in entities:
+                number = self._document_numbers.get((kind, entity_id))
+                if number is not None:
+                    if self._documents[number].name == name:
+                        continue
+                    self._remove_document(number)
+                document = _Document(kind, entity_id, name)
+                number = len(self._documents)
+                self._documents.append(document)
+                self._document_numbers[(kind, entity_id)] = number
+                for token in document.tokens:
+                    numbers = postings.get(token)
+                    if numbers is None:
+                        numbers = postings[token] = set()
+                        if token not in self._tokens:
+                            self._tokens.add(token)
+                            new_tokens.append(token)
+                    numbers.add(number)
+            if new_tokens:
+                self._add_tokens(new_tokens)
+
+    def remove(self, kind: str, ids: Iterable[str]):
+        with self._lock:
+            for entity_id in ids:
+                number = self._document_numbers.get((kind, entity_id))
+                if number is not None:
+                    self._remove_document(number)
+
+    def _remove_document(self, number: int):
+        document = self._documents[number]
+        postings = self._postings[document.kind]
+        for token in document.tokens:
+            # Tokens without documents stay in the vocabulary, lookups skip their empty postings
+            postings[token].discard(number)
+        del self._document_numbers[(document.kind, document.id)]
+        self._documents[number] = None
+
+    def _add_tokens(self, tokens: List[str]):
+        tokens.sort()
+        # Timsort merges the two sorted runs in C, the insertion of a batch is linear in the size of the vocabulary
+        vocabulary = self._vocabulary + tokens
+        vocabulary.sort()
+        self._vocabulary = vocabulary
+        for token in tokens:
+            if len(token) >= MIN_TYPO_LENGTH and not token.isdigit():
+                for variant in _deletes(token):
+                    self._typo_variants.setdefault(variant, set()).add(token)
+
+    # Lookups
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + '\uffff', start)
+        return start, end
+
+    def _typo_tokens(self, word: str) -> Set[str]:
+        if len(word) < MIN_TYPO_LENGTH or word.isdigit():
+            return set()
+        candidates = set(self._typo_variants.get(word, ()))
+        for variant in _deletes(word):
+            if variant in self._tokens:
+                candidates.add(variant)
+            candidates.update(self._typo_variants.get(variant, ()))
+        candidates.discard(word)
+        return {token for token in candidates if _within_one_edit(word, token)}
+
+    def _terms(self, query: str) -> List[_Term]:
+        words = tokenize(query)
+        # The last word is still being typed, unless the query ends with a space
+        last_is_prefix = not query[-1:].isspace()
+        return [_Term(word, last_is_prefix and position == len(words) - 1, self._typo_tokens(word))
+                for position, word in enumerate(dict.fromkeys(words))]
+
+    def _estimated_size(self, postings: Dict[str, Set[int]], term: _Term) -> int:
+        size = len(postings.get(term.word, ())) + sum(len(postings.get(token, ())) for token in term.typos)
+        if term.prefix:
+            start, end = self._prefix_range(term.word)
+            # Counting the documents of a large range would cost more than the lookup itself
+            size += end - start if end - start > 64 else sum(len(postings.get(self._vocabulary[index], ()))
+                                                             for index in range(start, end))
+        return size
+
+    def _stream(self, postings: Dict[str, Set[int]], term: _Term) -> Iterator[Tuple[int, float]]:
+        """Yields the documents matching a term with the weight of their best match, best matches first."""
+        seen = set()
+        tokens: Iterator[Tuple[str, float]] = iter(((term.word, EXACT_WEIGHT),))
+        if term.prefix:
+            start, end = self._prefix_range(term.word)
+            tokens = itertools.chain(tokens, ((self._vocabulary[index], PREFIX_WEIGHT)
+                                              for index in range(start, end)))
+        tokens = itertools.chain(tokens, ((token, TYPO_WEIGHT) for token in term.typos))
+        for token, weight in tokens:
+            for number in postings.get(token, ()):
+                if number not in seen:
+                    seen.add(number)
+                    yield number, weight
+
+    @staticmethod
+    def _weight(tokens: frozenset, term: _Term) -> float:
+        if term.word in tokens:
+            return EXACT_WEIGHT
+        if term.prefix:
+            for token in tokens:
+                if token.startswith(term.word):
+                    return PREFIX_WEIGHT
+        if term.typos and not term.typos.isdisjoint(tokens):
+            return TYPO_WEIGHT
+        return 0.0
+
+    def _search_kind(self, kind: str, terms: List[_Term], folded_query: str, limit: int) -> List[SearchHit]:
+        postings = self._postings[kind]
+        terms = sorted(terms, key=lambda term: self._estimated_size(postings, term))
+        first, others = terms[0], terms[1:]
+
+        scored = []
+        for number, score in self._stream(postings, first):
+            document = self._documents[number]
+            for term in others:
+                weight = self._weight(document.tokens, term)
+                if not weight:
+                    break
+                score += weight
+            else:
+                if document.folded_name.startswith(folded_query):
+                    score += NAME_PREFIX_BONUS
+                scored.append((score + document.rank, number))
+                if len(scored) >= CANDIDATES_PER_HIT * limit:
+                    break
+
+        hits = []
+        for score, number in heapq.nlargest(limit, scored):
+            document = self._documents[number]
+            hits.append(SearchHit(kind, document.id, document.name, score))
+        return hits
+
+    def search_by_kind(self, query: str, limits: Dict[str, int]) -> Dict[str, List[SearchHit]]:
+        """
+        Returns the best matches of a query for each kind of entity, best first.
+
+        Parameters:
+            query (str): The text typed by the user. Its last word is matched as a prefix, unless the query ends
+                with a space.
+            limits (dict): The maximum number of hits of each kind, kinds left out are not searched.
+        """
+        with self._lock:
+            terms = self._terms(query)
+            if not terms:
+                return {kind: [] for kind in limits}
+            folded_query = ' '.join(tokenize(query))
+            return {kind: self._search_kind(kind, terms, folded_query, limit) for kind, limit in limits.items()}
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """Returns the best matches of a query among every kind of entity, best first."""
+        hits = self.search_by_kind(query, {kind: limit for kind in KINDS})
+        return heapq.nlargest(limit, itertools.chain.from_iterable(hits.values()), key=lambda hit: hit.score)
@@ -0,0 +1,322 @@
+"""
+Typed, immutable settings loaded once from config.yaml.
+
+`load_settings` parses the YAML file a single time per path and validates it into frozen dataclasses. API
+endpoints are compiled into `Endpoint` objects: the URL template is validated and its path parameters counted once,
+and each endpoint carries the metadata used by the layers calling it (freshness TTL, page size, priority and
+timeout). An endpoint is configured either as a plain URL or as a mapping:
+
+    artist:
+      get_albums:
+        url: https://api.spotify.com/v1/artists/{}/albums
+        ttl_s: 86400
+        page_size: 9
+        timeout_s: 5
+"""
+import re
+import string
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from .config_reader import ConfigReader
+
+
+class SettingsError(ValueError):
+    """Raised when config.yaml is missing a required value or has a value of the wrong type."""
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """
+    An API endpoint.
+
+    Attributes:
+        name (str): The dotted name of the endpoint in config.yaml, e.g. 'artist.get_albums'.
+        template (str): The URL, with a '{}' placeholder per path parameter.
+        ttl_s (float, optional): How long a response stays fresh in the local caches, None to never expire.
+        page_size (int, optional): The number of items requested per page of paginated endpoints.
+        priority (int): The priority of the requests, lower is more urgent. Only the requests up to
+            `api.resilience.hedge_max_priority` are hedged.
+        timeout_s (float, optional): The timeout of the requests, None for the default of `api.resilience`.
+    """
+    name: str
+    template: str
+    ttl_s: Optional[float] = None
+    page_size: Optional[int] = None
+    priority: int = 0
+    timeout_s: Optional[float] = None
+    # The number of path parameters of the URL
+    arity: int = field(init=False, repr=False, compare=False)
+    _pattern: 're.Pattern' = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        parts = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(self.template):
+            if field_name or format_spec or conversion:
+                raise SettingsError(f"Endpoint {self.name} must only use positional '{{}}' placeholders")
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(None)
+        object.__setattr__(self, 'arity', parts.count(None))
+        # Path parameters match a single path segment
+        object.__setattr__(self, '_pattern', re.compile(''.join(re.escape(part) if part is not None else '[^/?]+'
+                                                                for part in parts)))
+
+    def url(self, *args) -> str:
+        """Returns the URL with the given path parameters."""
+        if len(args) != self.arity:
+            raise ValueError(f"Endpoint {self.name} takes {self.arity} path parameters, {len(args)} given")
+        return self.template.format(*args)
+
+    def matches(self, url: str) -> bool:
+        """Whether a URL, e.g. a `next` link, is a URL of the endpoint. The query is ignored."""
+        return self._pattern.fullmatch(url.split('?', 1)[0]) is not None
+
+
+@dataclass(frozen=True)
+class ResilienceSettings:
+    timeout_s: float = 10
+    connect_timeout_s: float = 5
+    max_retries: int = 3
+    backoff_base_ms: float = 200
+    backoff_max_ms: float = 5000
+    max_retry_after_s: float = 30
+    retry_budget: float = 0.1
+    hedge: bool = False
+    hedge_percentile: float = 95
+    hedge_min_samples: int = 20
+    hedge_min_delay_ms: float = 50
+    hedge_budget: float = 0.05
+    hedge_workers: int = 16
+    hedge_max_priority: int = 0
+    slow_request_ms: float = 2000
+
+
+@dataclass(frozen=True)
+class ApiSettings:
+    client_id: str
+    client_secret: str
+    access_token_url: str
+    auth_url: str
+    redirect_uri: str
+    endpoints: Mapping[str, Endpoint]
+    resilience: ResilienceSettings = ResilienceSettings()
+
+    def endpoint(self, name: str) -> Endpoint:
+        try:
+            return self.endpoints[name]
+        except KeyError:
+            raise SettingsError(f"Unknown endpoint {name}") from None
+
+    def endpoint_of(self, url: str) -> Optional[Endpoint]:
+        """Returns the endpoint a URL belongs to, None for URLs of no configured endpoint."""
+        for endpoint in self.endpoints.values():
+            if endpoint.matches(url):
+                return endpoint
+        return None
+
+
+@dataclass(frozen=True)
+class LibrarySettings:
+    database: str = 'data/library.db'
+    sync_interval_s: float = 3600
+    initial_sync_delay_s: float = 30
+
+
+@dataclass(frozen=True)
+class PrefetchSettings:
+    enabled: bool = True
+    hover_delay_ms: int = 400
+    max_queue: int = 20
+    max_tasks_per_minute: int = 30
+    images_per_page: int = 12
+    history_pages: int = 3
+    rewarm_after_s: float = 900
+
+
+@dataclass(frozen=True)
+class GraphSettings:
+    max_depth: int = 3
+    max_artists: int = 3000
+    max_workers: int = 8
+    ranking_size: int = 60
+
+
+@dataclass(frozen=True)
+class StatsSettings:
+    max_workers: int = 6
+    history_days: int = 730
+
+
+@dataclass(frozen=True)
+class CacheSettings:
+    image_dir: str = 'image_cache'
+    image_memory_mb: float = 64
+    image_disk_mb: float = 512
+    page_snapshots: int = 500
+
+
+@dataclass(frozen=True)
+class DataServiceSettings:
+    enabled: bool = False
+    max_workers: int = 8
+    image_slots: int = 16
+    image_slot_kb: int = 512
+    request_timeout_s: float = 330
+
+
+@dataclass(frozen=True)
+class TransportSettings:
+    mode: str = 'live'
+    cassette_dir: str = 'data/cassette'
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class ProfilingSettings:
+    enabled: bool = False
+    trace_file: str = 'data/ui_trace.json'
+    heartbeat_ms: int = 50
+    stall_threshold_ms: float = 100
+
+
+@dataclass(frozen=True)
+class MemorySettings:
+    enabled: bool = False
+    report_file: str = 'data/memory_report.json'
+    frames: int = 1
+    top: int = 10
+
+
+@dataclass(frozen=True)
+class DispatchSettings:
+    budget_ms: float = 8
+
+
+@dataclass(frozen=True)
+class UiSettings:
+    profiling: ProfilingSettings = ProfilingSettings()
+    dispatch: DispatchSettings = DispatchSettings()
+    memory: MemorySettings = MemorySettings()
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    The settings of the application.
+
+    Attributes:
+        config (ConfigReader): The reader the settings were built from, for the values without a typed section.
+    """
+    api: ApiSettings
+    library: LibrarySettings
+    prefetch: PrefetchSettings
+    transport: TransportSettings
+    ui: UiSettings
+    graph: GraphSettings
+    stats: StatsSettings
+    cache: CacheSettings
+    data_service: DataServiceSettings
+    config: ConfigReader = field(repr=False, compare=False)
+
+
+def _check_type(path: str, value: Any, expected: type) -> Any:
+    # Integers are accepted where floats are expected, booleans are not accepted as numbers
+    if expected is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+        raise SettingsError(f"{path} must be of type {expected.__name__}, got {value!r}")
+    return value
+
+
+def _section(cls, data: Optional[Dict[str, Any]], path: str):
+    """Builds a dataclass of scalar fields from a mapping, keeping the defaults of the missing values."""
+    data = data or {}
+    if not isinstance(data, dict):
+        raise SettingsError(f"{path} must be a mapping")
+    known = {f.name: f for f in fields(cls)}
+    unknown = set(data) - set(known)
+    if unknown:
+        raise SettingsError(f"Unknown settings in {path}: {', '.join(sorted(unknown))}")
+    values = {}
+    for name, value in data.items():
+        values[name] = _check_type(f'{path}.{name}', value, known[name].type)
+    return cls(**values)
+
+
+def _endpoints(data: Dict[str, Any], prefix: str = '') -> Dict[str, Endpoint]:
+    endpoints = {}
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, str):
+            endpoints[name] = Endpoint(name, value)
+        elif isinstance(value, dict) and 'url' in value:
+            unknown = set(value) - {'url', 'ttl_s', 'page_size', 'priority', 'timeout_s'}
+            if unknown:
+                raise SettingsError(f"Unknown settings in api.endpoints.{name}: {', '.join(sorted(unknown))}")
+            endpoints[name] = Endpoint(name,
+                                       _check_type(f'api.endpoints.{name}.url', value['url'], str),
+                                       ttl_s=_check_type(f'api.endpoints.{name}.ttl_s', value['ttl_s'], float)
+                                       if value.get('ttl_s') is not None else None,
+                                       page_size=_check_type(f'api.endpoints.{name}.page_size',
+                                                             value['page_size'], int)
+                                       if value.get('page_size') is not None else None,
+                                       priority=_check_type(f'api.endpoints.{name}.priority',
+                                                            value.get('priority', 0), int),
+                                       timeout_s=_check_type(f'api.endpoints.{name}.timeout_s',
+                                                             value['timeout_s'], float)
+                                       if value.get('timeout_s') is not None else None)
+        elif isinstance(value, dict):
+            endpoints.update(_endpoints(value, f'{name}.'))
+        else:
+            raise SettingsError(f"api.endpoints.{name} must be a URL or a mapping")
+    return endpoints
+
+
+def _required(data: Dict[str, Any], key: str, path: str) -> str:
+    if data.get(key) is None:
+        raise SettingsError(f"Missing setting {path}.{key}")
+    return _check_type(f'{path}.{key}', data[key], str)
+
+
+def _transport_settings(data: Optional[Dict[str, Any]]) -> TransportSettings:
+    settings = _section(TransportSettings, data, 'transport')
+    if settings.mode not in ('live', 'record', 'replay', 'strict'):
+        raise SettingsError(f"transport.mode must be one of live, record, replay or strict, got {settings.mode!r}")
+    return settings
+
+
+def build_settings(config: ConfigReader) -> Settings:
+    """Validates the data of a ConfigReader into Settings."""
+    data = config.config_data or {}
+    api = data.get('api') or {}
+    ui = data.get('ui') or {}
+    return Settings(
+        api=ApiSettings(client_id=_required(api, 'client_id', 'api'),
+                        client_secret=_required(api, 'client_secret', 'api'),
+                        access_token_url=_required(api, 'access_token_url', 'api'),
+                        auth_url=_required(api, 'auth_url', 'api'),
+                        redirect_uri=_required(api, 'redirect_uri', 'api'),
+                        endpoints=MappingProxyType(_endpoints(api.get('endpoints') or {})),
+                        resilience=_section(ResilienceSettings, api.get('resilience'), 'api.resilience')),
+        library=_section(LibrarySettings, data.get('library'), 'library'),
+        prefetch=_section(PrefetchSettings, data.get('prefetch'), 'prefetch'),
+        transport=_transport_settings(data.get('transport')),
+        ui=UiSettings(profiling=_section(ProfilingSettings, ui.get('profiling'), 'ui.profiling'),
+                      dispatch=_section(DispatchSettings, ui.get('dispatch'), 'ui.dispatch'),
+                      memory=_section(MemorySettings, ui.get('memory'), 'ui.memory')),
+        graph=_section(GraphSettings, data.get('graph'), 'graph'),
+        stats=_section(StatsSettings, data.get('stats'), 'stats'),
+        cache=_section(CacheSettings, data.get('cache'), 'cache'),
+        data_service=_section(DataServiceSettings, data.get('data_service'), 'data_service'),
+        config=config)
+
+
+@lru_cache(maxsize=None)
+def load_settings(config_file: str = 'config.yaml') -> Settings:
+    """Returns the settings of a configuration file, which is only read and validated the first time."""
+    return build_settings(ConfigReader(config_file))
@@ -5,15 +5,22 @@ import httpx
 import base64
 import hashlib
 import secrets
+import threading
 import time
 import logging
-from .config_reader import ConfigReader
+from .models import json_loads
+from .resilience import RequestPolicy, SpotifyApiError
+from .settings import ApiSettings, load_settings
+from .transport import current_transport, is_offline
 
 logger = logging.getLogger(__name__)
 
 
 class SpotifyClient:
-    def __init__(self, client_id, client_secret):
+    # Seconds a request waits for the login to complete when no session is saved
+    AUTHORIZATION_TIMEOUT = 300
+
+    def __init__(self, client_id, client_secret, settings: ApiSettings = None):
         self.client_id = client_id
         self.client_secret = client_secret
         access_token, refresh_token, token_expiration = self.read_saved_tokens_locally()
@@ -21,12 +28,27 @@ class SpotifyClient:
         self.refresh_token = refresh_token if refresh_token else None
         self.token_expires = token_expiration if token_expiration else None
 
-        # initialize config reader instance
-        self.config = ConfigReader("config.yaml")
+        # Set once tokens are available, requests made before wait for the authorization
+        self.authorized = threading.Event()
+        if self.access_token:
+            self.authorized.set()
+        # Reason of a failed login, the requests then fail at once rather than waiting for the authorization
+        self.authorization_error = None
+
+        # API settings, shared with the rest of the application
+        self.settings = settings or load_settings().api
 
         self.code_verifier = self.generate_code_verifier()
         self.code_challenge = self.generate_code_challenge(self.code_verifier)
-        self.client = httpx.Client()  # Persistent HTTP client instance
+        # Timeouts, retries and hedges of the GET requests, from the `api.resilience` settings
+        self.policy = RequestPolicy(self.settings)
+        # Persistent HTTP client instance, live or replaying a cassette depending on the installed transport
+        self.client = httpx.Client(transport=current_transport(), timeout=self.policy.timeout(None))
+        if is_offline():
+            # Recorded responses need neither a login nor a token refresh
+            self.access_token = self.access_token or 'offline'
+            self.token_expires = float('inf')
+            self.authorized.set()
 
     @staticmethod
     def generate_code_verifier(length=64):
@@ -45,12 +67,12 @@ class SpotifyClient:
         params = {
             "client_id": self.client_id,
             "response_type": "code",
-            "redirect_uri": self.config.get_config_value("api.redirect_uri"),
+            "redirect_uri": self.settings.redirect_uri,
             "code_challenge_method": "S256",
             "code_challenge": self.code_challenge,
             "scope": scope
         }
-        return f"{self.config.get_config_value("api.auth_url")}?{httpx.QueryParams(params)}"
+        return f"{self.settings.auth_url}?{httpx.QueryParams(params)}"
 
     def exchange_code_for_token(self, code):
         """Exchange authorization code for an access token."""
@@ -58,10 +80,10 @@ class SpotifyClient:
             "client_id": self.client_id,
             "grant_type": "authorization_code",
             "code": code,
-            "redirect_uri": self.config.get_config_value("api.redirect_uri"),
+            "redirect_uri": self.settings.redirect_uri,
             "code_verifier": self.code_verifier
         }
-        response = self.client.post(self.config.get_config_value("api.access_token_url"),
+        response = self.client.post(self.settings.access_token_url,
                                     data=data,
                                     headers={"Content-Type": "application/x-www-form-urlencoded"}
                                     )
@@ -72,11 +94,22 @@ class SpotifyClient:
             # Set the expiration time (current time + expires_in - a small leeway)
             self.token_expires = time.time() + json_response["expires_in"] - 60
             self.save_tokens_locally()
+            self.authorization_error = None
+            self.authorized.set()
         else:
             raise Exception(f"Failed to retrieve access token: {response.status_code}")
 
+    def fail_authorization(self, reason):
+        """Fails the requests waiting for the login, and those made until a login completes."""
+        self.authorization_error = reason
+        self.authorized.set()
+
     def ensure_token_validity(self):
         """Ensure that the access token is valid, refreshing it if necessary."""
+        if not self.authorized.wait(self.AUTHORIZATION_TIMEOUT):
+            raise Exception("Not authorized: the login has not been completed")
+        if self.access_token is None:
+            raise Exception(f"Not authorized: the login failed ({self.authorization_error})")
         if time.time() >= self.token_expires:
             self.refresh_access_token()
 
@@ -88,7 +121,7 @@ class SpotifyClient:
             "client_id": self.client_id,
             "client_secret": self.client_secret,
         }
-        response = self.client.post(self.config.get_config_value("api.access_token_url"),
+        response = self.client.post(self.settings.access_token_url,
                                     data=data,
                                     headers={"Content-Type": "application/x-www-form-urlencoded"}
                                     )
@@ -161,21 +194,43 @@ class SpotifyClient:
 
         Returns:
             The response from the GET request as a JSON object.
+
+        Raises:
+            SpotifyApiError: When the request fails, after the retries of the request policy.
         """
         self.ensure_token_validity()
         headers = kwargs.pop("headers", {})
         headers["Authorization"] = f"Bearer {self.access_token}"
 
         # Include query params in the request. If `params` is None, this is effectively ignored.
-        response = self.client.get(url, headers=headers, params=params, **kwargs)
+        response = self.policy.get(self.client, url, headers=headers, params=params, **kwargs)
 
         # Logging the response
         logger.info("Response received")
         logger.info(f"Status code: {response.status_code}")
-        logger.info(f"Response text: {response.text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Decoding the whole body is costly for large pages, only done when debugging
+            logger.debug(f"Response text: {response.text}")
+        if response.is_error:
+            # Callers index the answers, an error object would fail further away or be stored as data
+            endpoint = self.settings.endpoint_of(url)
+            raise SpotifyApiError.from_response(response, endpoint.name if endpoint is not None else None)
 
-        # Return the JSON response, assuming the request was successful and the response is in JSON format
-        return response.json()
+        # Return the JSON response, the request was successful and the response is in JSON format
+        return json_loads(response.content)
+
+    def iterate_pages(self, url, params=None):
+        """Yield the items of a paginated endpoint, following the `next` links until the last page.
+
+        Args:
+            url (str): The URL of the first page.
+            params (dict, optional): The query parameters of the first page, the next links already include them.
+        """
+        while url:
+            page = self.get(url, params=params)
+            yield from page.get('items', [])
+            url = page.get('next')
+            params = None
 
     def post(self, url, data=None, json=None, **kwargs):
         """Perform a POST request."""
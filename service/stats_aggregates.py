@@ -0,0 +1,183 @@
+"""
+Vectorized aggregates of the history of the top items, computed by `StatsEngine` for the Home page.
+
+The history is loaded column-wise into NumPy arrays, one entry per (time range, day, position), with the
+attributes of the items in arrays indexed by item, and every aggregate is computed with vectorized operations:
+grouped sums and counts are a single `np.bincount` over a combined group index, and the genres of the artists, a
+list per artist, are flattened into one array with offsets. Years of daily snapshots are a few hundred thousand
+entries, which are aggregated in milliseconds.
+
+NumPy takes a while to import, this module is only imported by the engine when it first computes the
+statistics, in a background thread.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .library_store import UNKNOWN_POPULARITY
+from .library_sync import TIME_RANGES
+
+RANGE_INDEXES = {time_range: index for index, time_range in enumerate(TIME_RANGES)}
+
+# Edges of the bins of the duration histogram, in minutes, the last bin is open-ended
+DURATION_BINS_MIN = (0, 2, 3, 4, 5, 6, 8)
+
+# Genres kept in the distribution of each time range
+TOP_GENRES = 12
+
+
+@dataclass(frozen=True)
+class TopItemColumns:
+    """
+    The history of the top items of one kind, column-wise: entry i is the item `ids[item[i]]`, at `position[i]`
+    in the top items of `TIME_RANGES[time_range[i]]` on `day[i]` (days since the epoch), with the popularity it
+    had that day (NaN when unknown).
+    """
+    time_range: np.ndarray
+    day: np.ndarray
+    position: np.ndarray
+    item: np.ndarray
+    popularity: np.ndarray
+    ids: Tuple[str, ...]
+
+    @classmethod
+    def empty(cls) -> 'TopItemColumns':
+        return cls(np.empty(0, np.int8), np.empty(0, np.int32), np.empty(0, np.int16), np.empty(0, np.int32),
+                   np.empty(0, np.float32), ())
+
+    def __len__(self) -> int:
+        return len(self.item)
+
+    def merge(self, rows: Sequence[Tuple[str, int, List[str], bytes]], since_day: int = 0,
+              before_day: int = 0) -> 'TopItemColumns':
+        """
+        Returns the columns with the (time range, day, item ids, popularities) snapshots of the store, which
+        replace the entries from since_day on. Entries before before_day are dropped.
+        """
+        rows = [row for row in rows if row[0] in RANGE_INDEXES and len(row[2]) == len(row[3])]
+        counts = np.fromiter((len(row[2]) for row in rows), np.int64, len(rows))
+        item_ids = list(itertools.chain.from_iterable(row[2] for row in rows))
+        # Items keep their index, new ones are numbered after the known ones
+        ids = list(self.ids)
+        codes = {item_id: code for code, item_id in enumerate(ids)}
+        for item_id in dict.fromkeys(item_ids):
+            if item_id not in codes:
+                codes[item_id] = len(ids)
+                ids.append(item_id)
+
+        popularity = np.frombuffer(b''.join(row[3] for row in rows), dtype=np.uint8).astype(np.float32)
+        popularity[popularity == UNKNOWN_POPULARITY] = np.nan
+        # Positions restart at 0 with each snapshot
+        position = np.arange(len(item_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        keep = (self.day >= before_day) & (self.day < since_day)
+        return TopItemColumns(
+            time_range=np.concatenate((self.time_range[keep],
+                                       np.repeat(np.array([RANGE_INDEXES[row[0]] for row in rows], np.int8),
+                                                 counts))),
+            day=np.concatenate((self.day[keep], np.repeat(np.array([row[1] for row in rows], np.int32), counts))),
+            position=np.concatenate((self.position[keep], position.astype(np.int16))),
+            item=np.concatenate((self.item[keep], np.fromiter(map(codes.__getitem__, item_ids), np.int32,
+                                                              len(item_ids)))),
+            popularity=np.concatenate((self.popularity[keep], popularity)),
+            ids=tuple(ids))
+
+    def latest(self) -> np.ndarray:
+        """Returns the mask of the entries of the last snapshot of each time range."""
+        last_day = np.full(len(TIME_RANGES), np.iinfo(np.int32).min, dtype=np.int32)
+        np.maximum.at(last_day, self.time_range, self.day)
+        return self.day == last_day[self.time_range]
+
+    def latest_ids(self) -> List[str]:
+        return [self.ids[code] for code in np.unique(self.item[self.latest()]).tolist()]
+
+    def last_day(self) -> Optional[int]:
+        return int(self.day.max()) if len(self.day) else None
+
+
+def genre_distribution(artists: TopItemColumns, item_genres: Sequence[Sequence[str]],
+                       top: int = TOP_GENRES) -> Dict[str, List[Tuple[str, float]]]:
+    """
+    Returns the share of each genre among the genres of the last top artists of each time range.
+
+    Parameters:
+        artists (TopItemColumns): The history of the top artists.
+        item_genres (Sequence): The genres of each artist, indexed like `artists.ids`.
+    """
+    vocabulary, codes = np.unique(np.array([genre for genres in item_genres for genre in genres], dtype=str),
+                                  return_inverse=True)
+    counts = np.fromiter((len(genres) for genres in item_genres), np.int64, len(item_genres))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    mask = artists.latest()
+    items = artists.item[mask]
+    per_entry = counts[items]
+    # The genres of every entry, one after the other: the offset of the genres of the item plus their index
+    starts = np.repeat(offsets[items], per_entry)
+    within = np.arange(per_entry.sum()) - np.repeat(np.cumsum(per_entry) - per_entry, per_entry)
+    entry_codes = codes[starts + within]
+    entry_ranges = np.repeat(artists.time_range[mask].astype(np.int64), per_entry)
+
+    size = len(vocabulary)
+    totals = np.bincount(entry_ranges * size + entry_codes,
+                         minlength=len(TIME_RANGES) * size).reshape(len(TIME_RANGES), size)
+    distribution = {}
+    for index, time_range in enumerate(TIME_RANGES):
+        row = totals[index]
+        total = row.sum()
+        # Most frequent first, then by name
+        order = np.lexsort((np.arange(size), -row))[:top]
+        distribution[time_range] = [(str(vocabulary[code]), round(float(row[code] / total), 4))
+                                    for code in order if row[code]]
+    return distribution
+
+
+def duration_histogram(tracks: TopItemColumns, durations_ms: np.ndarray,
+                       bins_min: Sequence[int] = DURATION_BINS_MIN) -> Dict[str, List[int]]:
+    """
+    Returns the number of last top tracks of each time range in each duration bin.
+
+    Parameters:
+        tracks (TopItemColumns): The history of the top tracks.
+        durations_ms (ndarray): The duration of each track, indexed like `tracks.ids`, NaN when unknown.
+    """
+    mask = tracks.latest()
+    minutes = durations_ms[tracks.item[mask]] / 60000
+    known = ~np.isnan(minutes)
+    bins = np.searchsorted(np.asarray(bins_min), minutes[known], side='right') - 1
+    ranges = tracks.time_range[mask][known].astype(np.int64)
+    counts = np.bincount(ranges * len(bins_min) + bins,
+                         minlength=len(TIME_RANGES) * len(bins_min)).reshape(len(TIME_RANGES), len(bins_min))
+    return {time_range: counts[index].tolist() for index, time_range in enumerate(TIME_RANGES)}
+
+
+def overlap(columns: TopItemColumns) -> List[List[float]]:
+    """Returns the Jaccard index of the last top items of each pair of time ranges."""
+    mask = columns.latest()
+    presence = np.zeros((len(TIME_RANGES), len(columns.ids)), dtype=np.int32)
+    presence[columns.time_range[mask], columns.item[mask]] = 1
+    shared = presence @ presence.T
+    sizes = np.diag(shared)
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros(shared.shape), where=union > 0)
+    return np.round(jaccard, 4).tolist()
+
+
+def popularity_trend(columns: TopItemColumns) -> Dict[str, List[Tuple[int, float]]]:
+    """Returns the mean popularity of the top items of each time range, for every day of the history."""
+    known = ~np.isnan(columns.popularity)
+    days, day_index = np.unique(columns.day[known], return_inverse=True)
+    groups = day_index.astype(np.int64) * len(TIME_RANGES) + columns.time_range[known]
+    size = len(days) * len(TIME_RANGES)
+    shape = (len(days), len(TIME_RANGES))
+    sums = np.bincount(groups, weights=columns.popularity[known], minlength=size).reshape(shape)
+    counts = np.bincount(groups, minlength=size).reshape(shape)
+    means = np.divide(sums, counts, out=np.zeros(sums.shape), where=counts > 0)
+    trend = {}
+    for index, time_range in enumerate(TIME_RANGES):
+        present = counts[:, index] > 0
+        trend[time_range] = [(int(day), round(float(mean), 2))
+                             for day, mean in zip(days[present], means[present, index])]
+    return trend
@@ -0,0 +1,157 @@
+"""
+Listening statistics of the Home page, computed from the history of the top items of the user.
+
+Every sync of the top artists and tracks is kept by the library store as a daily snapshot. The engine loads that
+history into the columns of `stats_aggregates`, merging only the days synced since the last computation, and
+computes the aggregates with NumPy. NumPy is imported on the first computation, which runs in a background
+thread, so that it does not delay the opening of the window.
+
+The aggregates are plain Python values, so the Home page persists them as its snapshot and shows them as soon as
+it opens, while the engine pulls the six lists of top items concurrently in the background.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .library_sync import TIME_RANGES, LibrarySync
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('artists', 'tracks')
+
+
+@dataclass(frozen=True)
+class ListeningStats:
+    """
+    The aggregates shown by the Home page.
+
+    Attributes:
+        genres (dict): For each time range, the share of the genres of the top artists, as (genre, share) most
+            frequent first.
+        duration_bins (list): The edges of the bins of the duration histogram in minutes, the last one open-ended.
+        durations (dict): For each time range, the number of top tracks in each duration bin.
+        artist_overlap (list): For each pair of time ranges, the Jaccard index of their top artists.
+        popularity (dict): For each kind then each time range, the mean popularity of the top items of every day
+            of the history, as (day, mean).
+        days (int): The number of days of history.
+    """
+    genres: Dict[str, List[Tuple[str, float]]]
+    duration_bins: List[int]
+    durations: Dict[str, List[int]]
+    artist_overlap: List[List[float]]
+    popularity: Dict[str, Dict[str, List[Tuple[int, float]]]]
+    days: int
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'genres': self.genres, 'duration_bins': self.duration_bins, 'durations': self.durations,
+                'artist_overlap': self.artist_overlap, 'popularity': self.popularity, 'days': self.days}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'ListeningStats':
+        return cls(genres={time_range: [tuple(item) for item in items] for time_range, items in data['genres'].items()},
+                   duration_bins=list(data['duration_bins']),
+                   durations={time_range: list(counts) for time_range, counts in data['durations'].items()},
+                   artist_overlap=[list(row) for row in data['artist_overlap']],
+                   popularity={kind: {time_range: [tuple(point) for point in points]
+                                      for time_range, points in trends.items()}
+                               for kind, trends in data['popularity'].items()},
+                   days=data['days'])
+
+
+class StatsEngine:
+    """
+    Pulls the top artists and tracks of every time range and computes the listening statistics of the Home page.
+
+    The aggregates are computed again only when one of the lists of top items has been saved since the last
+    computation, otherwise the last result is returned.
+
+    Attributes:
+        library (LibrarySync): Syncs the top items, whose history is kept in its store.
+        max_workers (int): The maximum number of lists synced at a time.
+        history_days (int): The number of days of snapshots kept.
+    """
+
+    def __init__(self, library: LibrarySync, max_workers: int = 6, history_days: int = 730):
+        self.library = library
+        self.max_workers = max_workers
+        self.history_days = history_days
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple] = None
+        self._stats: Optional[ListeningStats] = None
+        # The TopItemColumns of each kind, loaded by the first computation
+        self._columns: Dict[str, Any] = {}
+
+    def pull(self, refresh: bool = False):
+        """
+        Syncs the lists of top items which are stale, or all of them with refresh, concurrently. A list which
+        cannot be synced keeps its stored history.
+        """
+        lists = [(kind, time_range) for kind in KINDS for time_range in TIME_RANGES]
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stats') as pool:
+            futures = {pool.submit(self.library.refresh_top_items, kind, time_range, refresh): (kind, time_range)
+                       for kind, time_range in lists}
+        for future, (kind, time_range) in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error syncing the top {kind} of {time_range}: {e}")
+        self.library.store.prune_top_item_history(self._first_day())
+
+    def _first_day(self) -> int:
+        return int(time.time() // 86400) - self.history_days
+
+    def _history_version(self) -> Tuple:
+        store = self.library.store
+        return tuple(store.list_updated_at(f'top:{kind}:{time_range}') for kind in KINDS for time_range in TIME_RANGES)
+
+    def compute(self) -> ListeningStats:
+        """Returns the aggregates of the stored history, computed again only if it has changed."""
+        # Held for the whole computation, concurrent callers wait for its result
+        with self._lock:
+            version = self._history_version()
+            if self._stats is None or version != self._version:
+                self._stats = self._compute()
+                self._version = version
+            return self._stats
+
+    def _compute(self) -> ListeningStats:
+        # Imported on the first computation, in the background thread of the Home page
+        import numpy as np
+        from . import stats_aggregates as aggregates
+
+        start = time.perf_counter()
+        store = self.library.store
+        for kind in KINDS:
+            # Days before the last one loaded cannot have changed, the last one is replaced by each sync
+            columns = self._columns.get(kind) or aggregates.TopItemColumns.empty()
+            since_day = columns.last_day() or 0
+            self._columns[kind] = columns.merge(store.get_top_item_history(kind, since_day), since_day,
+                                                self._first_day())
+        artists, tracks = self._columns['artists'], self._columns['tracks']
+
+        # Genres and durations are only shown for the last snapshots, only their items are read
+        genres_by_id = {artist['id']: artist.get('genres') or ()
+                        for artist in store.get_entities('artists', artists.latest_ids())}
+        item_genres = [genres_by_id.get(artist_id, ()) for artist_id in artists.ids]
+        durations_by_id = {track['id']: track.get('duration_ms')
+                           for track in store.get_entities('tracks', tracks.latest_ids())}
+        durations_ms = np.array([durations_by_id.get(track_id) for track_id in tracks.ids], dtype=np.float64)
+
+        stats = ListeningStats(genres=aggregates.genre_distribution(artists, item_genres),
+                               duration_bins=list(aggregates.DURATION_BINS_MIN),
+                               durations=aggregates.duration_histogram(tracks, durations_ms),
+                               artist_overlap=aggregates.overlap(artists),
+                               popularity={'artists': aggregates.popularity_trend(artists),
+                                           'tracks': aggregates.popularity_trend(tracks)},
+                               days=len(np.union1d(artists.day, tracks.day)))
+        logger.info(f"Listening stats of {len(artists) + len(tracks)} history entries computed in "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        return stats
+
+    def stats(self, refresh: bool = False) -> ListeningStats:
+        """Syncs the stale lists of top items, or all of them with refresh, and returns the aggregates."""
+        self.pull(refresh)
+        return self.compute()
@@ -0,0 +1,215 @@
+"""
+Pluggable HTTP transports for the Spotify API and image requests.
+
+The transports plug into httpx: `SpotifyClient` and `ImageCache` build their clients with the transport installed
+here, so the rest of the application is unaware of the mode.
+
+- live: requests go to the network (the default, no transport is installed).
+- record: requests go to the network and every response, images included, is written to a cassette directory.
+- replay: responses are served from the cassette, with an optional injected latency and jitter; unrecorded
+  requests get a 404 response.
+- strict: as replay, but unrecorded requests raise `CassetteMissError`.
+
+A cassette stores one JSON file per request, keyed by the method and the URL with its query parameters sorted,
+next to a file with the raw body. Headers of the requests, and therefore tokens, are never recorded, and the tokens
+in the JSON bodies of the responses, those of the token endpoint, are replaced before saving.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MODES = ('live', 'record', 'replay', 'strict')
+
+# Response headers kept in the cassette, the body is stored as received so its encoding must be kept
+RECORDED_HEADERS = ('content-type', 'content-encoding')
+
+# Fields of the JSON responses never written to a cassette, and the value recorded instead
+REDACTED_FIELDS = ('access_token', 'refresh_token')
+REDACTED = 'redacted'
+
+
+class CassetteMissError(httpx.TransportError):
+    """Raised in strict mode for a request which is not in the cassette."""
+
+
+def request_key(method: str, url: httpx.URL) -> str:
+    """Returns the name of the cassette entry of a request."""
+    params = sorted(url.params.multi_items())
+    canonical = f"{method.upper()} {url.copy_with(query=None)}?{httpx.QueryParams(params)}"
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def redact_tokens(response: httpx.Response) -> Optional[httpx.Response]:
+    """Returns the response with the tokens of its JSON body redacted, None if it holds no token."""
+    if 'json' not in response.headers.get('content-type', ''):
+        return None
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not any(field in data for field in REDACTED_FIELDS):
+        return None
+    data.update((field, REDACTED) for field in REDACTED_FIELDS if field in data)
+    # Saved decoded, so without the content encoding of the original
+    return httpx.Response(response.status_code, json=data, request=response.request)
+
+
+class Cassette:
+    """A directory of recorded responses."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key: str):
+        return os.path.join(self.directory, f'{key}.json'), os.path.join(self.directory, f'{key}.body')
+
+    def save(self, request: httpx.Request, response: httpx.Response, content: bytes):
+        meta_path, body_path = self._paths(request_key(request.method, request.url))
+        # Write the body first, an entry is only visible once its metadata exists
+        with open(body_path, 'wb') as f:
+            f.write(content)
+        meta = {
+            'method': request.method,
+            'url': str(request.url),
+            'status_code': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+        }
+        tmp_path = f'{meta_path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def load(self, request: httpx.Request) -> Optional[httpx.Response]:
+        meta_path, body_path = self._paths(request_key(request.method, request.url))
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            content = f.read()
+        return httpx.Response(meta['status_code'], headers=meta['headers'], content=content, request=request)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Forwards the requests to the network and records the responses."""
+
+    def __init__(self, cassette: Cassette, inner: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self.inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.inner.handle_request(request)
+        # The raw body, still encoded, as the client decodes it according to the recorded headers
+        content = b''.join(response.iter_raw())
+        response.close()
+        recorded = httpx.Response(response.status_code, headers=response.headers, content=content, request=request,
+                                  extensions=response.extensions)
+        redacted = redact_tokens(recorded)
+        if redacted is None:
+            self.cassette.save(request, recorded, content)
+        else:
+            self.cassette.save(request, redacted, redacted.content)
+        return recorded
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """
+    Serves the responses of a cassette.
+
+    Attributes:
+        latency_ms (float): The delay added to every response.
+        jitter_ms (float): The maximum random deviation of the delay, drawn from a seeded generator so that
+            runs are reproducible.
+        strict (bool): Whether unrecorded requests raise `CassetteMissError` instead of getting a 404.
+    """
+
+    def __init__(self, cassette: Cassette, latency_ms: float = 0, jitter_ms: float = 0, strict: bool = False,
+                 seed: int = 0):
+        self.cassette = cassette
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _delay(self):
+        if not self.latency_ms and not self.jitter_ms:
+            return
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, self.latency_ms + jitter) / 1000)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.cassette.load(request)
+        self._delay()
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if response is not None:
+            return response
+
+        if self.strict:
+            raise CassetteMissError(f"Request not recorded: {request.method} {request.url}", request=request)
+        logger.warning(f"Request not recorded, answering 404: {request.method} {request.url}")
+        return httpx.Response(404, json={'error': {'status': 404, 'message': 'Not recorded'}}, request=request)
+
+
+def build_transport(mode: str, cassette_dir: str, latency_ms: float = 0, jitter_ms: float = 0,
+                    seed: int = 0) -> Optional[httpx.BaseTransport]:
+    """Returns the transport of a mode, None for live requests."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown transport mode {mode}, expected one of {', '.join(MODES)}")
+    if mode == 'live':
+        return None
+    cassette = Cassette(cassette_dir)
+    if mode == 'record':
+        return RecordingTransport(cassette)
+    return ReplayTransport(cassette, latency_ms=latency_ms, jitter_ms=jitter_ms, strict=mode == 'strict', seed=seed)
+
+
+_transport: Optional[httpx.BaseTransport] = None
+_shared_client: Optional[httpx.Client] = None
+_lock = threading.Lock()
+
+
+def install_transport(transport: Optional[httpx.BaseTransport]):
+    """Sets the transport of the clients created from now on, None for live requests."""
+    global _transport, _shared_client
+    with _lock:
+        _transport = transport
+        _shared_client = None
+
+
+def current_transport() -> Optional[httpx.BaseTransport]:
+    return _transport
+
+
+def is_offline() -> bool:
+    """Whether the responses come from a cassette rather than from the network."""
+    return isinstance(_transport, ReplayTransport)
+
+
+def shared_client() -> httpx.Client:
+    """Returns a pooled HTTP client using the installed transport, shared by the image downloads."""
+    global _shared_client
+    with _lock:
+        if _shared_client is None:
+            _shared_client = httpx.Client(transport=_transport)
+        return _shared_client
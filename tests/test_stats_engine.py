@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from service.library_store import UNKNOWN_POPULARITY, LibraryStore
+from service.library_sync import TIME_RANGES, LibrarySync
+from service.settings import load_settings
+from service.stats_aggregates import TopItemColumns, popularity_trend
+from service.stats_engine import StatsEngine
+
+
+class PopularityTrendTest(unittest.TestCase):
+
+    def test_empty_history(self):
+        self.assertEqual(popularity_trend(TopItemColumns.empty()), {time_range: [] for time_range in TIME_RANGES})
+
+    def test_unknown_popularity(self):
+        columns = TopItemColumns.empty().merge([('short_term', 100, ['a', 'b'], bytes([UNKNOWN_POPULARITY] * 2))])
+        self.assertEqual(popularity_trend(columns), {time_range: [] for time_range in TIME_RANGES})
+
+    def test_mean_per_day(self):
+        columns = TopItemColumns.empty().merge([('short_term', 100, ['a', 'b'], bytes([40, 60])),
+                                                ('long_term', 101, ['a'], bytes([UNKNOWN_POPULARITY]))])
+        self.assertEqual(popularity_trend(columns), {'short_term': [(100, 50.0)], 'medium_term': [],
+                                                     'long_term': []})
+
+
+class StatsEngineTest(unittest.TestCase):
+
+    def test_empty_library(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = LibraryStore(os.path.join(directory, 'library.db'))
+            try:
+                engine = StatsEngine(LibrarySync(None, load_settings().api, store))
+                stats = engine.compute()
+            finally:
+                store.close()
+        self.assertEqual(stats.days, 0)
+        self.assertEqual(stats.popularity, {kind: {time_range: [] for time_range in TIME_RANGES}
+                                            for kind in ('artists', 'tracks')})
+        self.assertEqual(stats.genres, {time_range: [] for time_range in TIME_RANGES})
+        self.assertEqual(stats.durations, {time_range: [0] * len(stats.duration_bins) for time_range in TIME_RANGES})
+        self.assertTrue(np.array_equal(stats.artist_overlap, np.zeros((len(TIME_RANGES), len(TIME_RANGES)))))
+
+
+if __name__ == '__main__':
+    unittest.main()
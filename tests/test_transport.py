@@ -0,0 +1,56 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from service.transport import REDACTED, Cassette, RecordingTransport, ReplayTransport
+
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+TOKENS = {'access_token': 'secret-access', 'refresh_token': 'secret-refresh', 'token_type': 'Bearer',
+          'expires_in': 3600}
+
+
+def token_endpoint(request: httpx.Request) -> httpx.Response:
+    # Streamed as by the network transport, the token response compressed
+    if request.url.path == '/api/token':
+        return httpx.Response(200, headers={'content-type': 'application/json', 'content-encoding': 'gzip'},
+                              stream=httpx.ByteStream(gzip.compress(json.dumps(TOKENS).encode('utf-8'))))
+    return httpx.Response(200, headers={'content-type': 'application/json'},
+                          stream=httpx.ByteStream(json.dumps({'id': 'user'}).encode('utf-8')))
+
+
+class RecordingTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.cassette = Cassette(self.directory.name)
+
+    def cassette_bytes(self) -> bytes:
+        contents = b''
+        for name in os.listdir(self.directory.name):
+            with open(os.path.join(self.directory.name, name), 'rb') as f:
+                contents += f.read()
+        return contents
+
+    def test_cassette_holds_no_token(self):
+        with httpx.Client(transport=RecordingTransport(self.cassette, httpx.MockTransport(token_endpoint))) as client:
+            response = client.post(TOKEN_URL, data={'grant_type': 'refresh_token', 'refresh_token': 'secret-refresh'})
+            client.get('https://api.spotify.com/v1/me')
+        # The application gets the tokens, the cassette does not
+        self.assertEqual(response.json(), TOKENS)
+        contents = self.cassette_bytes()
+        self.assertNotIn(b'secret-access', contents)
+        self.assertNotIn(b'secret-refresh', contents)
+
+        with httpx.Client(transport=ReplayTransport(self.cassette, strict=True)) as client:
+            replayed = client.post(TOKEN_URL).json()
+            self.assertEqual(client.get('https://api.spotify.com/v1/me').json(), {'id': 'user'})
+        self.assertEqual(replayed, dict(TOKENS, access_token=REDACTED, refresh_token=REDACTED))
+
+
+if __name__ == '__main__':
+    unittest.main()
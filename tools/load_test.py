@@ -0,0 +1,248 @@
+"""
+Load-test harness driving SpotifyClient against the stand-in server through scripted navigation sessions.
+
+Each session starts from an empty library store, as a first launch, and follows the path of a user: the profile
+page (profile, top artists and tracks, playlists), then a walk through artist pages following the top and related
+artists. With --full-sync, the session ends with a full library sync, tracks of every playlist included. Sessions
+run concurrently, and the harness reports the throughput, the latency percentiles of each endpoint and the request
+counts by status. The server can fail a share of the requests, to measure the retries and hedges of the client.
+
+Usage, from the root of the repository:
+
+    python -m tools.load_test --tracks 10000 --playlists 100 --sessions 8 --concurrency 4 --full-sync
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import httpx
+
+from service.library_store import LibraryStore
+from service.library_sync import LibrarySync
+from service.resilience import request_stats
+from service.settings import ApiSettings, load_settings
+from service.spotify_client import SpotifyClient
+from tools.stand_in_server import LatencyModel, RateLimiter, StandInServer, stand_in_api_settings
+
+logger = logging.getLogger(__name__)
+
+# Path segments which are ids, replaced to group the requests by endpoint
+ID_SEGMENT = re.compile(r'/(artist|album|track|playlist)\d+')
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RequestRecorder:
+    """Records the duration and the status of every request of the httpx clients it is attached to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[int, int] = defaultdict(int)
+
+    def attach(self, client: httpx.Client):
+        client.event_hooks['request'].append(self._on_request)
+        client.event_hooks['response'].append(self._on_response)
+
+    @staticmethod
+    def _on_request(request: httpx.Request):
+        request.extensions['load_test_start'] = time.perf_counter()
+
+    def _on_response(self, response: httpx.Response):
+        duration_ms = (time.perf_counter() - response.request.extensions['load_test_start']) * 1000
+        endpoint = f"{response.request.method} {ID_SEGMENT.sub('/{id}', response.request.url.path)}"
+        with self._lock:
+            self.durations[endpoint].append(duration_ms)
+            self.statuses[response.status_code] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            for endpoint, durations in sorted(self.durations.items()):
+                ordered = sorted(durations)
+                endpoints[endpoint] = {'count': len(ordered),
+                                       'p50_ms': round(_percentile(ordered, 50), 2),
+                                       'p95_ms': round(_percentile(ordered, 95), 2),
+                                       'p99_ms': round(_percentile(ordered, 99), 2),
+                                       'max_ms': round(ordered[-1], 2)}
+            return {'requests': sum(self.statuses.values()),
+                    'statuses': dict(sorted(self.statuses.items())),
+                    'endpoints': endpoints}
+
+
+def create_client(api: ApiSettings, recorder: RequestRecorder) -> SpotifyClient:
+    client = SpotifyClient(api.client_id, api.client_secret, settings=api)
+    # The stand-in server accepts any token
+    client.access_token, client.refresh_token = 'stand-in-access-token', 'stand-in-refresh-token'
+    client.token_expires = float('inf')
+    client.authorized.set()
+    recorder.attach(client.client)
+    return client
+
+
+def run_session(index: int, api: ApiSettings, recorder: RequestRecorder, directory: str, artist_pages: int,
+                full_sync: bool, seed: int) -> Dict[str, Any]:
+    """Runs one navigation session on a new store, returns its timings."""
+    rng = random.Random(seed + index)
+    client = create_client(api, recorder)
+    store = LibraryStore(os.path.join(directory, f'session-{index}.db'))
+    library = LibrarySync(client, api, store)
+    timings = {}
+
+    start = time.perf_counter()
+    library.load_profile()
+    top_artists = library.load_top_items('artists', 'short_term', limit=8)
+    library.load_top_items('tracks', 'short_term', limit=10)
+    library.load_playlists(limit=10)
+    timings['profile_page_ms'] = (time.perf_counter() - start) * 1000
+
+    # Walk from a top artist through related artists, as a user clicking cards
+    artist_ms = []
+    artist = rng.choice(top_artists) if top_artists else None
+    for _ in range(artist_pages if artist else 0):
+        page_start = time.perf_counter()
+        lists = library.load_artist(artist.id)
+        artist_ms.append((time.perf_counter() - page_start) * 1000)
+        if not lists['related_artists']:
+            break
+        artist = rng.choice(lists['related_artists'])
+    timings['artist_page_ms'] = artist_ms
+
+    if full_sync:
+        sync_start = time.perf_counter()
+        library.sync_all()
+        timings['full_sync_ms'] = (time.perf_counter() - sync_start) * 1000
+        timings['synced_tracks'] = store.count_entities('tracks')
+
+    timings['session_ms'] = (time.perf_counter() - start) * 1000
+    store.close()
+    return timings
+
+
+def run(args) -> Dict[str, Any]:
+    server = StandInServer(latency=LatencyModel(args.latency_ms, args.latency_sigma, args.seed),
+                           rate_limiter=RateLimiter(args.rate_limit),
+                           throttle_probability=args.throttle_probability,
+                           error_probability=args.error_probability,
+                           seed=args.seed,
+                           artists=args.artists,
+                           tracks=args.tracks,
+                           playlists=args.playlists,
+                           tracks_per_playlist=args.tracks_per_playlist).start()
+    api = stand_in_api_settings(load_settings(args.config).api, server.base_url)
+    resilience = api.resilience
+    if args.hedge:
+        resilience = dataclasses.replace(resilience, hedge=True)
+    if args.max_retries is not None:
+        resilience = dataclasses.replace(resilience, max_retries=args.max_retries)
+    api = dataclasses.replace(api, resilience=resilience)
+    recorder = RequestRecorder()
+
+    results, failures = [], []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_session, index, api, recorder, directory, args.artist_pages, args.full_sync,
+                               args.seed)
+                   for index in range(args.sessions)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.exception("Session failed")
+                failures.append(repr(e))
+    elapsed_s = time.perf_counter() - start
+    server.stop()
+
+    requests = recorder.summary()
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'elapsed_s': round(elapsed_s, 3),
+        'sessions': len(results),
+        'failed_sessions': failures,
+        'sessions_per_s': round(len(results) / elapsed_s, 3),
+        'requests_per_s': round(requests['requests'] / elapsed_s, 1),
+        'requests': requests,
+        'server_counts': {f'{route} {status}': count for (route, status), count in sorted(server.counts.items())},
+        'resilience': request_stats.report(),
+    }
+    for name in ('profile_page_ms', 'session_ms', 'full_sync_ms'):
+        ordered = sorted(result[name] for result in results if name in result)
+        if ordered:
+            report[name] = {'p50': round(_percentile(ordered, 50), 1), 'p95': round(_percentile(ordered, 95), 1),
+                            'max': round(ordered[-1], 1)}
+    artist_pages = sorted(duration for result in results for duration in result['artist_page_ms'])
+    if artist_pages:
+        report['artist_page_ms'] = {'p50': round(_percentile(artist_pages, 50), 1),
+                                    'p95': round(_percentile(artist_pages, 95), 1)}
+    if args.full_sync and results:
+        report['synced_tracks'] = max(result['synced_tracks'] for result in results)
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['sessions']} sessions in {report['elapsed_s']} s, {len(report['failed_sessions'])} failed, "
+          f"{report['sessions_per_s']} sessions/s, {report['requests_per_s']} requests/s")
+    print(f"Requests by status: {report['requests']['statuses']}")
+    for name in ('profile_page_ms', 'artist_page_ms', 'full_sync_ms', 'session_ms'):
+        if name in report:
+            print(f"{name}: {report[name]}")
+    if 'synced_tracks' in report:
+        print(f"Tracks synced per session: {report['synced_tracks']}")
+    print(f"{'endpoint':<45}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, stats in report['requests']['endpoints'].items():
+        print(f"{endpoint:<45}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['max_ms']:>10}")
+    print(f"{'endpoint, with retries and hedges':<45}{'count':>8}{'retries':>10}{'hedges':>10}{'won':>6}"
+          f"{'failed':>8}{'p99 ms':>10}")
+    for endpoint, stats in report['resilience'].items():
+        print(f"{endpoint:<45}{stats['requests']:>8}{stats['retries']:>10}{stats['hedges']:>10}"
+              f"{stats['hedge_wins']:>6}{stats['failures']:>8}{stats['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--artist-pages', type=int, default=5, help="Artist pages visited per session")
+    parser.add_argument('--full-sync', action='store_true', help="End every session with a full library sync")
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--playlists', type=int, default=100)
+    parser.add_argument('--tracks-per-playlist', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--rate-limit', type=float, default=0)
+    parser.add_argument('--throttle-probability', type=float, default=0)
+    parser.add_argument('--error-probability', type=float, default=0, help="Probability of a 503 answer")
+    parser.add_argument('--hedge', action='store_true', help="Hedge the requests, whatever config.yaml says")
+    parser.add_argument('--max-retries', type=int, default=None, help="Override the retries of config.yaml")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Path of a JSON file to write the report to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
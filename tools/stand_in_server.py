@@ -0,0 +1,409 @@
+"""
+A local stand-in for the Spotify endpoints used by the application, serving a synthetic library.
+
+The library is generated deterministically from a seed and its size is configurable, so that syncs of large
+libraries can be measured without network access. Responses are delayed according to a latency distribution,
+and the server can answer 429 like Spotify when a rate limit is exceeded, or fail with 503 at a given rate.
+
+Usage, from the root of the repository:
+
+    python -m tools.stand_in_server --tracks 10000 --playlists 200 --latency-ms 40 --rate-limit 100
+
+Point the `api` URLs of config.yaml to http://localhost:<port> (see `stand_in_api_settings` for the mapping).
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import urllib.parse as urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from service.settings import ApiSettings
+
+logger = logging.getLogger(__name__)
+
+GENRES = ('pop', 'rock', 'indie', 'jazz', 'hip hop', 'electronic', 'folk', 'metal', 'classical', 'soul')
+MARKETS = ('US', 'GB', 'FR', 'DE', 'SE', 'JP', 'BR', 'CA', 'AU', 'ES')
+IMAGE_SIZES = (640, 300, 64)
+
+
+class SyntheticLibrary:
+    """
+    A deterministic library of artists, albums, tracks and playlists in the shapes of the Spotify API.
+
+    Attributes:
+        base_url (str): The URL of the server, used in the image URLs and the `next` links.
+    """
+
+    def __init__(self, base_url: str, artists: int = 500, albums_per_artist: int = 6, tracks: int = 10000,
+                 playlists: int = 100, tracks_per_playlist: int = 100, seed: int = 0):
+        self.base_url = base_url.rstrip('/')
+        rng = random.Random(seed)
+
+        self.artists = [self._artist(i, rng) for i in range(artists)]
+        self.albums = [self._album(i, i // albums_per_artist % artists, rng)
+                       for i in range(artists * albums_per_artist)]
+        self.tracks = [self._track(i, rng) for i in range(tracks)]
+        self.playlists = [self._playlist(i, rng, tracks_per_playlist) for i in range(playlists)]
+        self.playlist_tracks = {playlist['id']: rng.sample(range(tracks), min(tracks_per_playlist, tracks))
+                                for playlist in self.playlists}
+        self.artist_albums: Dict[str, List[Dict[str, Any]]] = {}
+        for album in self.albums:
+            self.artist_albums.setdefault(album['artists'][0]['id'], []).append(album)
+        self.profile = {'id': 'stand-in-user', 'type': 'user', 'display_name': 'Stand-in User',
+                        'email': 'user@example.com', 'country': 'SE', 'followers': {'href': None, 'total': 42},
+                        'images': self._images('user')}
+
+    def _images(self, key: str) -> List[Dict[str, Any]]:
+        return [{'url': f'{self.base_url}/images/{key}-{size}.png', 'width': size, 'height': size}
+                for size in IMAGE_SIZES]
+
+    def _artist(self, index: int, rng: random.Random) -> Dict[str, Any]:
+        artist_id = f'artist{index:06d}'
+        return {'id': artist_id, 'type': 'artist', 'name': f'Artist {index}',
+                'uri': f'spotify:artist:{artist_id}', 'href': f'{self.base_url}/v1/artists/{artist_id}',
+                'genres': rng.sample(GENRES, 2), 'popularity': rng.randint(0, 100),
+                'followers': {'href': None, 'total': rng.randint(0, 10 ** 7)},
+                'images': self._images(artist_id)}
+
+    @staticmethod
+    def _simplified(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: item[key] for key in ('id', 'type', 'name', 'uri', 'href')}
+
+    def _album(self, index: int, artist_index: int, rng: random.Random) -> Dict[str, Any]:
+        album_id = f'album{index:06d}'
+        return {'id': album_id, 'type': 'album', 'name': f'Album {index}',
+                'album_type': rng.choice(('album', 'single', 'compilation')),
+                'album_group': rng.choice(('album', 'single', 'appears_on')),
+                'uri': f'spotify:album:{album_id}', 'href': f'{self.base_url}/v1/albums/{album_id}',
+                'release_date': f'{rng.randint(1960, 2024)}-01-01', 'total_tracks': rng.randint(1, 20),
+                'available_markets': list(MARKETS),
+                'artists': [self._simplified(self.artists[artist_index])],
+                'images': self._images(album_id)}
+
+    def _track(self, index: int, rng: random.Random) -> Dict[str, Any]:
+        track_id = f'track{index:06d}'
+        album = self.albums[index % len(self.albums)]
+        return {'id': track_id, 'type': 'track', 'name': f'Track {index}',
+                'uri': f'spotify:track:{track_id}', 'href': f'{self.base_url}/v1/tracks/{track_id}',
+                'duration_ms': rng.randint(90000, 420000), 'explicit': rng.random() < 0.1,
+                'popularity': rng.randint(0, 100), 'track_number': rng.randint(1, 12), 'disc_number': 1,
+                'available_markets': list(MARKETS),
+                'artists': album['artists'], 'album': album}
+
+    def _playlist(self, index: int, rng: random.Random, tracks_per_playlist: int) -> Dict[str, Any]:
+        playlist_id = f'playlist{index:06d}'
+        return {'id': playlist_id, 'type': 'playlist', 'name': f'Playlist {index}',
+                'public': rng.random() < 0.7, 'collaborative': False,
+                'snapshot_id': f'snapshot-{playlist_id}-0',
+                'owner': {'id': 'stand-in-user', 'display_name': 'Stand-in User'},
+                'tracks': {'href': f'{self.base_url}/v1/playlists/{playlist_id}/tracks',
+                           'total': tracks_per_playlist},
+                'images': self._images(playlist_id)[:1]}
+
+    def related_artists(self, artist_id: str, count: int = 20) -> List[Dict[str, Any]]:
+        """
+        Returns the artists related to an artist: mostly artists with close indexes, and a few others, so the
+        graph is clustered like the real one while every artist stays reachable. Derived from the id alone.
+        """
+        index = int(artist_id[len('artist'):]) if artist_id.startswith('artist') else 0
+        total = len(self.artists)
+        rng = random.Random(f'related-{artist_id}')
+        related = []
+        while len(related) < min(count, total - 1):
+            if rng.random() < 0.75:
+                candidate = (index + rng.choice((-1, 1)) * rng.randint(1, 50)) % total
+            else:
+                candidate = rng.randrange(total)
+            if candidate != index and candidate not in related:
+                related.append(candidate)
+        return [self.artists[candidate] for candidate in related]
+
+    def page(self, path: str, items: List[Any], query: Dict[str, str], default_limit: int = 20,
+             max_limit: int = 50) -> Dict[str, Any]:
+        """Returns a paging object of the items, with the `next` link Spotify returns."""
+        limit = max(1, min(int(query.get('limit', default_limit)), max_limit))
+        offset = max(0, int(query.get('offset', 0)))
+        next_url = None
+        if offset + limit < len(items):
+            next_query = dict(query, offset=offset + limit, limit=limit)
+            next_url = f'{self.base_url}{path}?{urlparse.urlencode(next_query)}'
+        return {'href': f'{self.base_url}{path}', 'items': items[offset:offset + limit], 'limit': limit,
+                'offset': offset, 'total': len(items), 'next': next_url, 'previous': None}
+
+
+class LatencyModel:
+    """A log-normal latency distribution, with its median and the standard deviation of its logarithm."""
+
+    def __init__(self, median_ms: float = 0, sigma: float = 0.5, seed: int = 0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_ms(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self._random.lognormvariate(math.log(self.median_ms), self.sigma)
+
+
+class RateLimiter:
+    """A token bucket of `rate` requests per second. A rate of 0 disables the limit."""
+
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[int]:
+        """Takes a token. Returns None when allowed, or the number of seconds to wait before retrying."""
+        if self.rate <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return max(1, math.ceil((1 - self._tokens) / self.rate))
+
+
+ROUTES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r'^/v1/me$'), 'me'),
+    (re.compile(r'^/v1/me/top/(artists|tracks)$'), 'top'),
+    (re.compile(r'^/v1/me/playlists$'), 'playlists'),
+    (re.compile(r'^/v1/playlists/([^/]+)/tracks$'), 'playlist_tracks'),
+    (re.compile(r'^/v1/artists/([^/]+)/albums$'), 'artist_albums'),
+    (re.compile(r'^/v1/artists/([^/]+)/top-tracks$'), 'artist_top_tracks'),
+    (re.compile(r'^/v1/artists/([^/]+)/related-artists$'), 'related_artists'),
+    (re.compile(r'^/v1/search$'), 'search'),
+    (re.compile(r'^/api/token$'), 'token'),
+    (re.compile(r'^/images/([^/]+)-(\d+)\.png$'), 'image'),
+]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        # Consume the form body of the token requests
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._handle()
+
+    def _handle(self):
+        server: StandInServer = self.server.stand_in
+        parsed = urlparse.urlparse(self.path)
+        query = dict(urlparse.parse_qsl(parsed.query))
+
+        for pattern, route in ROUTES:
+            match = pattern.match(parsed.path)
+            if match:
+                break
+        else:
+            return self._send_json(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+        retry_after = server.rate_limiter.acquire() if route != 'image' else None
+        if retry_after is None and server.throttle_probability and server.should_throttle():
+            retry_after = 1
+        failed = retry_after is None and route not in ('image', 'token') and server.should_fail()
+        time.sleep(server.latency.sample_ms() / 1000)
+        server.count(route, 429 if retry_after is not None else 503 if failed else 200)
+        if retry_after is not None:
+            return self._send_json(429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}},
+                                   headers={'Retry-After': str(retry_after)})
+        if failed:
+            return self._send_json(503, {'error': {'status': 503, 'message': 'Service unavailable'}})
+
+        if route == 'image':
+            return self._send(200, server.image(int(match.group(2))), 'image/png')
+        self._send_json(200, server.respond(route, match.groups(), parsed.path, query))
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        self._send(status, json.dumps(body).encode('utf-8'), 'application/json', headers)
+
+    def _send(self, status: int, content: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class StandInServer:
+    """
+    Serves a SyntheticLibrary over HTTP in a background thread.
+
+    Attributes:
+        latency (LatencyModel): The delay of every response.
+        rate_limiter (RateLimiter): Requests above the rate get a 429 with a Retry-After header.
+        throttle_probability (float): The probability of a 429 for requests within the rate.
+        error_probability (float): The probability of a 503 for the other API requests.
+        counts (dict): The number of responses by route and status code.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 0, latency: Optional[LatencyModel] = None,
+                 rate_limiter: Optional[RateLimiter] = None, throttle_probability: float = 0,
+                 error_probability: float = 0, seed: int = 0, **library_options):
+        self._httpd = ThreadingHTTPServer((host, port), StandInHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self.base_url = f'http://{host}:{self._httpd.server_address[1]}'
+
+        self.library = SyntheticLibrary(self.base_url, seed=seed, **library_options)
+        self.latency = latency or LatencyModel()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.throttle_probability = throttle_probability
+        self.error_probability = error_probability
+        self._random = random.Random(seed)
+        self._images: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self.counts: Dict[Tuple[str, int], int] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='stand-in-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def count(self, route: str, status: int):
+        with self._lock:
+            self.counts[(route, status)] = self.counts.get((route, status), 0) + 1
+
+    def should_throttle(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.throttle_probability
+
+    def should_fail(self) -> bool:
+        if not self.error_probability:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_probability
+
+    def image(self, size: int) -> bytes:
+        """Returns a PNG of the given size, generated once per size."""
+        with self._lock:
+            if size not in self._images:
+                buffer = BytesIO()
+                Image.new('RGB', (size, size), (30, 215, 96)).save(buffer, format='PNG')
+                self._images[size] = buffer.getvalue()
+            return self._images[size]
+
+    def respond(self, route: str, groups: Tuple[str, ...], path: str, query: Dict[str, str]) -> Any:
+        library = self.library
+        if route == 'me':
+            return library.profile
+        if route == 'top':
+            items = library.artists if groups[0] == 'artists' else library.tracks
+            # Each time range ranks the items differently
+            shift = ('short_term', 'medium_term', 'long_term').index(query.get('time_range', 'medium_term'))
+            return library.page(path, items[shift * 7:] + items[:shift * 7], query)
+        if route == 'playlists':
+            return library.page(path, library.playlists, query)
+        if route == 'playlist_tracks':
+            indexes = library.playlist_tracks.get(groups[0], [])
+            items = [{'added_at': '2024-01-01T00:00:00Z', 'is_local': False, 'track': library.tracks[index]}
+                     for index in indexes]
+            return library.page(path, items, query, default_limit=100, max_limit=100)
+        if route == 'artist_albums':
+            albums = library.artist_albums.get(groups[0], [])
+            include_groups = query.get('include_groups')
+            if include_groups:
+                albums = [album for album in albums if album['album_group'] in include_groups.split(',')]
+            return library.page(path, albums, query)
+        if route == 'artist_top_tracks':
+            albums = {album['id'] for album in library.artist_albums.get(groups[0], [])}
+            return {'tracks': [track for track in library.tracks if track['album']['id'] in albums][:10]}
+        if route == 'related_artists':
+            return {'artists': library.related_artists(groups[0])}
+        if route == 'search':
+            text = query.get('q', '').casefold()
+            results = {}
+            for kind in query.get('type', '').split(','):
+                items = {'artist': library.artists, 'album': library.albums, 'track': library.tracks,
+                         'playlist': library.playlists}.get(kind)
+                if items is not None:
+                    matches = [item for item in items if text in item['name'].casefold()]
+                    results[f'{kind}s'] = library.page(path, matches, query)
+            return results
+        if route == 'token':
+            return {'access_token': 'stand-in-access-token', 'token_type': 'Bearer', 'expires_in': 3600,
+                    'refresh_token': 'stand-in-refresh-token', 'scope': ''}
+        raise ValueError(f"Unknown route {route}")
+
+
+def stand_in_api_settings(api: ApiSettings, base_url: str) -> ApiSettings:
+    """Returns the API settings with the Spotify URLs pointing to a stand-in server."""
+    def local(url: str) -> str:
+        parsed = urlparse.urlparse(url)
+        return f'{base_url}{parsed.path}'
+
+    endpoints = {name: dataclasses.replace(endpoint, template=local(endpoint.template))
+                 for name, endpoint in api.endpoints.items()}
+    return dataclasses.replace(api,
+                               access_token_url=local(api.access_token_url),
+                               auth_url=local(api.auth_url),
+                               endpoints=MappingProxyType(endpoints))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--playlists', type=int, default=100)
+    parser.add_argument('--tracks-per-playlist', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Median latency of the responses")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="Sigma of the log-normal latency")
+    parser.add_argument('--rate-limit', type=float, default=0, help="Requests per second before 429, 0 for none")
+    parser.add_argument('--throttle-probability', type=float, default=0)
+    parser.add_argument('--error-probability', type=float, default=0, help="Probability of a 503 answer")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StandInServer(port=args.port,
+                           latency=LatencyModel(args.latency_ms, args.latency_sigma, args.seed),
+                           rate_limiter=RateLimiter(args.rate_limit),
+                           throttle_probability=args.throttle_probability,
+                           error_probability=args.error_probability,
+                           seed=args.seed,
+                           artists=args.artists,
+                           tracks=args.tracks,
+                           playlists=args.playlists,
+                           tracks_per_playlist=args.tracks_per_playlist)
+    print(f"Stand-in server listening on {server.base_url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,97 @@
 import hashlib
+import json
+import logging
 import os
-import httpx
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
 from PIL import Image
 from io import BytesIO
 
+from service.transport import shared_client
+from utiity.ui_monitor import ui_monitor
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Placeholders are tiny RGB thumbnails, upscaled into a blurred gradient of the image
+PLACEHOLDER_SIZE = (4, 4)
+PLACEHOLDER_FILE = 'placeholders.json'
+MAX_PLACEHOLDERS = 20000
+# Number of new placeholders after which the index is written again
+PLACEHOLDER_SAVE_INTERVAL = 100
+
 
 class ImageCache:
     """
-    A simple caching system for images fetched from URLs.
+    A two level cache for images fetched from URLs: decoded images in memory, image files on disk.
+
+    Both levels are bounded. The memory level keeps the most recently used decoded images within
+    `memory_budget_mb`, measured from their pixel data; 0 keeps no image in memory. The disk level removes the
+    least recently used files once the cache directory exceeds `disk_budget_mb`, down to 90% of the budget so
+    that the eviction does not run at every download; 0 leaves the directory unbounded. The files are indexed on
+    first use, their modification time records their last use, so the order survives restarts. The directory is
+    created by the first write, creating the shared cache does not touch the disk.
+
+    The cache is shared by the whole application (see `image_cache`), widgets showing the same image share the
+    decoded image. The returned images must not be modified.
+
+    When a `loader` is set, e.g. by the data service, the images missing from memory are obtained from it instead
+    of the disk and the network, and the loader owns the files.
+
+    For every image fetched, a placeholder of a few bytes is kept in an index persisted next to the files, so that
+    an image seen before can be painted at once as a blurred version of itself while it loads.
     """
 
-    def __init__(self, cache_dir="image_cache"):
+    def __init__(self, cache_dir="image_cache", memory_budget_mb: float = 64, disk_budget_mb: float = 512,
+                 placeholders: bool = True):
         self.cache_dir = cache_dir
-        self.ensure_cache_dir()
+        self.memory_budget_mb = memory_budget_mb
+        self.disk_budget_mb = disk_budget_mb
+        self.placeholders = placeholders
+
+        self._lock = threading.RLock()
+        self._memory: 'OrderedDict[str, Image.Image]' = OrderedDict()
+        self._memory_bytes = 0
+        # Size of the files of the cache directory, least recently used first, built on first use
+        self._disk: Optional['OrderedDict[str, int]'] = None
+        self._disk_bytes = 0
+        self.evictions = {'memory': 0, 'disk': 0}
+        self.loader: Optional[Callable[[str], Image.Image]] = None
+        # Placeholder of each URL hash, as the hex of the pixels of its thumbnail, read in the background by `configure`
+        self._placeholders: Dict[str, str] = {}
+        self._unsaved_placeholders = 0
+        # Reads the persisted placeholders, started by `configure` or on first use for a cache never configured
+        self._placeholder_loader: Optional[threading.Thread] = None
+        # Serializes the saves of the placeholder index, which go through the same temporary file
+        self._save_lock = threading.Lock()
+
+    def configure(self, cache_dir: str = None, memory_budget_mb: float = None, disk_budget_mb: float = None,
+                  placeholders: bool = None):
+        """Updates the settings of the cache, typically from the `cache` section of config.yaml."""
+        with self._lock:
+            if cache_dir is not None and cache_dir != self.cache_dir:
+                self.cache_dir = cache_dir
+                self._disk = None
+                self._placeholders = {}
+                self._unsaved_placeholders = 0
+                self._placeholder_loader = None
+            if placeholders is not None:
+                self.placeholders = placeholders
+            if self.placeholders:
+                self._load_placeholders()
+            if memory_budget_mb is not None:
+                self.memory_budget_mb = memory_budget_mb
+            if disk_budget_mb is not None:
+                self.disk_budget_mb = disk_budget_mb
+            self._evict_memory()
+            if self._disk is not None:
+                self._evict_disk()
 
     def ensure_cache_dir(self):
-        """Ensures the cache directory exists."""
+        """Ensures the cache directory exists, before writing to it."""
         os.makedirs(self.cache_dir, exist_ok=True)
 
     def get_image_hash(self, url):
@@ -27,15 +103,236 @@ class ImageCache:
         filename = self.get_image_hash(url) + ".png"
         return os.path.join(self.cache_dir, filename)
 
+    def is_cached(self, url):
+        """Returns whether the image of the URL is in memory or in the cache directory."""
+        with self._lock:
+            if url in self._memory:
+                return True
+        return os.path.exists(self.get_cached_image_path(url))
+
     def fetch_image(self, url):
         """Fetches an image from the URL or cache and returns a PIL.Image.Image object."""
-        cached_path = self.get_cached_image_path(url)
-        if os.path.exists(cached_path):
-            # Load from cache
-            return Image.open(cached_path)
-        else:
-            # Download and cache
-            response = httpx.get(url)
-            img = Image.open(BytesIO(response.content))
-            img.save(cached_path)  # Cache the image
-            return img
+        with ui_monitor.measure('fetch_image'):
+            with self._lock:
+                image = self._memory.get(url)
+                if image is not None:
+                    self._memory.move_to_end(url)
+                    return image
+
+            if self.loader is not None:
+                image = self.loader(url)
+                self._remember(url, image)
+                self._add_placeholder(url, image)
+                return image
+
+            cached_path = self.get_cached_image_path(url)
+            if os.path.exists(cached_path):
+                # Load from cache, decoded now so the file is closed
+                image = Image.open(cached_path)
+                image.load()
+                self._touch_file(cached_path)
+            else:
+                # Download and cache
+                response = shared_client().get(url)
+                image = Image.open(BytesIO(response.content))
+                image.load()
+                self.ensure_cache_dir()
+                image.save(cached_path)  # Cache the image
+                self._add_file(cached_path)
+
+            self._remember(url, image)
+            self._add_placeholder(url, image)
+            return image
+
+    # Placeholders
+
+    def _placeholder_key(self, url: str) -> str:
+        return self.get_image_hash(url)[:20]
+
+    def _load_placeholders(self):
+        """Starts reading the persisted placeholders in a background thread, once per cache directory."""
+        with self._lock:
+            if self._placeholder_loader is None:
+                self._placeholder_loader = threading.Thread(target=self._read_placeholders, args=(self.cache_dir,),
+                                                            name='image-placeholders', daemon=True)
+                self._placeholder_loader.start()
+
+    def _read_placeholders(self, cache_dir: str):
+        # Up to a few MB of JSON, parsed without holding the lock the cards paint with
+        try:
+            with open(os.path.join(cache_dir, PLACEHOLDER_FILE)) as f:
+                loaded = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring the placeholders of the image cache: {e}")
+            return
+        with self._lock:
+            if cache_dir != self.cache_dir:
+                return
+            # The placeholders added meanwhile are the most recent
+            loaded.update(self._placeholders)
+            while len(loaded) > MAX_PLACEHOLDERS:
+                del loaded[next(iter(loaded))]
+            self._placeholders = loaded
+
+    def _placeholder_index(self) -> Dict[str, str]:
+        # Empty until the persisted placeholders are read, images fetched meanwhile are painted without one
+        self._load_placeholders()
+        return self._placeholders
+
+    def placeholder(self, url: Optional[str], size) -> Optional[Image.Image]:
+        """
+        Returns a blurred stand-in of the size given for an image fetched before, or None. Cheap enough for the
+        main thread: the thumbnail is a few bytes, upscaled with a bilinear filter.
+        """
+        if not url or not self.placeholders:
+            return None
+        with self._lock:
+            record = self._placeholder_index().get(self._placeholder_key(url))
+        if record is None:
+            return None
+        thumbnail = Image.frombytes('RGB', PLACEHOLDER_SIZE, bytes.fromhex(record))
+        return thumbnail.resize(tuple(size), Image.Resampling.BILINEAR)
+
+    def _add_placeholder(self, url: str, image: Image.Image):
+        if not self.placeholders:
+            return
+        key = self._placeholder_key(url)
+        with self._lock:
+            if key in self._placeholder_index():
+                return
+        source = image if image.mode in ('RGB', 'RGBA', 'L') else image.convert('RGBA')
+        record = source.resize(PLACEHOLDER_SIZE, Image.Resampling.BOX).convert('RGB').tobytes().hex()
+        with self._lock:
+            index = self._placeholder_index()
+            index[key] = record
+            while len(index) > MAX_PLACEHOLDERS:
+                # Dicts keep the insertion order, the oldest placeholders go first
+                del index[next(iter(index))]
+            self._unsaved_placeholders += 1
+            save = self._unsaved_placeholders >= PLACEHOLDER_SAVE_INTERVAL
+        if save:
+            self.save_placeholders()
+
+    def save_placeholders(self):
+        """Writes the placeholders added since the last save."""
+        loader = self._placeholder_loader
+        if loader is not None and loader is not threading.current_thread():
+            # The persisted placeholders must be merged before the file is replaced
+            loader.join()
+        # Saves from several threads are written in turn, the last one written holds every placeholder
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved_placeholders or self._placeholder_loader is None:
+                    return
+                placeholders = dict(self._placeholders)
+                self._unsaved_placeholders = 0
+            # Serialized outside the lock, the cards keep reading their placeholders meanwhile
+            data = json.dumps(placeholders, separators=(',', ':'))
+            path = os.path.join(self.cache_dir, PLACEHOLDER_FILE)
+            try:
+                self.ensure_cache_dir()
+                with open(path + '.tmp', 'w') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+            except OSError as e:
+                logger.warning(f"Error saving the placeholders of the image cache: {e}")
+
+    @staticmethod
+    def image_size(image: Image.Image) -> int:
+        """Returns the number of bytes of the pixel data of a decoded image."""
+        return image.width * image.height * len(image.getbands())
+
+    def _remember(self, url: str, image: Image.Image):
+        size = self.image_size(image)
+        with self._lock:
+            if size > self.memory_budget_mb * MB:
+                return
+            previous = self._memory.pop(url, None)
+            if previous is not None:
+                self._memory_bytes -= self.image_size(previous)
+            self._memory[url] = image
+            self._memory_bytes += size
+            self._evict_memory()
+
+    def _evict_memory(self):
+        budget = self.memory_budget_mb * MB
+        while self._memory and self._memory_bytes > budget:
+            _, image = self._memory.popitem(last=False)
+            self._memory_bytes -= self.image_size(image)
+            self.evictions['memory'] += 1
+
+    def _disk_index(self) -> 'OrderedDict[str, int]':
+        if self._disk is None:
+            entries = []
+            try:
+                with os.scandir(self.cache_dir) as scan:
+                    for entry in scan:
+                        # Only the image files, not the placeholder index
+                        if entry.is_file() and entry.name.endswith('.png'):
+                            stat = entry.stat()
+                            entries.append((stat.st_mtime, entry.path, stat.st_size))
+            except FileNotFoundError:
+                # Nothing written yet
+                pass
+            entries.sort()
+            self._disk = OrderedDict((path, size) for _, path, size in entries)
+            self._disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _touch_file(self, path: str):
+        with self._lock:
+            index = self._disk_index()
+            if path in index:
+                index.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _add_file(self, path: str):
+        with self._lock:
+            index = self._disk_index()
+            self._disk_bytes -= index.pop(path, 0)
+            index[path] = os.path.getsize(path)
+            self._disk_bytes += index[path]
+            self._evict_disk()
+
+    def _evict_disk(self):
+        budget = self.disk_budget_mb * MB
+        if not budget or self._disk_bytes <= budget:
+            return
+        index = self._disk_index()
+        while index and self._disk_bytes > budget * 0.9:
+            path, size = index.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions['disk'] += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Error evicting {path} from the image cache: {e}")
+
+    def clear_memory(self):
+        """Drops the decoded images, the files stay on disk."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the sizes of both levels and the number of evictions."""
+        with self._lock:
+            return {
+                'memory_images': len(self._memory),
+                'memory_mb': round(self._memory_bytes / MB, 3),
+                'disk_files': len(self._disk) if self._disk is not None else None,
+                'disk_mb': round(self._disk_bytes / MB, 3) if self._disk is not None else None,
+                'placeholders': len(self._placeholders),
+                'evictions': dict(self.evictions),
+            }
+
+
+# Cache shared by the whole application, configured from config.yaml by the main window
+image_cache = ImageCache()
@@ -0,0 +1,198 @@
+import gc
+import json
+import logging
+import os
+import time
+import tracemalloc
+import weakref
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Allocations of the diagnostics themselves, left out of the snapshots
+IGNORED_FILES = (__file__, tracemalloc.__file__, '<frozen importlib._bootstrap>',
+                 '<frozen importlib._bootstrap_external>', '<unknown>')
+
+
+def _rss_bytes() -> Optional[int]:
+    """Returns the resident set size of the process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemoryDiagnostics:
+    """
+    Leak detection across the navigations of the application.
+
+    When enabled, tracemalloc traces the allocations and every navigation takes a snapshot, after a garbage
+    collection. The growth of the traced memory, of the RSS and of the number of live objects of each type since
+    the previous navigation is attributed to the page that was left, with the source lines that grew the most.
+    The pages are tracked with weak references: a page still alive after a collection once it has been left is
+    counted as leaked. Gauges, e.g. the sizes of the caches, are sampled at each navigation.
+
+    The snapshots block the main loop for a noticeable time, the diagnostics are meant for investigations, not
+    for everyday use. The report is written to a JSON file when the diagnostics are stopped.
+
+    Attributes:
+        enabled (bool): Whether the diagnostics are active. When disabled every method is a no-op.
+        report_file (str): The path of the JSON report.
+        frames (int): The number of frames of the traceback stored by tracemalloc for each allocation.
+        top (int): The number of source lines and object types reported for each page type.
+    """
+
+    def __init__(self, enabled: bool = False, report_file: str = 'data/memory_report.json', frames: int = 1,
+                 top: int = 10):
+        self.enabled = enabled
+        self.report_file = report_file
+        self.frames = frames
+        self.top = top
+
+        self._started = False
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._previous_rss: Optional[int] = None
+        self._previous_objects: Counter = Counter()
+        self._navigations = 0
+
+        self._pages: List[Any] = []
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._growth: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._lines: Dict[str, Counter] = defaultdict(Counter)
+        self._objects: Dict[str, Counter] = defaultdict(Counter)
+        self._leaks: Counter = Counter()
+        self._samples: List[Dict[str, Any]] = []
+
+    def configure(self, enabled: bool = None, report_file: str = None, frames: int = None, top: int = None):
+        """Updates the settings of the diagnostics, typically from the `ui.memory` section of config.yaml."""
+        if enabled is not None:
+            self.enabled = enabled
+        if report_file is not None:
+            self.report_file = report_file
+        if frames is not None:
+            self.frames = frames
+        if top is not None:
+            self.top = top
+
+    def add_gauge(self, name: str, gauge: Callable[[], Any]):
+        """Samples the JSON serializable value returned by gauge at each navigation."""
+        self._gauges[name] = gauge
+
+    def start(self):
+        """Starts tracing the allocations and takes the baseline snapshot."""
+        if not self.enabled or self._started:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._started = True
+        self._previous, self._previous_objects = self._snapshot()
+        self._previous_rss = _rss_bytes()
+        logger.info(f"Memory diagnostics started, report file: {self.report_file}")
+
+    def stop(self):
+        """Stops tracing and writes the report."""
+        if not self._started:
+            return
+        self.write_report()
+        tracemalloc.stop()
+        self._started = False
+
+    def track_page(self, page: Any):
+        """Watches a page, which is expected to be released once it has been left."""
+        if self._started:
+            self._pages.append((weakref.ref(page), type(page).__name__, self._navigations))
+
+    @staticmethod
+    def _snapshot():
+        gc.collect()
+        objects = Counter(type(obj).__name__ for obj in gc.get_objects())
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, filename) for filename in IGNORED_FILES])
+        return snapshot, objects
+
+    def on_navigation(self, left_page_type: str):
+        """Attributes the growth since the previous navigation to the page type that was left."""
+        if not self._started:
+            return
+        start = time.perf_counter()
+        self._navigations += 1
+        snapshot, objects = self._snapshot()
+        rss = _rss_bytes()
+
+        differences = snapshot.compare_to(self._previous, 'lineno')
+        traced_growth = sum(difference.size_diff for difference in differences)
+        growth = self._growth[left_page_type]
+        growth['traced_mb'].append(traced_growth / MB)
+        if rss is not None and self._previous_rss is not None:
+            growth['rss_mb'].append((rss - self._previous_rss) / MB)
+        for difference in differences[:self.top]:
+            if difference.size_diff > 0:
+                frame = difference.traceback[0]
+                self._lines[left_page_type][f'{frame.filename}:{frame.lineno}'] += difference.size_diff
+        for name, count in (objects - self._previous_objects).most_common(self.top):
+            self._objects[left_page_type][name] += count
+
+        # A page may still finish a background load right after it is left, but must be gone one navigation later.
+        # A leaked page is reported once, then no longer watched.
+        alive = []
+        for reference, page_type, navigation in self._pages:
+            if reference() is None:
+                continue
+            if navigation < self._navigations - 1:
+                self._leaks[page_type] += 1
+                logger.warning(f"{page_type} still alive {self._navigations - navigation} navigations later")
+                continue
+            alive.append((reference, page_type, navigation))
+        self._pages = alive
+
+        sample = {'navigation': self._navigations, 'left': left_page_type,
+                  'traced_mb': round(tracemalloc.get_traced_memory()[0] / MB, 3),
+                  'rss_mb': round(rss / MB, 3) if rss is not None else None,
+                  'live_pages': len(alive),
+                  'snapshot_ms': round((time.perf_counter() - start) * 1000, 1)}
+        for name, gauge in self._gauges.items():
+            try:
+                sample[name] = gauge()
+            except Exception as e:
+                sample[name] = f"error: {e}"
+        self._samples.append(sample)
+
+        self._previous, self._previous_objects, self._previous_rss = snapshot, objects, rss
+        logger.info(f"Memory after leaving {left_page_type}: {sample['traced_mb']} MB traced, "
+                    f"{traced_growth / MB:+.3f} MB")
+
+    def report(self) -> Dict[str, Any]:
+        """Returns the growth per page type, the leaked pages and the samples of each navigation."""
+        pages = {}
+        for page_type, growth in self._growth.items():
+            pages[page_type] = {
+                'visits': len(growth['traced_mb']),
+                **{f'{name}_total': round(sum(values), 3) for name, values in growth.items()},
+                **{f'{name}_mean': round(sum(values) / len(values), 3) for name, values in growth.items() if values},
+                'leaked': self._leaks[page_type],
+                'top_lines': [{'line': line, 'kb': round(size / 1024, 1)}
+                              for line, size in self._lines[page_type].most_common(self.top)],
+                'top_objects': dict(self._objects[page_type].most_common(self.top)),
+            }
+        return {'navigations': self._navigations, 'pages': pages, 'samples': self._samples}
+
+    def write_report(self):
+        """Writes the report to the report file."""
+        report = self.report()
+        directory = os.path.dirname(self.report_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for page_type, page in report['pages'].items():
+            if page['leaked']:
+                logger.warning(f"{page_type}: {page['leaked']} leaked pages over {page['visits']} visits")
+
+
+# Diagnostics shared by the whole application, disabled until configured
+memory_diagnostics = MemoryDiagnostics()
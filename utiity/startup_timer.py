@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """
+    Breakdown of the time spent starting the application.
+
+    Phases of the boot on the main thread are marked in order with `mark`, each one lasting from the previous
+    mark. Work done in the background during the boot, as the profile and avatar fetches, is recorded with
+    `record` since it overlaps the main thread phases. `report` logs everything once the first page is painted.
+
+    Attributes:
+        origin (float): The `time.perf_counter` value the phases are measured from, the import of this module.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._last_mark = self.origin
+        self._phases: List[Tuple[str, float]] = []
+        self._background: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def mark(self, phase: str):
+        """Ends a main thread phase started at the previous mark."""
+        now = time.perf_counter()
+        self._phases.append((phase, (now - self._last_mark) * 1000))
+        self._last_mark = now
+
+    def record(self, task: str, duration_ms: float):
+        """Records the duration of a background task of the boot. Safe to call from any thread."""
+        with self._lock:
+            self._background[task] = duration_ms
+        if self._reported:
+            logger.info(f"Startup background task {task}: {duration_ms:.1f} ms")
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.origin) * 1000
+
+    def report(self):
+        """Logs the main thread phases, the background tasks finished so far and the total startup time."""
+        if self._reported:
+            return
+        self._reported = True
+        phases = ', '.join(f'{phase} {duration:.1f} ms' for phase, duration in self._phases)
+        with self._lock:
+            background = ', '.join(f'{task} {duration:.1f} ms' for task, duration in self._background.items())
+        logger.info(f"Startup in {self.elapsed_ms():.1f} ms: {phases}")
+        if background:
+            logger.info(f"Startup background tasks: {background}")
+
+
+# Timer of the current process, started by the first import
+startup_timer = StartupTimer()
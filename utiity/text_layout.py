@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from typing import Dict, Tuple, Any, Hashable
+
+import customtkinter as ctk
+
+
+class TextLayout:
+    """
+    A shared service for fonts and text measurements.
+
+    Every call to `font.measure` is a round-trip to Tk, and creating a CTkFont registers a new named font in the
+    interpreter. This class keeps a single registry of fonts and caches the measured width of each (font, text)
+    pair, so widgets showing the same fonts and names only pay for the first measurement.
+
+    All the methods must be called from the Tk main thread.
+
+    Attributes:
+        max_cached_widths (int): The maximum number of measurements kept in the cache.
+    """
+
+    def __init__(self, max_cached_widths: int = 20000):
+        self.max_cached_widths = max_cached_widths
+        self._fonts: Dict[Tuple, ctk.CTkFont] = {}
+        self._widths: OrderedDict = OrderedDict()
+
+    def get_font(self, family: str = 'Arial', size: int = 10, weight: str = 'normal',
+                 underline: bool = False) -> ctk.CTkFont:
+        """
+        Returns the shared font with the given attributes, creating it the first time it is requested.
+        """
+        key = (family, size, weight, underline)
+        font = self._fonts.get(key)
+        if font is None:
+            font = ctk.CTkFont(family=family, size=size, weight=weight, underline=underline)
+            self._fonts[key] = font
+        return font
+
+    @staticmethod
+    def _font_key(font: Any) -> Hashable:
+        # Tk fonts have a unique name, any other object measuring text is identified by itself
+        return getattr(font, 'name', None) or id(font)
+
+    def measure(self, font: Any, text: str) -> int:
+        """
+        Returns the width in pixels of the text rendered with the font, measuring it only once.
+        """
+        key = (self._font_key(font), text)
+        width = self._widths.get(key)
+        if width is None:
+            width = font.measure(text)
+            self._widths[key] = width
+            if len(self._widths) > self.max_cached_widths:
+                self._widths.popitem(last=False)
+        else:
+            self._widths.move_to_end(key)
+        return width
+
+    def truncate(self, text: str, font: Any, max_width: int, ellipsis: str = '...') -> str:
+        """
+        Truncates the text with an ellipsis so that it fits within max_width pixels.
+
+        The longest fitting prefix is found with a binary search, so a long name costs O(log n) measurements
+        instead of one per removed character.
+        """
+        if self.measure(font, text) <= max_width:
+            return text
+
+        low, high = 0, len(text) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.measure(font, text[:middle] + ellipsis) <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+
+        return text[:low] + ellipsis
+
+    def clear(self):
+        """Forgets every cached measurement, e.g. after a change of the widget scaling."""
+        self._widths.clear()
+
+
+# Instance shared by all the widgets of the application
+text_layout = TextLayout()
@@ -0,0 +1,93 @@
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from utiity.ui_monitor import ui_monitor
+
+logger = logging.getLogger(__name__)
+
+
+class UiDispatcher:
+    """
+    A thread-safe queue of UI updates executed by the Tk main loop.
+
+    Worker threads must not call Tk directly: they post callbacks here and the main loop drains the queue in
+    batches limited by a time budget, leaving the rest for the next frame. Updates posted with the same key
+    are coalesced, only the latest one is executed, so a widget receiving several updates while the main loop
+    is busy is only reconfigured once.
+
+    Attributes:
+        budget_ms (float): The maximum time spent executing callbacks per batch.
+        interval_ms (int): The delay between two batches when the queue is empty.
+    """
+
+    def __init__(self, budget_ms: float = 8, interval_ms: int = 16):
+        self.budget_ms = budget_ms
+        self.interval_ms = interval_ms
+        self._root = None
+        self._drain_job = None
+        self._queue: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+
+    def install(self, root):
+        """Starts draining the queue from the main loop of the given Tk root."""
+        self._root = root
+        self._drain_job = root.after(0, self._drain)
+
+    def uninstall(self):
+        """Stops draining the queue."""
+        if self._root is not None and self._drain_job is not None:
+            try:
+                self._root.after_cancel(self._drain_job)
+            except Exception:
+                # The root may already be destroyed when the main loop ends
+                pass
+        self._root = None
+        self._drain_job = None
+
+    def post(self, callback: Callable, *args, key: Optional[Hashable] = None):
+        """
+        Queues a callback to be executed on the main thread. Safe to call from any thread.
+
+        Parameters:
+            callback (Callable): The function to execute.
+            *args: The arguments of the callback.
+            key (Hashable, optional): When given, replaces any pending update with the same key.
+        """
+        with self._lock:
+            if key is None:
+                key = ('unique', next(self._sequence))
+            else:
+                self._queue.pop(key, None)
+            self._queue[key] = (callback, args)
+
+    def pending(self) -> int:
+        """Returns the number of updates waiting in the queue."""
+        with self._lock:
+            return len(self._queue)
+
+    def _drain(self):
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        with ui_monitor.measure('dispatch_batch'):
+            while time.perf_counter() < deadline:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    _, (callback, args) = self._queue.popitem(last=False)
+                try:
+                    callback(*args)
+                except Exception as e:
+                    logger.error(f"Error while executing UI update {callback}: {e}")
+
+        if self._root is not None:
+            # Leave room for input and redraw events before the next batch if work is left
+            delay = 1 if self.pending() else self.interval_ms
+            self._drain_job = self._root.after(delay, self._drain)
+
+
+# Dispatcher shared by the whole application, installed by the main window
+ui_dispatcher = UiDispatcher()
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percentile / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        'p50_ms': round(_percentile(ordered, 50), 3),
+        'p95_ms': round(_percentile(ordered, 95), 3),
+        'p99_ms': round(_percentile(ordered, 99), 3),
+        'max_ms': round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+class UiMonitor:
+    """
+    Instrumentation of the responsiveness of the Tk main loop.
+
+    When enabled, a heartbeat scheduled with `after` measures how late the event loop runs it (the lag), named
+    sections measured with `measure` record their duration, and each page records the time spent loading its
+    data, rendering and reaching the first painted frame. Sections running on the main thread for longer than
+    the stall threshold are reported as stall sources. Everything is written to a JSON trace file in the
+    Chrome trace event format, with a summary, when the monitor is stopped.
+
+    Attributes:
+        enabled (bool): Whether the instrumentation is active. When disabled every method is a no-op.
+        trace_file (str): The path of the JSON trace file.
+        heartbeat_ms (int): The interval of the heartbeat.
+        stall_threshold_ms (float): The duration above which a main thread section or a lag is a stall.
+    """
+
+    MAX_TRACE_EVENTS = 100000
+
+    def __init__(self, enabled: bool = False, trace_file: str = 'data/ui_trace.json', heartbeat_ms: int = 50,
+                 stall_threshold_ms: float = 100):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self.heartbeat_ms = heartbeat_ms
+        self.stall_threshold_ms = stall_threshold_ms
+
+        self._root = None
+        self._heartbeat_job = None
+        self._expected_beat: Optional[float] = None
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+        self._lags: List[float] = []
+        self._sections: Dict[str, List[float]] = defaultdict(list)
+        self._page_timings: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self._stalls: Dict[str, List[float]] = defaultdict(list)
+        self._events: List[Dict[str, Any]] = []
+
+        # Name of the main thread section currently running, used to attribute heartbeat lags
+        self._current_section: Optional[str] = None
+        self._last_section: Optional[str] = None
+
+    def configure(self, enabled: bool = None, trace_file: str = None, heartbeat_ms: int = None,
+                  stall_threshold_ms: float = None):
+        """Updates the settings of the monitor, typically from the `ui.profiling` section of config.yaml."""
+        if enabled is not None:
+            self.enabled = enabled
+        if trace_file is not None:
+            self.trace_file = trace_file
+        if heartbeat_ms is not None:
+            self.heartbeat_ms = heartbeat_ms
+        if stall_threshold_ms is not None:
+            self.stall_threshold_ms = stall_threshold_ms
+
+    def start(self, root):
+        """Starts sampling the event loop lag of the given Tk root."""
+        if not self.enabled:
+            return
+        self._root = root
+        self._expected_beat = time.perf_counter() + self.heartbeat_ms / 1000
+        self._heartbeat_job = root.after(self.heartbeat_ms, self._heartbeat)
+        logger.info(f"UI monitor started, trace file: {self.trace_file}")
+
+    def stop(self):
+        """Stops the heartbeat and writes the trace file."""
+        if not self.enabled:
+            return
+        if self._heartbeat_job is not None and self._root is not None:
+            try:
+                self._root.after_cancel(self._heartbeat_job)
+            except Exception:
+                # The root may already be destroyed when the main loop ends
+                pass
+            self._heartbeat_job = None
+        self.write_trace()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _add_event(self, event: Dict[str, Any]):
+        if len(self._events) < self.MAX_TRACE_EVENTS:
+            self._events.append(event)
+
+    def _heartbeat(self):
+        now = time.perf_counter()
+        lag_ms = max(0.0, (now - self._expected_beat) * 1000)
+
+        with self._lock:
+            self._lags.append(lag_ms)
+            if lag_ms >= self.stall_threshold_ms:
+                source = self._current_section or self._last_section or 'unattributed'
+                self._stalls[f'lag after {source}'].append(lag_ms)
+                self._add_event({'name': 'event loop lag', 'ph': 'X', 'pid': 0, 'tid': 'lag',
+                                 'ts': self._now_us() - lag_ms * 1000, 'dur': lag_ms * 1000,
+                                 'args': {'last_section': source}})
+            self._last_section = None
+
+        self._expected_beat = now + self.heartbeat_ms / 1000
+        self._heartbeat_job = self._root.after(self.heartbeat_ms, self._heartbeat)
+
+    def measure(self, category: str, name: str = ''):
+        """
+        Returns a context manager measuring the duration of the enclosed block.
+
+        Parameters:
+            category (str): The kind of work, e.g. 'render' or 'fetch_image'.
+            name (str): What is being worked on, e.g. the page type.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(category, name)
+
+    @contextmanager
+    def _measure(self, category: str, name: str):
+        label = f'{category}:{name}' if name else category
+        on_main_thread = threading.current_thread() is threading.main_thread()
+        if on_main_thread:
+            previous_section, self._current_section = self._current_section, label
+
+        start = time.perf_counter()
+        start_us = self._now_us()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._sections[category].append(duration_ms)
+                self._add_event({'name': label, 'cat': category, 'ph': 'X', 'pid': 0,
+                                 'tid': 'main' if on_main_thread else threading.current_thread().name,
+                                 'ts': start_us, 'dur': duration_ms * 1000})
+                if on_main_thread:
+                    self._current_section = previous_section
+                    self._last_section = label
+                    if duration_ms >= self.stall_threshold_ms:
+                        self._stalls[label].append(duration_ms)
+
+    def record_page_timing(self, page_type: str, phase: str, duration_ms: float):
+        """Records the duration of a phase ('load_data', 'render', 'first_paint') of a page."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._page_timings[page_type][phase].append(duration_ms)
+
+    @contextmanager
+    def measure_page(self, page_type: str, phase: str):
+        """Measures a phase of a page, both as a page timing and as a section."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        with self._measure(phase, page_type):
+            yield
+        self.record_page_timing(page_type, phase, (time.perf_counter() - start) * 1000)
+
+    def mark_first_paint(self, widget, page_type: str, navigation_start: float):
+        """
+        Records the time between the start of a navigation and the first frame painted after the render.
+
+        Tk redraws widgets in idle callbacks, so an idle callback scheduled after the render runs once the
+        pending redraws have been processed.
+        """
+        if not self.enabled:
+            return
+
+        def on_painted():
+            self.record_page_timing(page_type, 'first_paint', (time.perf_counter() - navigation_start) * 1000)
+
+        widget.after_idle(on_painted)
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        """Returns the summary of the lag samples, the page timings and the top stall sources."""
+        with self._lock:
+            stalls = sorted(((source, sum(durations), len(durations), max(durations))
+                             for source, durations in self._stalls.items()),
+                            key=lambda stall: stall[1], reverse=True)
+            return {
+                'event_loop_lag': _summarize(self._lags),
+                'sections': {category: _summarize(durations) for category, durations in self._sections.items()},
+                'pages': {page_type: {phase: _summarize(durations) for phase, durations in phases.items()}
+                          for page_type, phases in self._page_timings.items()},
+                'top_stalls': [{'source': source, 'total_ms': round(total, 3), 'count': count,
+                                'max_ms': round(longest, 3)}
+                               for source, total, count, longest in stalls[:top]],
+            }
+
+    def write_trace(self):
+        """Writes the trace events and the summary report to the trace file."""
+        report = self.report()
+        with self._lock:
+            events = list(self._events)
+
+        directory = os.path.dirname(self.trace_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.trace_file, 'w') as f:
+            json.dump({'traceEvents': events, 'summary': report}, f)
+
+        for stall in report['top_stalls']:
+            logger.info(f"UI stall source {stall['source']}: {stall['count']} stalls, "
+                        f"{stall['total_ms']} ms total, {stall['max_ms']} ms max")
+
+
+# Monitor shared by the whole application, disabled until configured
+ui_monitor = UiMonitor()
@@ -0,0 +1,103 @@
+"""
+Warms the library store and the image cache before the GUI is opened.
+
+Fetches the profile, the top artists and tracks, the playlists and the pages of the top artists with the tokens
+saved by the application, and their images, so that the first pages open from the caches. Progress and
+throughput are reported on the standard error. Without a saved session the warm-up fails, unless --login is given
+to log in from the browser.
+
+Paths in config.yaml and the saved tokens are relative to the application directory, so a scheduled warm-up runs
+from there, e.g. every morning with cron:
+
+    30 7 * * * cd /path/to/spotipy && python warmup.py --quiet >> warmup.log 2>&1
+
+or with the Windows Task Scheduler, starting `python warmup.py --quiet` in the application directory.
+"""
+import argparse
+import logging
+import sys
+import threading
+
+from service.authorization_handler import login
+from service.cache_warmer import CacheWarmer
+from service.library_store import LibraryStore
+from service.resilience import request_stats
+from service.settings import load_settings
+from service.spotify_client import SpotifyClient
+from service.transport import build_transport, install_transport
+from utiity.image_cache import image_cache
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Warm the caches of the application before opening it.")
+    parser.add_argument('--artists', type=int, default=20, help="The number of top artists whose page is warmed")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="The maximum number of requests, and of images, in flight")
+    parser.add_argument('--refresh', action='store_true', help="Fetch again the data still fresh in the store")
+    parser.add_argument('--no-images', action='store_true', help="Only warm the library store")
+    parser.add_argument('--login', action='store_true', help="Log in from the browser when no session is saved")
+    parser.add_argument('--interval', type=float, default=1, help="The number of seconds between progress reports")
+    parser.add_argument('--quiet', '-q', action='store_true', help="Only report the final statistics")
+    parser.add_argument('--config', default='config.yaml', help="The configuration file")
+    parser.add_argument('--verbose', '-v', action='store_true', help="Log the requests to the standard error")
+    return parser.parse_args(argv)
+
+
+def format_progress(stats) -> str:
+    return (f"[{stats['elapsed_s']:7.1f} s] {stats['phase']:<8} "
+            f"pages {stats['pages']}/{stats['pages_total']}, "
+            f"requests {stats['requests']} ({stats['requests_per_s']}/s), "
+            f"images {stats['images'] + stats['images_cached']}/{stats['images_total']} "
+            f"({stats['images_cached']} cached, {stats['images_per_s']}/s, "
+            f"{stats['image_mb']} MB at {stats['image_mb_per_s']} MB/s), "
+            f"errors {stats['errors']}")
+
+
+def report_progress(warmer: CacheWarmer, interval: float, done: threading.Event):
+    while not done.wait(interval):
+        print(format_progress(warmer.stats()), file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%y-%m-%d %H:%M:%S',
+        stream=sys.stderr
+    )
+
+    settings = load_settings(args.config)
+    transport = settings.transport
+    install_transport(build_transport(transport.mode, transport.cassette_dir, latency_ms=transport.latency_ms,
+                                      jitter_ms=transport.jitter_ms, seed=transport.seed))
+    sp_client = SpotifyClient(settings.api.client_id, settings.api.client_secret, settings=settings.api)
+    if not sp_client.is_session_saved():
+        if not args.login:
+            print("No saved session: log in from the application, or run the warm-up once with --login",
+                  file=sys.stderr)
+            return 2
+        login(sp_client, settings.api.redirect_uri)
+
+    # The images only go to disk, nothing is displayed
+    cache = settings.cache
+    image_cache.configure(cache_dir=cache.image_dir, memory_budget_mb=0, disk_budget_mb=cache.image_disk_mb)
+    store = LibraryStore(settings.library.database, max_page_snapshots=cache.page_snapshots)
+    warmer = CacheWarmer(sp_client, settings.api, store, image_cache=None if args.no_images else image_cache,
+                         concurrency=args.concurrency, artists=args.artists, refresh=args.refresh)
+
+    done = threading.Event()
+    if not args.quiet:
+        threading.Thread(target=report_progress, args=(warmer, args.interval, done), daemon=True).start()
+    try:
+        stats = warmer.run()
+    finally:
+        done.set()
+        store.close()
+        request_stats.log_report()
+    print(format_progress(stats), file=sys.stderr)
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())